@@ -1,94 +1,109 @@
 import os
 import re
-import pdfplumber
-from flask import Flask, request, jsonify
+import heapq
+from flask import Flask, request
 import openai
 from dotenv import load_dotenv
 
+from ass_codec import responder
+from ass_servidor import agregar_salud, servir
+from ass_plazo import Plazo, PlazoVencido, es_timeout, respuesta_plazo_vencido, STATUS_PLAZO_VENCIDO
+from ass_pdf_extraccion import paginas_pdf, DemasiadasPaginas, respuesta_demasiadas_paginas, STATUS_DEMASIADAS_PAGINAS
+
 # Cargar variables de entorno (por ejemplo, OPENAI_API_KEY)
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 app = Flask(__name__)
 
-@app.route('/assistant/analyze-pdf', methods=['POST'])
-def analyze_pdf():
+# Una transacción por línea: "<establecimiento> <monto con 2 decimales>"
+PATRON_TRANSACCION = re.compile(r'^(?P<establishment>.+?)\s+(?P<amount>\d+[.,]\d{2})\s*$')
+
+
+def lineas_pdf(pdf_file, plazo: Plazo):
     """
-    Endpoint: /assistant/analyze-pdf
-    Función: Analiza un estado de cuenta PDF subido por el usuario para:
-      - Extraer transacciones y calcular el Top 5 de mayores gastos.
-      - Agrupar y contabilizar gastos recurrentes (por establecimiento) y obtener el Top 3.
-      - Usar un modelo de lenguaje para responder una pregunta basada en el análisis realizado.
-    
-    Se espera:
-      - Un archivo PDF enviado bajo la clave "file" (multipart/form-data).
-      - Opcionalmente, un parámetro "question" (en form-data o JSON) que contenga la consulta a responder.
-         Si no se envía, se usará una pregunta por defecto.
+    Líneas de texto del PDF, en orden. Las páginas se extraen en un pool de procesos y se
+    liberan apenas se extrae su texto (ver ass_pdf_extraccion.py).
     """
-    if 'file' not in request.files:
-        return jsonify({"error": "No se proporcionó el archivo PDF en 'file'"}), 400
+    for texto in paginas_pdf(pdf_file, plazo):
+        yield from texto.splitlines()
 
-    pdf_file = request.files['file']
-    
-    question = request.form.get("question")
-    if not question:
-        data = request.get_json(silent=True)
-        if data and "question" in data:
-            question = data["question"]
-    if not question:
-        question = "Resume el análisis de gastos y proporciona recomendaciones para ahorrar dinero."
 
-    # Extraer el texto del PDF con pdfplumber
-    text = ""
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                extracted_text = page.extract_text()
-                if extracted_text:
-                    text += extracted_text + "\n"
-    except Exception as e:
-        return jsonify({"error": f"Error al leer el PDF: {e}"}), 500
-    
-    # Procesar el texto para extraer transacciones
-    lines = text.splitlines()
-    transactions = []
-    pattern = re.compile(r'^(?P<establishment>.+?)\s+(?P<amount>\d+[.,]\d{2})\s*$')
-    
-    for line in lines:
-        line = line.strip()
-        match = pattern.search(line)
+def transacciones(lineas):
+    """{"establishment", "amount"} de cada línea que tiene el formato de una transacción."""
+    for line in lineas:
+        match = PATRON_TRANSACCION.search(line.strip())
         if match:
-            establishment = match.group("establishment").strip()
-            amount_str = match.group("amount").replace(',', '.')
             try:
-                amount = float(amount_str)
-                transactions.append({"establishment": establishment, "amount": amount})
+                amount = float(match.group("amount").replace(',', '.'))
             except ValueError:
                 continue
-    
-    if not transactions:
-        return jsonify({"error": "No se encontraron transacciones en el PDF."}), 404
+            yield {"establishment": match.group("establishment").strip(), "amount": amount}
+
+
+class Gastos:
+    """
+    Agregados del estado de cuenta, actualizados transacción por transacción: los 5 mayores
+    gastos (heap de tamaño 5) y el total por establecimiento. No guarda la lista de transacciones.
+    """
+
+    def __init__(self, top: int = 5):
+        self.top = top
+        self.cantidad = 0
+        # (monto, -orden, transacción): ante montos iguales se conserva la primera, como sorted()
+        self._mayores = []
+        self._por_establecimiento = {}
+
+    def agregar(self, txn: dict):
+        self.cantidad += 1
+        entrada = (txn["amount"], -self.cantidad, txn)
+        if len(self._mayores) < self.top:
+            heapq.heappush(self._mayores, entrada)
+        elif entrada[:2] > self._mayores[0][:2]:
+            heapq.heapreplace(self._mayores, entrada)
+        totales = self._por_establecimiento.setdefault(txn["establishment"], {"total": 0.0, "count": 0})
+        totales["total"] += txn["amount"]
+        totales["count"] += 1
+
+    def top5(self) -> list:
+        return [txn for _, _, txn in sorted(self._mayores, key=lambda e: e[:2], reverse=True)]
+
+    def top3_recurrentes(self) -> list:
+        recurrentes = ({"establishment": est, "total": data["total"], "count": data["count"]}
+                       for est, data in self._por_establecimiento.items())
+        return heapq.nlargest(3, recurrentes, key=lambda x: x["total"])
+
+
+def analizar_estado_cuenta(pdf_file, question, plazo: Plazo) -> tuple:
+    """
+    Handler del análisis de PDF: recibe el archivo ya separado del multipart y retorna
+    (cuerpo, status). Lo usan la ruta de Flask y, sin pasar por HTTP, el orquestador en
+    modo monolito (or_monolito.py).
+    """
+    if pdf_file is None:
+        return {"error": "No se proporcionó el archivo PDF en 'file'"}, 400
+    if not question:
+        question = "Resume el análisis de gastos y proporciona recomendaciones para ahorrar dinero."
+
+    # Extraer las transacciones página por página, acumulando solo los agregados
+    gastos = Gastos()
+    try:
+        for txn in transacciones(lineas_pdf(pdf_file, plazo)):
+            gastos.agregar(txn)
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
+    except DemasiadasPaginas as e:
+        return respuesta_demasiadas_paginas(e), STATUS_DEMASIADAS_PAGINAS
+    except Exception as e:
+        return {"error": f"Error al leer el PDF: {e}"}, 500
+
+    if not gastos.cantidad:
+        return {"error": "No se encontraron transacciones en el PDF."}, 404
+
+    # Top 5 de mayores gastos y Top 3 de gastos recurrentes por establecimiento
+    top5 = gastos.top5()
+    top3_recurrentes = gastos.top3_recurrentes()
 
-    # Calcular el Top 5 de mayores gastos
-    top5 = sorted(transactions, key=lambda x: x["amount"], reverse=True)[:5]
-    
-    # Agrupar gastos recurrentes por establecimiento
-    establishment_totals = {}
-    for txn in transactions:
-        est = txn["establishment"]
-        amount = txn["amount"]
-        if est in establishment_totals:
-            establishment_totals[est]["total"] += amount
-            establishment_totals[est]["count"] += 1
-        else:
-            establishment_totals[est] = {"total": amount, "count": 1}
-    
-    recurrent_expenses = [
-        {"establishment": est, "total": data["total"], "count": data["count"]}
-        for est, data in establishment_totals.items()
-    ]
-    top3_recurrentes = sorted(recurrent_expenses, key=lambda x: x["total"], reverse=True)[:3]
-    
     # Construir un resumen en texto del análisis (para el LLM, no se envía en la respuesta)
     summary_text = "Datos extraídos del estado de cuenta:\n\n"
     summary_text += "Top 5 de mayores gastos:\n"
@@ -114,13 +129,47 @@ def analyze_pdf():
             ],
             max_tokens=300,
             temperature=0.3,
+            request_timeout=plazo.timeout("generacion"),
         )
         answer = response.choices[0].message["content"].strip()
-        return jsonify({
+        return {
             "respuesta": answer  # Solo devuelve la respuesta del LLM
-        }), 200
+        }, 200
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
     except Exception as e:
-        return jsonify({"error": f"Error al generar respuesta: {str(e)}"}), 500
+        if es_timeout(e):
+            return respuesta_plazo_vencido("generacion"), STATUS_PLAZO_VENCIDO
+        return {"error": f"Error al generar respuesta: {str(e)}"}, 500
+
+@app.route('/assistant/analyze-pdf', methods=['POST'])
+def analyze_pdf():
+    """
+    Endpoint: /assistant/analyze-pdf
+    Función: Analiza un estado de cuenta PDF subido por el usuario para:
+      - Extraer transacciones y calcular el Top 5 de mayores gastos.
+      - Agrupar y contabilizar gastos recurrentes (por establecimiento) y obtener el Top 3.
+      - Usar un modelo de lenguaje para responder una pregunta basada en el análisis realizado.
+    
+    Se espera:
+      - Un archivo PDF enviado bajo la clave "file" (multipart/form-data).
+      - Opcionalmente, un parámetro "question" (en form-data o JSON) que contenga la consulta a responder.
+         Si no se envía, se usará una pregunta por defecto.
+      - Opcionalmente, el header X-Deadline-Ms con el plazo restante (ver ass_plazo.py): la
+        extracción se detiene y responde 504 si el plazo se agota.
+    Las páginas se extraen en paralelo en un pool de procesos, con un tiempo máximo por documento
+    y un máximo de páginas (413 si lo supera); ver ass_pdf_extraccion.py.
+    """
+    plazo = Plazo.desde_headers(request.headers)
+    question = request.form.get("question")
+    if not question:
+        data = request.get_json(silent=True)
+        if data and "question" in data:
+            question = data["question"]
+    cuerpo, status = analizar_estado_cuenta(request.files.get('file'), question, plazo)
+    return responder(request, cuerpo, status)
+
+agregar_salud(app)
 
 if __name__ == '__main__':
-    app.run(port=5001, debug=True)
+    servir(app, 5001)
@@ -1,14 +1,15 @@
 import os
-from flask import Flask, request, jsonify
+import threading
+from flask import Flask, request
 from dotenv import load_dotenv
 import openai
 
-# Importaciones de LangChain
-from langchain.document_loaders import PyPDFLoader
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.chat_models import ChatOpenAI  # Importa la clase para modelos de chat
+from ass_codec import leer_cuerpo, responder, acepta_sse, responder_sse, evento_sse, evento_final
+from ass_servidor import agregar_salud, servir
+from ass_plazo import Plazo, PlazoVencido, es_timeout, respuesta_plazo_vencido, STATUS_PLAZO_VENCIDO
+from ass_rag_pipeline import (
+    contruccion_cadena, documentos_a_contexto, contexto_a_documentos, validar_lote, RAG_LOTE_CONCURRENCIA,
+)
 
 # Cargar variables de entorno y configurar la API key
 load_dotenv()
@@ -17,64 +18,103 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 app = Flask(__name__)
 
 
+# La cadena se construye una sola vez: al iniciar el servicio, o en la primera pregunta
+# cuando el orquestador monta este asistente en su proceso (ORQ_MODO=monolito)
+_qa_chain = None
+_qa_lock = threading.Lock()
 
-class LLM:
-    @staticmethod
-    def get_llm():
-        """
-        Retorna una instancia del LLM de LangChain usando ChatOpenAI.
-        Se utiliza para modelos de chat como gpt-3.5-turbo.
-        """
-        return ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-
-class VectorStore:
-    @staticmethod
-    def obtencion_vectores():
-        """
-        Crea un vector store a partir de los documentos PDF ubicados en la carpeta "data".
-        Se usan OpenAIEmbeddings (modelo "text-embedding-ada-002") y FAISS para indexar los documentos.
-        """
-        embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
-        documents = []
-        data_path = os.path.join(os.getcwd(), "../data")
-        if not os.path.exists(data_path):
-            print("No se encontró la carpeta 'data'.")
-        else:
-            for filename in os.listdir(data_path):
-                if filename.lower().endswith(".pdf"):
-                    file_path = os.path.join(data_path, filename)
-                    try:
-                        loader = PyPDFLoader(file_path)
-                        docs = loader.load()
-                        documents.extend(docs)
-                    except Exception as e:
-                        print(f"Error al cargar {filename}: {e}")
-        if not documents:
-            print("No se encontraron documentos en la carpeta 'data'.")
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        return vectorstore
-
-
-
-def contruccion_cadena():
+
+def obtener_cadena():
+    global _qa_chain
+    if _qa_chain is None:
+        with _qa_lock:
+            if _qa_chain is None:
+                _qa_chain = contruccion_cadena()
+    return _qa_chain
+
+
+# Handlers: reciben el cuerpo ya parseado y retornan (cuerpo, status). Los usan las rutas
+# de Flask y, sin pasar por HTTP, el orquestador en modo monolito (or_monolito.py).
+
+def responder_rag(data, plazo: Plazo) -> tuple:
+    if not data or "message" not in data:
+        return {"error": "No se proporcionó 'message' en la solicitud"}, 400
+
+    pregunta = data["message"]
+    try:
+        docs = contexto_a_documentos(data["contexto"]) if data.get("contexto") else None
+        # Usar invoke() en lugar de run() para evitar la advertencia de deprecación
+        result = obtener_cadena().invoke(pregunta, docs=docs, plazo=plazo, historial=data.get("historial"))
+        return {"respuesta": result}, 200
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
+    except Exception as e:
+        if es_timeout(e):
+            return respuesta_plazo_vencido("generate"), STATUS_PLAZO_VENCIDO
+        print(f"Error en /assistant/rag: {e}")
+        return {"error": str(e)}, 500
+
+
+def transmitir_rag(data, plazo: Plazo) -> tuple:
     """
-    Construye una cadena RetrievalQA utilizando:
-      - El vector store obtenido de los documentos PDF.
-      - El LLM configurado.
-      - Un retriever basado en similitud (k=3 documentos).
+    Como responder_rag, pero con status 200 el cuerpo es un generador de eventos SSE: uno
+    "fragmento" por cada trozo de la respuesta del LLM y al final "fin" (con el mismo cuerpo que
+    responder_rag) o "error" (con su status), porque el 200 ya se envió con el primer evento.
     """
-    vectorstore = VectorStore.obtencion_vectores()
-    llm = LLM.get_llm()
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",  # Concatena los documentos recuperados para generar la respuesta
-        retriever=vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3}),
-        return_source_documents=False,
-    )
-    return qa_chain
+    if not data or "message" not in data:
+        return {"error": "No se proporcionó 'message' en la solicitud"}, 400
+    return _eventos_rag(data["message"], data.get("contexto"), data.get("historial"), plazo), 200
+
+
+def _eventos_rag(pregunta: str, contexto, historial, plazo: Plazo):
+    fragmentos = []
+    try:
+        docs = contexto_a_documentos(contexto) if contexto else None
+        for fragmento in obtener_cadena().stream(pregunta, docs=docs, plazo=plazo, historial=historial):
+            fragmentos.append(fragmento)
+            yield evento_sse("fragmento", {"texto": fragmento})
+        yield evento_final(200, {"respuesta": {"query": pregunta, "result": "".join(fragmentos)}})
+    except PlazoVencido as e:
+        yield evento_final(STATUS_PLAZO_VENCIDO, respuesta_plazo_vencido(e.etapa))
+    except Exception as e:
+        if es_timeout(e):
+            yield evento_final(STATUS_PLAZO_VENCIDO, respuesta_plazo_vencido("generate"))
+            return
+        print(f"Error en /assistant/rag: {e}")
+        yield evento_final(500, {"error": str(e)})
 
-# Construir la cadena al iniciar el servicio
-qa_chain = contruccion_cadena()
+
+def recuperar_contexto(data, plazo: Plazo) -> tuple:
+    if not data or "message" not in data:
+        return {"error": "No se proporcionó 'message' en la solicitud"}, 400
+
+    try:
+        docs = obtener_cadena().recuperar(data["message"], plazo)
+        return {"contexto": documentos_a_contexto(docs)}, 200
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
+    except Exception as e:
+        if es_timeout(e):
+            return respuesta_plazo_vencido("embed"), STATUS_PLAZO_VENCIDO
+        print(f"Error en /assistant/rag/retrieve: {e}")
+        return {"error": str(e)}, 500
+
+
+def responder_lote(data, plazo: Plazo) -> tuple:
+    preguntas, error = validar_lote(data)
+    if error:
+        return {"error": error}, 400
+
+    try:
+        respuestas = obtener_cadena().invoke_lote(preguntas, max_concurrencia=RAG_LOTE_CONCURRENCIA, plazo=plazo)
+        return {"respuestas": respuestas}, 200
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
+    except Exception as e:
+        if es_timeout(e):
+            return respuesta_plazo_vencido("generate"), STATUS_PLAZO_VENCIDO
+        print(f"Error en /assistant/rag/batch: {e}")
+        return {"error": str(e)}, 500
 
 
 @app.route('/assistant/rag', methods=['POST'])
@@ -84,27 +124,57 @@ def assistant_rag():
     Función: Responde preguntas de educación financiera utilizando RAG.
     Se espera recibir un JSON con la clave "message" que contenga la consulta del usuario.
     
-    La cadena RetrievalQA se encarga de:
+    El pipeline RAG (ver ass_rag_pipeline.py) se encarga de:
       1. Recuperar los documentos (o fragmentos) relevantes a la pregunta.
       2. Generar una respuesta basada en dicha información.
+    Si el JSON trae "contexto" (obtenido antes con /assistant/rag/retrieve), se omite el paso 1.
+    Si trae "historial" (ver ass_historial.py), la respuesta tiene en cuenta la conversación previa.
+    Ambos campos los agrega solo el orquestador, que descarta los que envía el cliente
+    (ver orchestrator/or_servicios.py): este endpoint no debe quedar expuesto fuera de la red interna.
+    El header X-Deadline-Ms acota el tiempo total (ver ass_plazo.py); si se agota responde 504.
+    Con Accept: text/event-stream la respuesta se transmite por fragmentos a medida que el LLM
+    los genera (Server-Sent Events, ver transmitir_rag).
     """
-    data = request.get_json()
-    if not data or "message" not in data:
-        return jsonify({"error": "No se proporcionó 'message' en la solicitud"}), 400
+    data, plazo = leer_cuerpo(request), Plazo.desde_headers(request.headers)
+    if acepta_sse(request.headers):
+        cuerpo, status = transmitir_rag(data, plazo)
+        if status == 200:
+            return responder_sse(cuerpo)
+    else:
+        cuerpo, status = responder_rag(data, plazo)
+    return responder(request, cuerpo, status)
+
+
+@app.route('/assistant/rag/retrieve', methods=['POST'])
+def assistant_rag_retrieve():
+    """
+    Endpoint: /assistant/rag/retrieve
+    Función: Solo la recuperación (embedding de la pregunta + búsqueda en el índice), sin generar.
+    Retorna {"contexto": [...]} para enviarlo luego a /assistant/rag. El orquestador lo usa para
+    adelantar la recuperación mientras clasifica la intención. Respeta X-Deadline-Ms como /assistant/rag.
+    """
+    cuerpo, status = recuperar_contexto(leer_cuerpo(request), Plazo.desde_headers(request.headers))
+    return responder(request, cuerpo, status)
 
-    pregunta = data["message"]
-    try:
-        # Usar invoke() en lugar de run() para evitar la advertencia de deprecación
-        result = qa_chain.invoke(pregunta)
-        return jsonify({"respuesta": result}), 200
-    except Exception as e:
-        print(f"Error en /assistant/rag: {e}")
-        return jsonify({"error": str(e)}), 500
+
+@app.route('/assistant/rag/batch', methods=['POST'])
+def assistant_rag_batch():
+    """
+    Endpoint: /assistant/rag/batch
+    Función: Responde varias preguntas en una sola solicitud.
+    Se espera un JSON {"messages": [pregunta, ...]}; retorna {"respuestas": [...]} en el mismo
+    orden, cada una con el formato de "respuesta" de /assistant/rag. X-Deadline-Ms acota todo el lote.
+    """
+    cuerpo, status = responder_lote(leer_cuerpo(request), Plazo.desde_headers(request.headers))
+    return responder(request, cuerpo, status)
 
 
 # ------------------------------
 # Ejecutar el microservicio
 # ------------------------------
 
+agregar_salud(app)
+
 if __name__ == '__main__':
-    app.run(port=5002, debug=True)
+    obtener_cadena()
+    servir(app, 5002)
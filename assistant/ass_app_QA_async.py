@@ -0,0 +1,165 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from aiohttp import web
+from dotenv import load_dotenv
+import openai
+
+from ass_codec import aleer_cuerpo, aresponder, acepta_sse, aresponder_sse, evento_sse, evento_final
+from ass_openai_async import sesion_openai, abrir_sesion_openai, cerrar_sesion_openai
+from ass_servidor import aagregar_salud, aservir
+from ass_plazo import Plazo, respuesta_plazo_vencido, STATUS_PLAZO_VENCIDO
+from ass_rag_pipeline import (
+    contruccion_cadena, documentos_a_contexto, contexto_a_documentos, validar_lote, RAG_LOTE_CONCURRENCIA,
+)
+
+# Cargar variables de entorno y configurar la API key
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# Preguntas en vuelo admitidas por proceso y tamaño del pool de conexiones hacia OpenAI
+RAG_MAX_INFLIGHT = int(os.getenv("RAG_MAX_INFLIGHT", "500"))
+
+# Construir el pipeline al iniciar el servicio
+qa_chain = contruccion_cadena()
+
+
+async def abrir_sesion(app):
+    await abrir_sesion_openai(app)
+    app["inflight"] = asyncio.Semaphore(RAG_MAX_INFLIGHT)
+
+
+async def cerrar_sesion(app):
+    await cerrar_sesion_openai(app)
+
+
+@asynccontextmanager
+async def en_vuelo(app, plazo: Plazo):
+    """
+    Lugar entre las RAG_MAX_INFLIGHT preguntas en vuelo. La espera en la cola también cuenta
+    contra el plazo: si vence antes, asyncio.TimeoutError (504 plazo_vencido).
+    """
+    semaforo = app["inflight"]
+    await asyncio.wait_for(semaforo.acquire(), timeout=plazo.restante())
+    try:
+        yield
+    finally:
+        semaforo.release()
+
+
+async def assistant_rag(request):
+    """
+    Endpoint: /assistant/rag (versión asíncrona)
+    Función: Igual que ass_app_QA.assistant_rag, pero la espera del embedding y de la
+    generación no ocupa un hilo: un solo proceso atiende cientos de preguntas en vuelo.
+    Con Accept: text/event-stream transmite la respuesta por fragmentos, como la versión Flask.
+    """
+    data = await aleer_cuerpo(request)
+    if not data or "message" not in data:
+        return aresponder(request, {"error": "No se proporcionó 'message' en la solicitud"}, 400)
+
+    pregunta = data["message"]
+    plazo = Plazo.desde_headers(request.headers)
+    if acepta_sse(request.headers):
+        return await aresponder_sse(request, _eventos_rag(request.app, pregunta, data.get("contexto"),
+                                                               data.get("historial"), plazo))
+    try:
+        docs = contexto_a_documentos(data["contexto"]) if data.get("contexto") else None
+        # wait_for cancela el embedding o la generación en curso cuando se agota el plazo
+        async with en_vuelo(request.app, plazo):
+            result = await asyncio.wait_for(qa_chain.ainvoke(pregunta, docs=docs, historial=data.get("historial")), timeout=plazo.restante())
+        return aresponder(request, {"respuesta": result}, 200)
+    except asyncio.TimeoutError:
+        return aresponder(request, respuesta_plazo_vencido("rag"), STATUS_PLAZO_VENCIDO)
+    except Exception as e:
+        print(f"Error en /assistant/rag: {e}")
+        return aresponder(request, {"error": str(e)}, 500)
+
+
+async def _eventos_rag(app, pregunta: str, contexto, historial, plazo: Plazo):
+    """Eventos SSE de /assistant/rag, con el mismo formato que ass_app_QA.transmitir_rag."""
+    fragmentos = []
+    try:
+        docs = contexto_a_documentos(contexto) if contexto else None
+        async with en_vuelo(app, plazo):
+            generador = qa_chain.astream(pregunta, docs=docs, historial=historial)
+            try:
+                while True:
+                    # El plazo acota toda la respuesta: se espera cada fragmento con lo que queda
+                    try:
+                        fragmento = await asyncio.wait_for(generador.__anext__(), timeout=plazo.restante())
+                    except StopAsyncIteration:
+                        break
+                    fragmentos.append(fragmento)
+                    yield evento_sse("fragmento", {"texto": fragmento})
+            finally:
+                await generador.aclose()
+        yield evento_final(200, {"respuesta": {"query": pregunta, "result": "".join(fragmentos)}})
+    except asyncio.TimeoutError:
+        yield evento_final(STATUS_PLAZO_VENCIDO, respuesta_plazo_vencido("rag"))
+    except Exception as e:
+        print(f"Error en /assistant/rag: {e}")
+        yield evento_final(500, {"error": str(e)})
+
+
+async def assistant_rag_retrieve(request):
+    """
+    Endpoint: /assistant/rag/retrieve (versión asíncrona)
+    Función: Igual que ass_app_QA.assistant_rag_retrieve.
+    """
+    data = await aleer_cuerpo(request)
+    if not data or "message" not in data:
+        return aresponder(request, {"error": "No se proporcionó 'message' en la solicitud"}, 400)
+
+    plazo = Plazo.desde_headers(request.headers)
+    try:
+        async with en_vuelo(request.app, plazo):
+            docs = await asyncio.wait_for(qa_chain.arecuperar(data["message"]), timeout=plazo.restante())
+        return aresponder(request, {"contexto": documentos_a_contexto(docs)}, 200)
+    except asyncio.TimeoutError:
+        return aresponder(request, respuesta_plazo_vencido("retrieve"), STATUS_PLAZO_VENCIDO)
+    except Exception as e:
+        print(f"Error en /assistant/rag/retrieve: {e}")
+        return aresponder(request, {"error": str(e)}, 500)
+
+
+async def assistant_rag_batch(request):
+    """
+    Endpoint: /assistant/rag/batch (versión asíncrona)
+    Función: Igual que ass_app_QA.assistant_rag_batch.
+    """
+    data = await aleer_cuerpo(request)
+    preguntas, error = validar_lote(data)
+    if error:
+        return aresponder(request, {"error": error}, 400)
+
+    plazo = Plazo.desde_headers(request.headers)
+    try:
+        async with en_vuelo(request.app, plazo):
+            respuestas = await asyncio.wait_for(qa_chain.ainvoke_lote(preguntas, max_concurrencia=RAG_LOTE_CONCURRENCIA),
+                                                timeout=plazo.restante())
+        return aresponder(request, {"respuestas": respuestas}, 200)
+    except asyncio.TimeoutError:
+        return aresponder(request, respuesta_plazo_vencido("rag"), STATUS_PLAZO_VENCIDO)
+    except Exception as e:
+        print(f"Error en /assistant/rag/batch: {e}")
+        return aresponder(request, {"error": str(e)}, 500)
+
+
+def crear_app():
+    app = web.Application(middlewares=[sesion_openai])
+    app.on_startup.append(abrir_sesion)
+    app.on_cleanup.append(cerrar_sesion)
+    app.router.add_post('/assistant/rag', assistant_rag)
+    app.router.add_post('/assistant/rag/retrieve', assistant_rag_retrieve)
+    app.router.add_post('/assistant/rag/batch', assistant_rag_batch)
+    aagregar_salud(app)
+    return app
+
+
+# ------------------------------
+# Ejecutar el microservicio
+# ------------------------------
+
+if __name__ == '__main__':
+    aservir(crear_app(), 5002)
@@ -1,11 +1,16 @@
 import os
 import json
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from dotenv import load_dotenv
 import openai
 import logging
 
+from ass_codec import leer_cuerpo, responder
+from ass_servidor import agregar_salud, servir
+from ass_plazo import Plazo, PlazoVencido, respuesta_plazo_vencido, STATUS_PLAZO_VENCIDO
+from ass_historial import a_texto
+
 # Configurar logging (solo errores)
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
@@ -13,11 +18,17 @@ logger = logging.getLogger(__name__)
 # Cargar variables de entorno
 load_dotenv()
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+# Timeout máximo de una búsqueda en SerpAPI (además del plazo restante de la solicitud)
+SERPAPI_TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", "10"))
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 app = Flask(__name__)
 
-def extraer_parametros(query: str) -> dict:
+def extraer_parametros(query: str, timeout: float = None, historial: dict = None) -> dict:
+    # Con historial (ver ass_historial.py) se resuelven las preguntas de seguimiento ("¿y en negro?")
+    conversacion = a_texto(historial)
+    if conversacion:
+        conversacion = f"Conversación previa (úsala si la pregunta la continúa):\n{conversacion}\n"
     prompt = f"""
 Analiza la siguiente pregunta y extrae los parámetros relevantes para realizar una búsqueda de productos.
 Devuelve un JSON con las siguientes claves:
@@ -28,6 +39,7 @@ Devuelve un JSON con las siguientes claves:
 - max_price (opcional): el precio máximo, si se menciona.
 - num_results (opcional): el número de resultados deseados (entre 1 y 5).
 
+{conversacion}
 Pregunta: "{query}"
 
 Ejemplo de respuesta JSON:
@@ -50,7 +62,8 @@ Si algún parámetro no se menciona, deja el valor como una cadena vacía.
                 {"role": "user", "content": prompt}
             ],
             max_tokens=150,
-            temperature=0.0
+            temperature=0.0,
+            request_timeout=timeout
         )
         respuesta_texto = response.choices[0].message["content"].strip()
         if not respuesta_texto:
@@ -90,7 +103,7 @@ def build_search_query(params: dict) -> str:
     query_parts.append("Ecuador")
     return " ".join(query_parts)
 
-def buscar_productos(query: str, num_results: int):
+def buscar_productos(query: str, num_results: int, timeout: float = SERPAPI_TIMEOUT):
     search_url = "https://serpapi.com/search"
     params = {
         "q": query,
@@ -102,7 +115,7 @@ def buscar_productos(query: str, num_results: int):
         "num": num_results
     }
     try:
-        response = requests.get(search_url, params=params)
+        response = requests.get(search_url, params=params, timeout=timeout)
         response.raise_for_status()
         data = response.json()
         productos = []
@@ -125,7 +138,7 @@ def buscar_productos(query: str, num_results: int):
         logger.error("Error en búsqueda de productos: %s", e)
         return []
 
-def recomendar_productos(productos: list, query_original: str, final_count: int) -> list:
+def recomendar_productos(productos: list, query_original: str, final_count: int, timeout: float = None) -> list:
     prompt = (
         "Eres un asesor de compras experto en el mercado ecuatoriano. "
         "Analiza la siguiente lista de productos y la consulta del usuario, y selecciona un top de productos recomendados. "
@@ -145,7 +158,8 @@ def recomendar_productos(productos: list, query_original: str, final_count: int)
                 {"role": "user", "content": prompt}
             ],
             max_tokens=300,
-            temperature=0.0
+            temperature=0.0,
+            request_timeout=timeout
         )
         respuesta_texto = response.choices[0].message["content"].strip()
         if respuesta_texto.startswith("```"):
@@ -171,36 +185,53 @@ def recomendar_productos(productos: list, query_original: str, final_count: int)
             })
         return fallback
 
-@app.route('/assistant/shopping-advisor', methods=['POST'])
-def shopping_advisor():
-    data = request.get_json()
+def asesorar_compras(data, plazo: Plazo) -> tuple:
+    """
+    Handler del asesor de compras: recibe el cuerpo ya parseado y retorna (cuerpo, status).
+    Lo usan la ruta de Flask y, sin pasar por HTTP, el orquestador en modo monolito.
+    """
     if not data or "message" not in data:
-        return jsonify({"error": "No se proporcionó 'message' en la solicitud"}), 400
+        return {"error": "No se proporcionó 'message' en la solicitud"}, 400
 
-    parametros = extraer_parametros(data["message"])
-    query = build_search_query(parametros)
-    
+    # Cada etapa usa como timeout lo que queda del plazo (header X-Deadline-Ms, ver ass_plazo.py).
+    # Si una llamada vence, la etapa usa su valor de respaldo; si ya no queda plazo, se responde 504.
     try:
-        num_results = int(parametros.get("num_results", ""))
-        num_results = max(1, min(num_results, 5))
-    except Exception:
-        num_results = 3
-    
-    productos = buscar_productos(query, num_results)
-    if not productos:
-        fallback_params = parametros.copy()
-        fallback_params["min_price"] = ""
-        fallback_params["max_price"] = ""
-        fallback_query = build_search_query(fallback_params)
-        productos = buscar_productos(fallback_query, num_results)
-    
-    if not productos:
-        return jsonify({"error": "No se encontraron productos para el término de búsqueda."}), 404
-    
-    final_count = num_results if num_results > 0 else 3
-    recomendaciones = recomendar_productos(productos, data["message"], final_count)
-    
-    return jsonify({"resultados": recomendaciones}), 200
+        parametros = extraer_parametros(data["message"], timeout=plazo.timeout("extraer_parametros"),
+                                        historial=data.get("historial"))
+        query = build_search_query(parametros)
+
+        try:
+            num_results = int(parametros.get("num_results", ""))
+            num_results = max(1, min(num_results, 5))
+        except Exception:
+            num_results = 3
+
+        productos = buscar_productos(query, num_results, timeout=plazo.timeout("buscar_productos", SERPAPI_TIMEOUT))
+        if not productos:
+            fallback_params = parametros.copy()
+            fallback_params["min_price"] = ""
+            fallback_params["max_price"] = ""
+            fallback_query = build_search_query(fallback_params)
+            productos = buscar_productos(fallback_query, num_results,
+                                         timeout=plazo.timeout("buscar_productos", SERPAPI_TIMEOUT))
+
+        if not productos:
+            return {"error": "No se encontraron productos para el término de búsqueda."}, 404
+
+        final_count = num_results if num_results > 0 else 3
+        recomendaciones = recomendar_productos(productos, data["message"], final_count,
+                                               timeout=plazo.timeout("recomendar_productos"))
+    except PlazoVencido as e:
+        return respuesta_plazo_vencido(e.etapa), STATUS_PLAZO_VENCIDO
+
+    return {"resultados": recomendaciones}, 200
+
+@app.route('/assistant/shopping-advisor', methods=['POST'])
+def shopping_advisor():
+    cuerpo, status = asesorar_compras(leer_cuerpo(request), Plazo.desde_headers(request.headers))
+    return responder(request, cuerpo, status)
+
+agregar_salud(app)
 
 if __name__ == '__main__':
-    app.run(port=5003, debug=True)
+    servir(app, 5003)
@@ -0,0 +1,90 @@
+"""
+Almacén de fragmentos (chunks) en disco, leído con memory-map.
+
+Estructura del directorio:
+  - textos.bin   : textos UTF-8 de todos los fragmentos concatenados.
+  - offsets.npy  : int64[n + 1], el fragmento i ocupa textos.bin[offsets[i]:offsets[i + 1]].
+  - fuentes.npy  : uint16[n], índice del archivo de origen en fuentes.json.
+  - paginas.npy  : int32[n], página (0-indexada, como PyPDFLoader) del fragmento.
+  - fuentes.json : lista de rutas de archivo de origen.
+
+Abrir el almacén no lee los textos: solo se mapean los archivos y los Document se
+construyen bajo demanda para los hits del top-k.
+"""
+import os
+import json
+import mmap
+import numpy as np
+from langchain.schema import Document
+
+TEXTOS = "textos.bin"
+OFFSETS = "offsets.npy"
+FUENTES = "fuentes.npy"
+PAGINAS = "paginas.npy"
+FUENTES_JSON = "fuentes.json"
+
+
+class ChunkStore:
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        with open(os.path.join(directorio, FUENTES_JSON), encoding="utf-8") as f:
+            self.fuentes = json.load(f)
+        self.offsets = np.load(os.path.join(directorio, OFFSETS), mmap_mode="r")
+        self.columna_fuente = np.load(os.path.join(directorio, FUENTES), mmap_mode="r")
+        self.columna_pagina = np.load(os.path.join(directorio, PAGINAS), mmap_mode="r")
+        self._archivo = open(os.path.join(directorio, TEXTOS), "rb")
+        # mmap no admite archivos vacíos (corpus sin texto)
+        if os.fstat(self._archivo.fileno()).st_size:
+            self._textos = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._textos = b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def texto(self, i: int) -> str:
+        return self._textos[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def metadata(self, i: int) -> dict:
+        return {"source": self.fuentes[int(self.columna_fuente[i])], "page": int(self.columna_pagina[i])}
+
+    def documento(self, i: int) -> Document:
+        return Document(page_content=self.texto(i), metadata=self.metadata(i))
+
+    def cerrar(self):
+        if isinstance(self._textos, mmap.mmap):
+            self._textos.close()
+        self._archivo.close()
+
+    @staticmethod
+    def existe(directorio: str) -> bool:
+        return all(os.path.exists(os.path.join(directorio, nombre))
+                   for nombre in (TEXTOS, OFFSETS, FUENTES, PAGINAS, FUENTES_JSON))
+
+    @staticmethod
+    def escribir(directorio: str, documents: list):
+        """
+        Escribe los documentos en formato de almacén. Los textos se vuelcan en streaming
+        al archivo binario; solo las columnas de metadata (unos bytes por fragmento) quedan en memoria.
+        """
+        os.makedirs(directorio, exist_ok=True)
+        fuentes = {}
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        columna_fuente = np.zeros(len(documents), dtype=np.uint16)
+        columna_pagina = np.zeros(len(documents), dtype=np.int32)
+
+        with open(os.path.join(directorio, TEXTOS), "wb") as f:
+            for i, doc in enumerate(documents):
+                datos = doc.page_content.encode("utf-8")
+                f.write(datos)
+                offsets[i + 1] = offsets[i] + len(datos)
+                fuente = doc.metadata.get("source", "")
+                columna_fuente[i] = fuentes.setdefault(fuente, len(fuentes))
+                columna_pagina[i] = doc.metadata.get("page", -1)
+
+        np.save(os.path.join(directorio, OFFSETS), offsets)
+        np.save(os.path.join(directorio, FUENTES), columna_fuente)
+        np.save(os.path.join(directorio, PAGINAS), columna_pagina)
+        with open(os.path.join(directorio, FUENTES_JSON), "w", encoding="utf-8") as f:
+            json.dump(list(fuentes), f, ensure_ascii=False)
@@ -0,0 +1,96 @@
+"""
+Codificación de los cuerpos entre el orquestador y los asistentes.
+
+JSON por defecto; MessagePack (application/msgpack) cuando el cliente lo pide:
+  - Solicitud: se decodifica según el Content-Type (JSON o MessagePack).
+  - Respuesta: MessagePack si el header Accept incluye application/msgpack, si no JSON.
+Los clientes externos (Postman, curl) no cambian: sin esos headers todo sigue en JSON.
+
+Las rutas que generan la respuesta por partes (/assistant/rag) la transmiten como Server-Sent
+Events (text/event-stream) cuando el header Accept lo incluye: un evento por fragmento y uno
+final, "fin" o "error", con el status y el mismo cuerpo que la respuesta sin streaming.
+"""
+import json
+
+import msgpack
+from aiohttp import web
+from flask import Response, jsonify
+
+MIME_JSON = "application/json"
+MIME_MSGPACK = "application/msgpack"
+MIME_SSE = "text/event-stream"
+# Que ni el cliente ni un proxy (nginx) acumulen los eventos antes de entregarlos
+SIN_BUFFER = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def acepta_msgpack(headers) -> bool:
+    return MIME_MSGPACK in headers.get("Accept", "")
+
+
+def acepta_sse(headers) -> bool:
+    return MIME_SSE in headers.get("Accept", "")
+
+
+def decodificar(datos: bytes, mimetype: str):
+    """Cuerpo de una solicitud (None si viene vacío o no se puede decodificar)."""
+    if not datos:
+        return None
+    try:
+        if mimetype == MIME_MSGPACK:
+            return msgpack.unpackb(datos)
+        return json.loads(datos)
+    except (ValueError, msgpack.UnpackException):
+        return None
+
+
+def leer_cuerpo(request):
+    """Cuerpo de una solicitud de Flask, en JSON o MessagePack."""
+    return decodificar(request.get_data(), request.mimetype)
+
+
+async def aleer_cuerpo(request):
+    """Cuerpo de una solicitud de aiohttp, en JSON o MessagePack."""
+    return decodificar(await request.read(), request.content_type)
+
+
+def responder(request, cuerpo: dict, status: int):
+    """Respuesta de Flask en el formato que acepta el cliente."""
+    if acepta_msgpack(request.headers):
+        return Response(msgpack.packb(cuerpo), status=status, mimetype=MIME_MSGPACK)
+    return jsonify(cuerpo), status
+
+
+def aresponder(request, cuerpo: dict, status: int = 200) -> web.Response:
+    """Respuesta de aiohttp en el formato que acepta el cliente."""
+    if acepta_msgpack(request.headers):
+        return web.Response(body=msgpack.packb(cuerpo), status=status, content_type=MIME_MSGPACK)
+    return web.json_response(cuerpo, status=status)
+
+
+def evento_sse(evento: str, datos: dict) -> bytes:
+    """Un evento Server-Sent Events con los datos en JSON (una sola línea)."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def evento_final(status: int, cuerpo: dict) -> bytes:
+    """Último evento de un flujo: "fin" o "error" según el status, con el cuerpo de la respuesta."""
+    return evento_sse("fin" if status < 400 else "error", {"status": status, **cuerpo})
+
+
+def responder_sse(eventos) -> Response:
+    """Respuesta de Flask que envía cada evento del generador apenas se produce."""
+    return Response(eventos, mimetype=MIME_SSE, headers=SIN_BUFFER)
+
+
+async def aresponder_sse(request, eventos) -> web.StreamResponse:
+    """Respuesta de aiohttp que envía cada evento del generador asíncrono apenas se produce."""
+    respuesta = web.StreamResponse(headers={"Content-Type": MIME_SSE, **SIN_BUFFER})
+    await respuesta.prepare(request)
+    try:
+        async for evento in eventos:
+            await respuesta.write(evento)
+    finally:
+        # Si el cliente se desconecta, se cancela la generación en curso
+        await eventos.aclose()
+    await respuesta.write_eof()
+    return respuesta
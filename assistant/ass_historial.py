@@ -0,0 +1,38 @@
+"""
+Historial de la conversación que el orquestador envía en el campo "historial" del cuerpo
+(ver orchestrator/or_memoria.py): {"resumen": "...", "turnos": [{"pregunta", "respuesta"}, ...]}.
+
+Ya viene acotado en tokens; los asistentes no guardan estado y solo lo agregan a sus prompts
+para entender preguntas de seguimiento ("¿y en color negro?", "¿cuánto era el total?").
+
+Cuando el mensaje es una parte de una consulta con varias intenciones (ver
+orchestrator/or_descomposicion.py), "consulta" trae el mensaje completo del usuario: la parte
+se responde con ese contexto, pero sin responder las otras partes.
+"""
+
+
+def normalizar(historial):
+    """(resumen, turnos) válidos del historial recibido; ("", []) si no hay o no tiene el formato."""
+    if not isinstance(historial, dict):
+        return "", []
+    resumen = historial.get("resumen") if isinstance(historial.get("resumen"), str) else ""
+    turnos = [t for t in historial.get("turnos") or []
+              if isinstance(t, dict) and isinstance(t.get("pregunta"), str) and isinstance(t.get("respuesta"), str)]
+    return resumen, turnos
+
+
+def consulta(historial) -> str:
+    """El mensaje completo del que la pregunta es una parte ("" si la pregunta es el mensaje entero)."""
+    if not isinstance(historial, dict) or not isinstance(historial.get("consulta"), str):
+        return ""
+    return historial["consulta"]
+
+
+def a_texto(historial) -> str:
+    """El historial como bloque de texto para un prompt ("" si no hay)."""
+    resumen, turnos = normalizar(historial)
+    partes = [f"Resumen de la conversación: {resumen}"] if resumen else []
+    partes += [f"Usuario: {t['pregunta']}\nAsistente: {t['respuesta']}" for t in turnos]
+    if consulta(historial):
+        partes.append(f"Mensaje completo del usuario (la pregunta es solo una parte): {consulta(historial)}")
+    return "\n".join(partes)
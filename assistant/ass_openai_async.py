@@ -0,0 +1,30 @@
+"""
+Sesión aiohttp compartida para las llamadas a OpenAI desde los servicios asyncio
+(assistant/ass_app_QA_async.py y orchestrator/or_app_async.py).
+
+openai<1.0 usa una ContextVar (openai.aiosession) para la sesión aiohttp; sin ella abre una
+conexión nueva por llamada. abrir_sesion_openai crea una sesión por aplicación, con hasta
+OPENAI_MAX_CONNECTIONS conexiones reutilizables, y el middleware sesion_openai la fija en
+cada solicitud.
+"""
+import os
+import aiohttp
+from aiohttp import web
+import openai
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+
+
+@web.middleware
+async def sesion_openai(request, handler):
+    openai.aiosession.set(request.app["openai_session"])
+    return await handler(request)
+
+
+async def abrir_sesion_openai(app):
+    connector = aiohttp.TCPConnector(limit=OPENAI_MAX_CONNECTIONS, keepalive_timeout=30)
+    app["openai_session"] = aiohttp.ClientSession(connector=connector)
+
+
+async def cerrar_sesion_openai(app):
+    await app["openai_session"].close()
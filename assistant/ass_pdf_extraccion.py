@@ -0,0 +1,162 @@
+"""
+Extracción del texto de un estado de cuenta PDF en un pool de procesos.
+
+pdfplumber es CPU intensivo y retiene el GIL: extraído en el hilo de la solicitud, un estado
+de cuenta grande frena a todas las demás solicitudes del worker. Aquí las páginas se reparten
+en bloques contiguos entre ASSISTANT_PDF_PROCESOS procesos y el texto se devuelve en el orden
+del documento, a medida que llegan los bloques:
+  - Unos 2 bloques por proceso, de al menos ASSISTANT_PDF_PAGINAS_BLOQUE páginas: cada bloque
+    vuelve a abrir el PDF, así que más bloques no acortan la extracción. Los objetos de cada
+    página se liberan en el proceso apenas se extrae su texto; a la solicitud solo vuelve el texto.
+  - Un documento de hasta ASSISTANT_PDF_PAGINAS_BLOQUE páginas (o ASSISTANT_PDF_PROCESOS=0) se
+    extrae en el mismo proceso: para una o dos páginas no compensa el costo de repartirlas.
+  - Más de ASSISTANT_PDF_MAX_PAGINAS páginas: DemasiadasPaginas (413), sin extraer nada.
+  - Cada documento tiene ASSISTANT_PDF_TIMEOUT_S para extraerse, además del plazo de la
+    solicitud; si se agota, PlazoVencido("extraccion"): los bloques en cola se cancelan y los
+    procesos del pool se terminan, porque un bloque en curso no se puede interrumpir de otro
+    modo. El próximo documento usa un pool nuevo; los documentos que estaban en el pool
+    terminado reenvían una vez sus bloques pendientes.
+  - Si un proceso muere (p. ej. sin memoria), el pool se cierra y el próximo documento usa uno nuevo.
+Los procesos se crean con "spawn" (no heredan los hilos de Flask). Cada uno importa este módulo
+y además vuelve a importar el módulo principal como __mp_main__: al ejecutar
+ass_app_PDFAnalyzer.py, cada proceso carga el .env y crea la app Flask (sin levantar el servidor).
+"""
+import os
+import shutil
+import threading
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as TimeoutFuturo
+
+import pdfplumber
+
+from ass_plazo import Plazo, PlazoVencido
+
+ASSISTANT_PDF_PROCESOS = int(os.getenv("ASSISTANT_PDF_PROCESOS", str(os.cpu_count() or 1)))
+ASSISTANT_PDF_PAGINAS_BLOQUE = int(os.getenv("ASSISTANT_PDF_PAGINAS_BLOQUE", "8"))
+ASSISTANT_PDF_MAX_PAGINAS = int(os.getenv("ASSISTANT_PDF_MAX_PAGINAS", "500"))
+ASSISTANT_PDF_TIMEOUT_S = float(os.getenv("ASSISTANT_PDF_TIMEOUT_S", "60"))
+STATUS_DEMASIADAS_PAGINAS = 413
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class DemasiadasPaginas(Exception):
+
+    def __init__(self, paginas: int):
+        super().__init__(f"El PDF tiene {paginas} páginas; el máximo es {ASSISTANT_PDF_MAX_PAGINAS}")
+        self.paginas = paginas
+
+
+def _procesos() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=ASSISTANT_PDF_PROCESOS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _descartar(pool: ProcessPoolExecutor) -> bool:
+    """Termina los procesos de `pool` y lo cierra; True si todavía era el pool en uso."""
+    global _pool
+    with _pool_lock:
+        actual = _pool is pool
+        if actual:
+            _pool = None
+    # ProcessPoolExecutor no expone cómo terminar sus procesos (hasta Python 3.14)
+    for proceso in list((pool._processes or {}).values()):
+        proceso.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+    return actual
+
+
+def _texto_paginas(pdf, inicio: int, fin: int) -> list:
+    """Texto de las páginas [inicio, fin); cada página se libera apenas se extrae."""
+    textos = []
+    for page in pdf.pages[inicio:fin]:
+        try:
+            textos.append(page.extract_text() or "")
+        finally:
+            page.close()
+    return textos
+
+
+def extraer_bloque(ruta: str, inicio: int, fin: int) -> list:
+    """Tarea de un proceso del pool: texto de las páginas [inicio, fin) del PDF en `ruta`."""
+    with pdfplumber.open(ruta) as pdf:
+        return _texto_paginas(pdf, inicio, fin)
+
+
+def _en_proceso(pdf, paginas: int, plazo: Plazo, documento: Plazo):
+    for inicio in range(paginas):
+        plazo.verificar("extraccion")
+        documento.verificar("extraccion")
+        yield from _texto_paginas(pdf, inicio, inicio + 1)
+
+
+def _en_pool(ruta: str, paginas: int, plazo: Plazo, documento: Plazo):
+    tamano = max(ASSISTANT_PDF_PAGINAS_BLOQUE, -(-paginas // (2 * ASSISTANT_PDF_PROCESOS)))
+    # Bloques aún no entregados, en orden; los primeros len(en_vuelo) ya están enviados al pool
+    pendientes = [(inicio, min(inicio + tamano, paginas)) for inicio in range(0, paginas, tamano)]
+    reintentar = True
+    while pendientes:
+        pool = _procesos()
+        en_vuelo = []
+        try:
+            while pendientes:
+                while len(en_vuelo) < min(2 * ASSISTANT_PDF_PROCESOS, len(pendientes)):
+                    en_vuelo.append(pool.submit(extraer_bloque, ruta, *pendientes[len(en_vuelo)]))
+                timeout = min(plazo.timeout("extraccion"), documento.timeout("extraccion"))
+                try:
+                    textos = en_vuelo[0].result(timeout=timeout)
+                except TimeoutFuturo:
+                    _descartar(pool)
+                    raise PlazoVencido("extraccion")
+                en_vuelo.pop(0)
+                pendientes.pop(0)
+                yield from textos
+        except (BrokenProcessPool, CancelledError):
+            # Si otro documento ya había terminado el pool (por su plazo), se reintenta en uno
+            # nuevo; si el pool se rompió con este documento, no
+            if _descartar(pool) or not reintentar:
+                raise
+            reintentar = False
+        finally:
+            for futuro in en_vuelo:
+                futuro.cancel()
+
+
+def paginas_pdf(pdf_file, plazo: Plazo):
+    """
+    Texto de cada página del PDF (archivo abierto o ruta), en orden. Lanza DemasiadasPaginas o
+    PlazoVencido según la descripción del módulo.
+    """
+    documento = Plazo(ASSISTANT_PDF_TIMEOUT_S * 1000)
+    with pdfplumber.open(pdf_file) as pdf:
+        paginas = len(pdf.pages)
+        if paginas > ASSISTANT_PDF_MAX_PAGINAS:
+            raise DemasiadasPaginas(paginas)
+        if ASSISTANT_PDF_PROCESOS <= 0 or paginas <= ASSISTANT_PDF_PAGINAS_BLOQUE:
+            yield from _en_proceso(pdf, paginas, plazo, documento)
+            return
+    if isinstance(pdf_file, (str, os.PathLike)):
+        yield from _en_pool(pdf_file, paginas, plazo, documento)
+        return
+    # Los procesos del pool abren el PDF desde disco en lugar de recibir sus bytes en cada bloque
+    descriptor, ruta = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(descriptor, "wb") as copia:
+            pdf_file.seek(0)
+            shutil.copyfileobj(pdf_file, copia)
+        yield from _en_pool(ruta, paginas, plazo, documento)
+    finally:
+        os.remove(ruta)
+
+
+def respuesta_demasiadas_paginas(e: DemasiadasPaginas) -> dict:
+    return {"error": str(e), "codigo": "demasiadas_paginas", "paginas": e.paginas,
+            "maximo": ASSISTANT_PDF_MAX_PAGINAS}
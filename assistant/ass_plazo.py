@@ -0,0 +1,66 @@
+"""
+Plazo (deadline) de una solicitud a los asistentes.
+
+El orquestador envía en el header X-Deadline-Ms el presupuesto restante en milisegundos
+(relativo, para no depender de relojes sincronizados). Cada etapa pide su timeout al plazo:
+si ya no queda tiempo se lanza PlazoVencido y el endpoint responde 504 con
+{"error", "codigo": "plazo_vencido", "etapa"} en lugar de seguir trabajando.
+"""
+import os
+import time
+import asyncio
+import requests
+import openai
+
+HEADER_PLAZO = "X-Deadline-Ms"
+# Plazo cuando la solicitud no trae el header, y máximo aceptado
+ASSISTANT_PLAZO_MS = int(os.getenv("ASSISTANT_PLAZO_MS", "30000"))
+ASSISTANT_PLAZO_MAX_MS = int(os.getenv("ASSISTANT_PLAZO_MAX_MS", "120000"))
+STATUS_PLAZO_VENCIDO = 504
+
+
+class PlazoVencido(Exception):
+
+    def __init__(self, etapa: str):
+        super().__init__(f"Se agotó el plazo de la solicitud en la etapa '{etapa}'")
+        self.etapa = etapa
+
+
+class Plazo:
+
+    def __init__(self, ms: float):
+        self.limite = time.monotonic() + ms / 1000
+
+    @classmethod
+    def desde_headers(cls, headers):
+        try:
+            ms = int(headers.get(HEADER_PLAZO, ASSISTANT_PLAZO_MS))
+        except ValueError:
+            ms = ASSISTANT_PLAZO_MS
+        return cls(min(ms, ASSISTANT_PLAZO_MAX_MS))
+
+    def restante(self) -> float:
+        """Segundos que quedan (0 si ya venció)."""
+        return max(0.0, self.limite - time.monotonic())
+
+    def verificar(self, etapa: str):
+        if self.restante() <= 0:
+            raise PlazoVencido(etapa)
+
+    def timeout(self, etapa: str, maximo: float = None) -> float:
+        """Timeout en segundos para la llamada de `etapa`; PlazoVencido si ya no queda tiempo."""
+        self.verificar(etapa)
+        restante = self.restante()
+        return min(restante, maximo) if maximo else restante
+
+
+def es_timeout(e: Exception) -> bool:
+    return isinstance(e, (openai.error.Timeout, requests.Timeout, asyncio.TimeoutError))
+
+
+def respuesta_plazo_vencido(etapa: str) -> dict:
+    return {
+        "error": f"Se agotó el plazo de la solicitud en la etapa '{etapa}'",
+        "codigo": "plazo_vencido",
+        "etapa": etapa,
+    }
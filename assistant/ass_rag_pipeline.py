@@ -0,0 +1,427 @@
+import os
+import time
+import threading
+import faiss
+import openai
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TimeoutFuturo
+import numpy as np
+from dotenv import load_dotenv
+
+# Importaciones de LangChain
+from langchain.document_loaders import PyPDFLoader
+from langchain.embeddings import OpenAIEmbeddings, CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain.chat_models import ChatOpenAI  # Importa la clase para modelos de chat
+from langchain.schema import Document, SystemMessage, HumanMessage, AIMessage
+
+from ass_chunk_store import ChunkStore
+from ass_historial import normalizar, consulta
+from ass_plazo import PlazoVencido
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Carpeta con los PDF de la base documental y caché local de embeddings
+DATA_PATH = os.getenv("RAG_DATA_PATH", os.path.join(BASE_DIR, "..", "data"))
+EMBEDDINGS_CACHE_DIR = os.getenv("EMBEDDINGS_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "embeddings"))
+# Índice persistido (vectores FAISS + almacén de fragmentos); RAG_REINDEXAR=1 fuerza reconstruirlo
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, ".cache", "index"))
+RAG_REINDEXAR = os.getenv("RAG_REINDEXAR", "0") == "1"
+INDEX_FILE = "vectores.faiss"
+# Shards remotos del índice (separados por coma); vacío = índice local en INDEX_DIR
+RAG_SHARD_URLS = [url.strip() for url in os.getenv("RAG_SHARD_URLS", "").split(",") if url.strip()]
+EMBEDDINGS_MODEL = "text-embedding-ada-002"
+# /assistant/rag/batch: preguntas por solicitud y generaciones concurrentes por lote
+RAG_LOTE_MAX = int(os.getenv("RAG_LOTE_MAX", "100"))
+RAG_LOTE_CONCURRENCIA = int(os.getenv("RAG_LOTE_CONCURRENCIA", "8"))
+# Timeout de cada llamada de embeddings a OpenAI. Con plazo, el embedding de la solicitud se
+# abandona cuando este vence; este timeout acota cuánto sigue ocupado el hilo abandonado.
+RAG_EMBED_TIMEOUT = float(os.getenv("RAG_EMBED_TIMEOUT", "10"))
+# Hilos para las llamadas de embeddings con plazo
+RAG_EMBED_HILOS = int(os.getenv("RAG_EMBED_HILOS", "32"))
+# Reintentos de la generación con plazo (sin plazo, los de ChatOpenAI): espera inicial en segundos,
+# que se duplica en cada intento; no se reintenta si la espera no cabe en lo que queda del plazo
+RAG_LLM_REINTENTOS = int(os.getenv("RAG_LLM_REINTENTOS", "2"))
+RAG_LLM_ESPERA_S = float(os.getenv("RAG_LLM_ESPERA_S", "0.5"))
+# Errores transitorios de OpenAI: los mismos que reintenta ChatOpenAI
+ERRORES_REINTENTABLES = (openai.error.Timeout, openai.error.APIError, openai.error.APIConnectionError,
+                         openai.error.RateLimitError, openai.error.ServiceUnavailableError)
+
+# Mismo prompt que usa la cadena RetrievalQA "stuff" para modelos de chat
+SYSTEM_TEMPLATE = """Use the following pieces of context to answer the user's question.
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+----------------
+{context}"""
+
+
+class LLM:
+    @staticmethod
+    def get_llm():
+        """
+        Retorna una instancia del LLM de LangChain usando ChatOpenAI.
+        Se utiliza para modelos de chat como gpt-3.5-turbo.
+        """
+        return ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
+
+
+class Embeddings:
+    @staticmethod
+    def get_embeddings(cache_dir=EMBEDDINGS_CACHE_DIR, underlying=None):
+        """
+        Retorna los embeddings de OpenAI envueltos en una caché en disco.
+        Los vectores de documentos y de preguntas se guardan en `cache_dir`, de modo que
+        reconstruir el índice o repetir una pregunta no vuelve a llamar a la API.
+        """
+        if underlying is None:
+            underlying = OpenAIEmbeddings(model=EMBEDDINGS_MODEL, request_timeout=RAG_EMBED_TIMEOUT)
+        store = LocalFileStore(cache_dir)
+        return CacheBackedEmbeddings.from_bytes_store(
+            underlying,
+            store,
+            namespace=EMBEDDINGS_MODEL,
+            query_embedding_cache=True,
+        )
+
+
+class VectorStore:
+    @staticmethod
+    def cargar_documentos(data_path=DATA_PATH):
+        """
+        Carga los documentos PDF ubicados en la carpeta "data" (un Document por página).
+        """
+        documents = []
+        if not os.path.exists(data_path):
+            print("No se encontró la carpeta 'data'.")
+        else:
+            for filename in sorted(os.listdir(data_path)):
+                if filename.lower().endswith(".pdf"):
+                    file_path = os.path.join(data_path, filename)
+                    try:
+                        loader = PyPDFLoader(file_path)
+                        docs = loader.load()
+                        documents.extend(docs)
+                    except Exception as e:
+                        print(f"Error al cargar {filename}: {e}")
+        if not documents:
+            print("No se encontraron documentos en la carpeta 'data'.")
+        return documents
+
+    @staticmethod
+    def construir_indice(directorio, embeddings, data_path=DATA_PATH):
+        """
+        Indexa los documentos PDF de la carpeta "data" en `directorio`:
+        vectores en un índice FAISS plano (L2) y textos/metadata en un ChunkStore.
+        """
+        documents = VectorStore.cargar_documentos(data_path)
+        vectores = embeddings.embed_documents([doc.page_content for doc in documents])
+        VectorStore.escribir_indice(directorio, documents, np.asarray(vectores, dtype="float32"))
+
+    @staticmethod
+    def escribir_indice(directorio, documents, matriz):
+        index = faiss.IndexFlatL2(matriz.shape[1])
+        index.add(matriz)
+        os.makedirs(directorio, exist_ok=True)
+        faiss.write_index(index, os.path.join(directorio, INDEX_FILE))
+        ChunkStore.escribir(directorio, documents)
+
+    @staticmethod
+    def obtencion_vectores(embeddings=None, data_path=DATA_PATH, directorio=INDEX_DIR, reindexar=RAG_REINDEXAR):
+        """
+        Retorna el vector store a partir de los documentos PDF ubicados en la carpeta "data".
+        Se usan OpenAIEmbeddings (modelo "text-embedding-ada-002") y FAISS para indexar los documentos.
+        El índice se construye una sola vez y se reabre desde disco en los siguientes arranques.
+        """
+        indice_existe = os.path.exists(os.path.join(directorio, INDEX_FILE)) and ChunkStore.existe(directorio)
+        if reindexar or not indice_existe:
+            if embeddings is None:
+                embeddings = Embeddings.get_embeddings()
+            VectorStore.construir_indice(directorio, embeddings, data_path)
+        return IndiceVectorial(directorio)
+
+
+class IndiceVectorial:
+    """
+    Reemplaza al wrapper FAISS de LangChain: en lugar de un docstore con todos los Document
+    en memoria (pickleado al guardar), los textos viven en un ChunkStore mapeado en memoria
+    y solo se materializan los Document del top-k.
+    """
+
+    def __init__(self, directorio):
+        self.index = faiss.read_index(
+            os.path.join(directorio, INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        self.chunks = ChunkStore(directorio)
+
+    def similarity_search_with_score_by_vector(self, vector, k=4):
+        consulta = np.asarray([vector], dtype="float32")
+        distancias, ids = self.index.search(consulta, k)
+        return [
+            (self.chunks.documento(int(i)), float(d))
+            for d, i in zip(distancias[0], ids[0])
+            if i != -1
+        ]
+
+
+class RAGPipeline:
+    """
+    Pipeline RAG dividido en etapas explícitas para poder medirlas por separado:
+      1. embed:    vector de la pregunta.
+      2. search:   top-k documentos por similitud en el vector store.
+      3. pack:     prompt con los documentos recuperados ("stuff").
+      4. generate: respuesta del LLM.
+    """
+
+    def __init__(self, vectorstore, embeddings, llm, k=3):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.llm = llm
+        # Con plazo, los reintentos de ChatOpenAI (con su espera) lo excederían: se hacen en
+        # _generar_con_plazo, acotados por lo que queda
+        self._llm_con_plazo = llm.model_copy(update={"max_retries": 0}) if hasattr(llm, "max_retries") else llm
+        self.k = k
+
+    def embed(self, pregunta: str, plazo=None) -> list:
+        if plazo is None:
+            return self.embeddings.embed_query(pregunta)
+        return _con_plazo(plazo, "embed", self.embeddings.embed_query, pregunta)
+
+    def search(self, vector: list, k: int = None) -> list:
+        """Retorna una lista de (Document, score); menor score = más similar (distancia L2)."""
+        return self.vectorstore.similarity_search_with_score_by_vector(vector, k=k or self.k)
+
+    def pack(self, pregunta: str, docs: list, historial: dict = None) -> list:
+        """
+        Prompt "stuff" con los documentos. Con `historial` (ver ass_historial.py) el resumen y el
+        mensaje completo (si la pregunta es una parte) van al mensaje de sistema y los turnos
+        recientes como mensajes previos a la pregunta.
+        """
+        context = "\n\n".join(doc.page_content for doc in docs)
+        resumen, turnos = normalizar(historial)
+        sistema = SYSTEM_TEMPLATE.format(context=context)
+        if resumen:
+            sistema += f"\n----------------\nSummary of the conversation so far:\n{resumen}"
+        if consulta(historial):
+            sistema += ("\n----------------\nThe question is one part of this user message; use it as context "
+                        f"but answer only the question:\n{consulta(historial)}")
+        messages = [SystemMessage(content=sistema)]
+        for turno in turnos:
+            messages += [HumanMessage(content=turno["pregunta"]), AIMessage(content=turno["respuesta"])]
+        return messages + [HumanMessage(content=pregunta)]
+
+    def generate(self, messages: list, plazo=None) -> str:
+        if plazo is None:
+            return self.llm.invoke(messages).content
+        # request_timeout llega a la llamada de OpenAI (ChatOpenAI lo pasa como parámetro de la API)
+        return _con_reintentos(plazo, lambda: self._llm_con_plazo.invoke(
+            messages, request_timeout=plazo.timeout("generate")).content)
+
+    def recuperar(self, pregunta: str, plazo=None) -> list:
+        """Etapas 1 y 2 (embed + search): retorna los Document del top-k."""
+        if plazo is not None:
+            plazo.verificar("retrieve")
+        return [doc for doc, _ in self.search(self.embed(pregunta, plazo))]
+
+    def invoke(self, pregunta: str, docs: list = None, plazo=None, historial: dict = None) -> dict:
+        """
+        Ejecuta el pipeline completo. Retorna el mismo formato que RetrievalQA:
+        {"query": pregunta, "result": respuesta}.
+        Si se pasan `docs` (recuperados de antemano), se omiten embed y search.
+        Con un `plazo` (ass_plazo.Plazo) no se inicia una etapa sin tiempo restante y la
+        generación usa como timeout lo que queda del plazo. El `historial` de la conversación
+        solo se agrega al prompt; la recuperación usa la pregunta.
+        """
+        if docs is None:
+            docs = self.recuperar(pregunta, plazo)
+        messages = self.pack(pregunta, docs, historial)
+        return {"query": pregunta, "result": self.generate(messages, plazo)}
+
+    def stream(self, pregunta: str, docs: list = None, plazo=None, historial: dict = None):
+        """
+        Como invoke, pero genera la respuesta por fragmentos a medida que el LLM los produce:
+        el primero llega tras el time-to-first-token, no al final de la generación.
+        """
+        if docs is None:
+            docs = self.recuperar(pregunta, plazo)
+        messages = self.pack(pregunta, docs, historial)
+        fragmentos = self.llm.stream(messages) if plazo is None else self._flujo_con_plazo(messages, plazo)
+        for fragmento in fragmentos:
+            if fragmento.content:
+                yield fragmento.content
+
+    def _flujo_con_plazo(self, messages: list, plazo):
+        # Solo se reintenta antes del primer fragmento: después el cliente ya recibió parte de la respuesta
+        espera = RAG_LLM_ESPERA_S
+        for intento in range(RAG_LLM_REINTENTOS + 1):
+            enviado = False
+            try:
+                for fragmento in self._llm_con_plazo.stream(messages, request_timeout=plazo.timeout("generate")):
+                    enviado = True
+                    yield fragmento
+                return
+            except ERRORES_REINTENTABLES:
+                if enviado or not _puede_reintentar(plazo, intento, espera):
+                    raise
+            time.sleep(espera)
+            espera *= 2
+
+    def invoke_lote(self, preguntas: list, max_concurrencia: int = 8, plazo=None) -> list:
+        """
+        Pipeline completo para varias preguntas: un solo embed_documents para todas (una
+        llamada a la API por los vectores que no estén en caché; para ada-002 coinciden con
+        los de embed_query) y generación concurrente con llm.batch. Con `plazo`, como invoke.
+        """
+        if plazo is None:
+            vectores = self.embeddings.embed_documents(preguntas)
+        else:
+            vectores = _con_plazo(plazo, "embed", self.embeddings.embed_documents, preguntas)
+        mensajes = [self.pack(p, [doc for doc, _ in self.search(v)]) for p, v in zip(preguntas, vectores)]
+        config = {"max_concurrency": max_concurrencia}
+        if plazo is None:
+            respuestas = self.llm.batch(mensajes, config=config)
+        else:
+            respuestas = self._lote_con_plazo(mensajes, config, plazo)
+        return [{"query": p, "result": r.content} for p, r in zip(preguntas, respuestas)]
+
+    def _lote_con_plazo(self, mensajes: list, config: dict, plazo) -> list:
+        # Se reintentan solo las generaciones que fallaron con un error transitorio
+        respuestas, pendientes, espera = [None] * len(mensajes), list(range(len(mensajes))), RAG_LLM_ESPERA_S
+        for intento in range(RAG_LLM_REINTENTOS + 1):
+            resultados = self._llm_con_plazo.batch([mensajes[i] for i in pendientes], config=config,
+                                                   return_exceptions=True, request_timeout=plazo.timeout("generate"))
+            fallidas = []
+            for i, resultado in zip(pendientes, resultados):
+                if isinstance(resultado, ERRORES_REINTENTABLES):
+                    fallidas.append((i, resultado))
+                elif isinstance(resultado, Exception):
+                    raise resultado
+                else:
+                    respuestas[i] = resultado
+            if not fallidas:
+                return respuestas
+            if not _puede_reintentar(plazo, intento, espera):
+                raise fallidas[0][1]
+            pendientes = [i for i, _ in fallidas]
+            time.sleep(espera)
+            espera *= 2
+
+    # Variantes asíncronas: embed y generate son esperas de red, se liberan al event loop.
+    # La búsqueda FAISS local es CPU en memoria (sub-milisegundo para este corpus) y se ejecuta
+    # en línea; con shards remotos (ass_rag_shard.CoordinadorShards) también se espera.
+
+    async def aembed(self, pregunta: str) -> list:
+        return await self.embeddings.aembed_query(pregunta)
+
+    async def asearch(self, vector: list, k: int = None) -> list:
+        buscar = getattr(self.vectorstore, "asimilarity_search_with_score_by_vector", None)
+        if buscar is None:
+            return self.search(vector, k)
+        return await buscar(vector, k=k or self.k)
+
+    async def agenerate(self, messages: list) -> str:
+        return (await self.llm.ainvoke(messages)).content
+
+    async def arecuperar(self, pregunta: str) -> list:
+        return [doc for doc, _ in await self.asearch(await self.aembed(pregunta))]
+
+    async def ainvoke(self, pregunta: str, docs: list = None, historial: dict = None) -> dict:
+        if docs is None:
+            docs = await self.arecuperar(pregunta)
+        messages = self.pack(pregunta, docs, historial)
+        return {"query": pregunta, "result": await self.agenerate(messages)}
+
+    async def astream(self, pregunta: str, docs: list = None, historial: dict = None):
+        if docs is None:
+            docs = await self.arecuperar(pregunta)
+        async for fragmento in self.llm.astream(self.pack(pregunta, docs, historial)):
+            if fragmento.content:
+                yield fragmento.content
+
+    async def ainvoke_lote(self, preguntas: list, max_concurrencia: int = 8) -> list:
+        vectores = await self.embeddings.aembed_documents(preguntas)
+        mensajes = []
+        for pregunta, vector in zip(preguntas, vectores):
+            mensajes.append(self.pack(pregunta, [doc for doc, _ in await self.asearch(vector)]))
+        respuestas = await self.llm.abatch(mensajes, config={"max_concurrency": max_concurrencia})
+        return [{"query": p, "result": r.content} for p, r in zip(preguntas, respuestas)]
+
+
+_hilos_embed = None
+_hilos_lock = threading.Lock()
+
+
+def _con_plazo(plazo, etapa: str, funcion, *args):
+    """
+    Ejecuta `funcion` (una llamada de embeddings, que no acepta timeout por llamada) y la
+    abandona con PlazoVencido(etapa) si el plazo vence antes.
+    """
+    global _hilos_embed
+    with _hilos_lock:
+        if _hilos_embed is None:
+            _hilos_embed = ThreadPoolExecutor(max_workers=RAG_EMBED_HILOS, thread_name_prefix="embed")
+    timeout = plazo.timeout(etapa)
+    futuro = _hilos_embed.submit(funcion, *args)
+    try:
+        return futuro.result(timeout=timeout)
+    except TimeoutFuturo:
+        futuro.cancel()
+        raise PlazoVencido(etapa)
+
+
+def _puede_reintentar(plazo, intento: int, espera: float) -> bool:
+    return intento < RAG_LLM_REINTENTOS and plazo.restante() > espera
+
+
+def _con_reintentos(plazo, llamada):
+    """
+    llamada() con reintentos ante errores transitorios de OpenAI, acotados por el plazo: cada
+    intento pide su timeout al plazo y no se reintenta si la espera no cabe en lo que queda.
+    """
+    espera = RAG_LLM_ESPERA_S
+    for intento in range(RAG_LLM_REINTENTOS + 1):
+        try:
+            return llamada()
+        except ERRORES_REINTENTABLES:
+            if not _puede_reintentar(plazo, intento, espera):
+                raise
+        time.sleep(espera)
+        espera *= 2
+
+
+def validar_lote(data):
+    """Retorna (preguntas, error) para el cuerpo de /assistant/rag/batch."""
+    preguntas = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(preguntas, list) or not preguntas or not all(isinstance(p, str) for p in preguntas):
+        return None, "Se espera 'messages': una lista no vacía de textos"
+    if len(preguntas) > RAG_LOTE_MAX:
+        return None, f"El lote supera el máximo de {RAG_LOTE_MAX} preguntas"
+    return preguntas, None
+
+
+def documentos_a_contexto(docs: list) -> list:
+    """Serializa los Document recuperados para /assistant/rag/retrieve."""
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+
+def contexto_a_documentos(contexto: list) -> list:
+    """Inverso de documentos_a_contexto: el "contexto" recibido en /assistant/rag."""
+    return [Document(page_content=c["page_content"], metadata=c.get("metadata", {})) for c in contexto]
+
+
+def contruccion_cadena(embeddings=None, llm=None, k=3):
+    """
+    Construye el pipeline RAG utilizando:
+      - El vector store obtenido de los documentos PDF (o los shards de RAG_SHARD_URLS).
+      - El LLM configurado.
+      - Un retriever basado en similitud (k=3 documentos).
+    """
+    if embeddings is None:
+        embeddings = Embeddings.get_embeddings()
+    if RAG_SHARD_URLS:
+        from ass_rag_shard import CoordinadorShards
+        vectorstore = CoordinadorShards(RAG_SHARD_URLS)
+    else:
+        vectorstore = VectorStore.obtencion_vectores(embeddings)
+    if llm is None:
+        llm = LLM.get_llm()
+    return RAGPipeline(vectorstore, embeddings, llm, k=k)
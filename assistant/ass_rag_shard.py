@@ -0,0 +1,181 @@
+"""
+Índice RAG particionado en N shards con scatter-gather.
+
+  - construir: reparte los documentos (round-robin) en INDEX_DIR/shard-XX, cada uno con su
+    propio índice FAISS y ChunkStore.
+  - servir:    expone un shard por proceso en POST /shard/search (vector + k -> hits).
+  - CoordinadorShards: envía la consulta a todos los shards en paralelo, mezcla el top-k
+    por distancia y descarta los shards que no responden dentro del plazo.
+
+Uso local con varios procesos:
+    python ass_rag_shard.py construir --shards 4
+    python ass_rag_shard.py servir --shard 0 --port 5100   (uno por shard)
+    RAG_SHARD_URLS=http://localhost:5100,http://localhost:5101,... python ass_app_QA.py
+"""
+import os
+import asyncio
+import argparse
+import logging
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import aiohttp
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from aiohttp import web
+from langchain.schema import Document
+
+from ass_rag_pipeline import VectorStore, Embeddings, IndiceVectorial, INDEX_DIR, DATA_PATH
+
+logger = logging.getLogger(__name__)
+
+# Plazo por shard: un shard que no responde a tiempo se omite del resultado
+RAG_SHARD_TIMEOUT_MS = int(os.getenv("RAG_SHARD_TIMEOUT_MS", "250"))
+
+
+def directorio_shard(base: str, shard: int) -> str:
+    return os.path.join(base, f"shard-{shard:02d}")
+
+
+def construir_shards(n_shards: int, embeddings=None, data_path=DATA_PATH, base=INDEX_DIR):
+    """Indexa los documentos de "data" repartidos en `n_shards` índices independientes."""
+    if embeddings is None:
+        embeddings = Embeddings.get_embeddings()
+    documents = VectorStore.cargar_documentos(data_path)
+    matriz = np.asarray(
+        embeddings.embed_documents([doc.page_content for doc in documents]), dtype="float32"
+    )
+    for shard in range(n_shards):
+        ids = list(range(shard, len(documents), n_shards))
+        VectorStore.escribir_indice(
+            directorio_shard(base, shard), [documents[i] for i in ids], matriz[ids]
+        )
+
+
+# ------------------------------
+# Servidor de un shard
+# ------------------------------
+
+async def shard_search(request):
+    """
+    Endpoint: /shard/search
+    Función: Busca el top-k del shard local para un vector ya calculado por el coordinador.
+    Se espera un JSON con las claves "vector" (lista de floats) y "k".
+    """
+    data = await request.json()
+    retardo_ms = request.app["retardo_ms"]
+    if retardo_ms:
+        # Inyección de latencia para probar la degradación del coordinador
+        await asyncio.sleep(retardo_ms / 1000)
+    hits = request.app["indice"].similarity_search_with_score_by_vector(data["vector"], k=int(data.get("k", 3)))
+    return web.json_response({
+        "shard": request.app["nombre"],
+        "hits": [{"texto": doc.page_content, "metadata": doc.metadata, "score": score} for doc, score in hits],
+    })
+
+
+async def health(request):
+    return web.json_response({"status": "ok", "shard": request.app["nombre"], "documentos": len(request.app["indice"].chunks)})
+
+
+def crear_app_shard(directorio: str, retardo_ms: int = 0):
+    app = web.Application()
+    app["indice"] = IndiceVectorial(directorio)
+    app["nombre"] = os.path.basename(directorio)
+    app["retardo_ms"] = retardo_ms
+    app.router.add_post('/shard/search', shard_search)
+    app.router.add_get('/health', health)
+    return app
+
+
+# ------------------------------
+# Coordinador scatter-gather
+# ------------------------------
+
+class CoordinadorShards:
+    """
+    Vector store remoto con la misma interfaz que IndiceVectorial. Cada shard devuelve su
+    top-k; como el índice es exacto (L2 plano), el top-k de la unión es el top-k global.
+    """
+
+    def __init__(self, urls: list, timeout_ms: int = RAG_SHARD_TIMEOUT_MS):
+        self.urls = urls
+        self.timeout = timeout_ms / 1000
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max(4, len(urls) * 4), thread_name_prefix="shard")
+        self._aio_session = None
+        self.shards_omitidos = 0
+
+    def _consultar(self, url: str, payload: dict) -> list:
+        response = self.session.post(f"{url}/shard/search", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["hits"]
+
+    def _mezclar(self, resultados: list, k: int) -> list:
+        hits = [hit for shard_hits in resultados for hit in shard_hits]
+        mejores = heapq.nsmallest(k, hits, key=lambda hit: hit["score"])
+        return [(Document(page_content=hit["texto"], metadata=hit["metadata"]), hit["score"]) for hit in mejores]
+
+    def _registrar_omitidos(self, omitidos: list):
+        if omitidos:
+            self.shards_omitidos += len(omitidos)
+            logger.warning("Shards omitidos (lentos o con error): %s", ", ".join(omitidos))
+
+    def similarity_search_with_score_by_vector(self, vector, k=4):
+        payload = {"vector": list(map(float, vector)), "k": k}
+        futuros = {self.executor.submit(self._consultar, url, payload): url for url in self.urls}
+        hechos, pendientes = wait(futuros, timeout=self.timeout)
+        resultados, omitidos = [], [futuros[f] for f in pendientes]
+        for futuro in hechos:
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                logger.error("Error en shard %s: %s", futuros[futuro], e)
+                omitidos.append(futuros[futuro])
+        self._registrar_omitidos(omitidos)
+        return self._mezclar(resultados, k)
+
+    async def _aconsultar(self, url: str, payload: dict) -> list:
+        async with self._aio_session.post(f"{url}/shard/search", json=payload) as response:
+            response.raise_for_status()
+            return (await response.json())["hits"]
+
+    async def asimilarity_search_with_score_by_vector(self, vector, k=4):
+        if self._aio_session is None:
+            self._aio_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        payload = {"vector": list(map(float, vector)), "k": k}
+        tareas = {asyncio.ensure_future(self._aconsultar(url, payload)): url for url in self.urls}
+        hechos, pendientes = await asyncio.wait(tareas, timeout=self.timeout)
+        for tarea in pendientes:
+            tarea.cancel()
+        resultados, omitidos = [], [tareas[t] for t in pendientes]
+        for tarea in hechos:
+            try:
+                resultados.append(tarea.result())
+            except Exception as e:
+                logger.error("Error en shard %s: %s", tareas[tarea], e)
+                omitidos.append(tareas[tarea])
+        self._registrar_omitidos(omitidos)
+        return self._mezclar(resultados, k)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shards del índice RAG.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_construir = sub.add_parser("construir", help="Construye los shards en disco.")
+    p_construir.add_argument("--shards", type=int, required=True)
+    p_construir.add_argument("--index-dir", default=INDEX_DIR)
+    p_servir = sub.add_parser("servir", help="Sirve un shard en POST /shard/search.")
+    p_servir.add_argument("--shard", type=int, required=True)
+    p_servir.add_argument("--port", type=int, required=True)
+    p_servir.add_argument("--index-dir", default=INDEX_DIR)
+    p_servir.add_argument("--retardo-ms", type=int, default=0, help="Latencia artificial por consulta.")
+    args = parser.parse_args()
+
+    if args.comando == "construir":
+        construir_shards(args.shards, base=args.index_dir)
+    else:
+        web.run_app(crear_app_shard(directorio_shard(args.index_dir, args.shard), args.retardo_ms), port=args.port)
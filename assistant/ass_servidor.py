@@ -0,0 +1,45 @@
+"""
+Arranque y chequeo de salud comunes a los asistentes (ass_app_*.py).
+
+  - PORT permite levantar varias réplicas del mismo asistente en una máquina.
+  - UNIX_SOCKET (ruta): escucha en un socket Unix en lugar de TCP, para un orquestador en el
+    mismo host.
+  - GET /health responde {"status": "ok"}; lo consulta el registro de réplicas del orquestador
+    (ver orchestrator/or_registro.py).
+"""
+import os
+from flask import jsonify
+from aiohttp import web
+
+
+def _salud():
+    return jsonify({"status": "ok"}), 200
+
+
+async def _asalud(request):
+    return web.json_response({"status": "ok"})
+
+
+def agregar_salud(app):
+    """Registra GET /health en una app Flask."""
+    app.add_url_rule("/health", "health", _salud, methods=["GET"])
+
+
+def aagregar_salud(app):
+    """Registra GET /health en una app aiohttp."""
+    app.router.add_get("/health", _asalud)
+
+
+def servir(app, puerto: int):
+    """Levanta una app Flask en PORT (por defecto `puerto`) o en UNIX_SOCKET."""
+    socket_unix = os.getenv("UNIX_SOCKET")
+    app.run(host=f"unix://{socket_unix}" if socket_unix else None, port=int(os.getenv("PORT", str(puerto))), debug=True)
+
+
+def aservir(app, puerto: int):
+    """Variante de servir para una app aiohttp."""
+    socket_unix = os.getenv("UNIX_SOCKET")
+    if socket_unix:
+        web.run_app(app, path=socket_unix)
+    else:
+        web.run_app(app, port=int(os.getenv("PORT", str(puerto))))
@@ -0,0 +1,69 @@
+"""
+Compara /orchestrate mensaje por mensaje contra /orchestrate/batch con el mismo conjunto.
+
+Levanta los asistentes simulados (stub_assistants.py) y el orquestador Flask (or_app.py):
+    python benchmark/bench_lote.py --mensajes 200 --latencia-ms 300
+
+Los mensajes por defecto los resuelve el clasificador local: se mide el orquestador y el
+reparto hacia los asistentes, no la API de OpenAI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from load_orchestrator import BENCH_DIR, ORCHESTRATOR_DIR, MENSAJES, VARIANTES, esperar
+
+
+def ejecutar(args) -> dict:
+    mensajes = [MENSAJES[i % len(MENSAJES)] for i in range(args.mensajes)]
+    url = f"http://localhost:{args.puerto}"
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stub_assistants.py"),
+                             "--latencia-ms", str(args.latencia_ms)], stdout=subprocess.DEVNULL)
+    proceso = subprocess.Popen([c.format(puerto=args.puerto) for c in VARIANTES[args.variante]],
+                               cwd=ORCHESTRATOR_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar(url, proceso)
+        with httpx.Client(timeout=600) as cliente:
+            inicio = time.perf_counter()
+            uno_a_uno = [cliente.post(f"{url}/orchestrate", json={"message": m}).status_code for m in mensajes]
+            t_uno_a_uno = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            response = cliente.post(f"{url}/orchestrate/batch", json={"messages": mensajes})
+            t_lote = time.perf_counter() - inicio
+            lote = [r["status"] for r in response.json()["resultados"]]
+    finally:
+        proceso.terminate()
+        stub.terminate()
+        proceso.wait()
+        stub.wait()
+
+    return {
+        "variante": args.variante,
+        "mensajes": args.mensajes,
+        "latencia_asistentes_ms": args.latencia_ms,
+        "uno_a_uno": {"duracion_s": round(t_uno_a_uno, 3), "mensajes_por_s": round(args.mensajes / t_uno_a_uno, 1),
+                      "errores": sum(s != 200 for s in uno_a_uno)},
+        "lote": {"duracion_s": round(t_lote, 3), "mensajes_por_s": round(args.mensajes / t_lote, 1),
+                 "errores": sum(s != 200 for s in lote)},
+        "aceleracion": round(t_uno_a_uno / t_lote, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara /orchestrate uno a uno contra /orchestrate/batch.")
+    parser.add_argument("--mensajes", type=int, default=200)
+    parser.add_argument("--latencia-ms", type=float, default=300, help="Latencia de los asistentes simulados.")
+    parser.add_argument("--variante", choices=sorted(VARIANTES), default="flask")
+    parser.add_argument("--puerto", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(ejecutar(args), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Costo por solicitud del salto HTTP orquestador -> asistente, comparando el modo microservicios
+(ClientesHTTP contra el asistente Flask real en un puerto local) con el modo monolito
+(ClientesMonolito, mismo handler en el proceso del orquestador, ver or_monolito.py).
+
+    python benchmark/bench_monolito.py --solicitudes 2000 --productos 5
+
+Ambos modos llaman al mismo handler simulado del asesor de compras (responde al instante con
+`--productos` recomendaciones, sin OpenAI ni SerpAPI): la diferencia es el costo del salto
+(serializar, socket, parsear la solicitud en Flask y la respuesta en el orquestador).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from bench_utils import percentiles
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "orchestrator"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "assistant"))
+
+import ass_app_Shopping  # noqa: E402
+from or_http import ClientesHTTP  # noqa: E402
+from or_monolito import ClientesMonolito  # noqa: E402
+from or_servicios import RUTAS  # noqa: E402
+
+
+def handler_simulado(productos: int):
+    resultados = [{
+        "Nombre Artículo": f"Producto simulado {i}",
+        "Comercio": "Comercio simulado",
+        "Precio": 100.0 + i,
+        "TipoPrecio": "original",
+        "Ranking": f"Top {i}",
+        "Comentario": "Recomendación simulada para medir el costo del transporte",
+    } for i in range(1, productos + 1)]
+
+    def asesorar_compras(data, plazo):
+        return {"resultados": resultados}, 200
+    return asesorar_compras
+
+
+def medir(clientes, solicitudes: int) -> dict:
+    cuerpo = {"message": "Busca laptops baratas"}
+    headers = {"X-Deadline-Ms": "30000"}
+    for _ in range(min(50, solicitudes)):  # calentamiento: conexiones e imports
+        clientes.post(*RUTAS["shopping"], json=cuerpo, headers=headers)
+    duraciones = []
+    inicio_total = time.perf_counter()
+    for _ in range(solicitudes):
+        inicio = time.perf_counter()
+        response = clientes.post(*RUTAS["shopping"], json=cuerpo, headers=headers)
+        response.json()
+        duraciones.append((time.perf_counter() - inicio) * 1000)
+    total = time.perf_counter() - inicio_total
+    return {"latencia_ms": percentiles(duraciones), "solicitudes_por_s": round(solicitudes / total, 1)}
+
+
+def ejecutar(args) -> dict:
+    ass_app_Shopping.asesorar_compras = handler_simulado(args.productos)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # sin el log de acceso por solicitud
+    servidor = make_server("127.0.0.1", args.puerto, ass_app_Shopping.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    http = ClientesHTTP({"shopping": f"http://127.0.0.1:{args.puerto}"})
+    try:
+        resultado_http = medir(http, args.solicitudes)
+    finally:
+        http.cerrar()
+        servidor.shutdown()
+    resultado_monolito = medir(ClientesMonolito(), args.solicitudes)
+    return {
+        "solicitudes": args.solicitudes,
+        "productos": args.productos,
+        "http": resultado_http,
+        "monolito": resultado_monolito,
+        "ahorro_por_solicitud_ms": round(resultado_http["latencia_ms"]["media"]
+                                         - resultado_monolito["latencia_ms"]["media"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el salto HTTP al asistente con el modo monolito.")
+    parser.add_argument("--solicitudes", type=int, default=2000)
+    parser.add_argument("--productos", type=int, default=5, help="Recomendaciones en cada respuesta simulada.")
+    parser.add_argument("--puerto", type=int, default=5103)
+    args = parser.parse_args()
+    print(json.dumps(ejecutar(args), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark de calidad de recuperación y latencia del servicio RAG.
+
+Mide, sobre el conjunto versionado `rag_eval_v1.json`:
+  - recall@k y MRR del retriever (una respuesta es relevante si proviene de una página de evidencia).
+  - Percentiles de latencia por etapa del pipeline: embed, search, pack y generate.
+
+Se ejecuta sin conexión contra un LLM simulado y los embeddings cacheados en disco
+(la caché se llena la primera vez que se ejecuta con conexión, sin --offline).
+La salida es un JSON estable (claves ordenadas) para comparar configuraciones de índice con diff.
+
+Uso (desde la raíz del repositorio):
+    python benchmark/bench_rag.py --offline --etiqueta flat-k3 --salida bench_rag_flat.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import unicodedata
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "assistant"))
+
+from langchain_core.embeddings import Embeddings as BaseEmbeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from bench_utils import percentiles
+from ass_rag_pipeline import Embeddings, VectorStore, RAGPipeline, EMBEDDINGS_CACHE_DIR, EMBEDDINGS_MODEL, INDEX_DIR
+
+ETAPAS = ("embed", "search", "pack", "generate")
+
+
+class EmbeddingsSinConexion(BaseEmbeddings):
+    """Backend de embeddings para modo offline: solo se permiten aciertos de caché."""
+
+    def embed_documents(self, texts):
+        raise RuntimeError(
+            f"{len(texts)} embedding(s) sin caché. Ejecute una vez con conexión (sin --offline) "
+            "para poblar la caché de embeddings."
+        )
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def normalizar_archivo(path: str) -> str:
+    return unicodedata.normalize("NFC", os.path.basename(path))
+
+
+def rango_relevante(hits: list, pregunta: dict) -> int:
+    """Posición (1-indexada) del primer hit que cae en una página de evidencia, o 0 si no hay."""
+    archivo = unicodedata.normalize("NFC", pregunta["archivo"])
+    paginas = set(pregunta["paginas_evidencia"])
+    for rank, (doc, _score) in enumerate(hits, start=1):
+        # PyPDFLoader guarda la página 0-indexada en metadata["page"]
+        if (normalizar_archivo(doc.metadata.get("source", "")) == archivo
+                and doc.metadata.get("page", -1) + 1 in paginas):
+            return rank
+    return 0
+
+
+def ejecutar(args) -> dict:
+    with open(args.conjunto, encoding="utf-8") as f:
+        conjunto = json.load(f)
+    preguntas = conjunto["preguntas"]
+    ks = sorted(int(k) for k in args.ks.split(","))
+    k_busqueda = max(ks + [args.k])
+
+    underlying = EmbeddingsSinConexion() if args.offline else None
+    embeddings = Embeddings.get_embeddings(cache_dir=args.cache_dir, underlying=underlying)
+    llm = FakeListChatModel(responses=["Respuesta simulada."], sleep=args.llm_latencia_ms / 1000)
+
+    t0 = time.perf_counter()
+    vectorstore = VectorStore.obtencion_vectores(
+        embeddings, data_path=args.data, directorio=args.index_dir, reindexar=args.reindexar
+    )
+    carga_ms = (time.perf_counter() - t0) * 1000
+    pipeline = RAGPipeline(vectorstore, embeddings, llm, k=args.k)
+
+    latencias = {etapa: [] for etapa in ETAPAS}
+    aciertos = {k: 0 for k in ks}
+    reciprocos = []
+    detalle = []
+
+    for _ in range(args.repeticiones):
+        for pregunta in preguntas:
+            t = time.perf_counter()
+            vector = pipeline.embed(pregunta["pregunta"])
+            t_embed = time.perf_counter()
+            hits = pipeline.search(vector, k=k_busqueda)
+            t_search = time.perf_counter()
+            messages = pipeline.pack(pregunta["pregunta"], [doc for doc, _ in hits[:args.k]])
+            t_pack = time.perf_counter()
+            pipeline.generate(messages)
+            t_generate = time.perf_counter()
+
+            latencias["embed"].append((t_embed - t) * 1000)
+            latencias["search"].append((t_search - t_embed) * 1000)
+            latencias["pack"].append((t_pack - t_search) * 1000)
+            latencias["generate"].append((t_generate - t_pack) * 1000)
+
+            if len(detalle) < len(preguntas):
+                rank = rango_relevante(hits, pregunta)
+                for k in ks:
+                    if 0 < rank <= k:
+                        aciertos[k] += 1
+                reciprocos.append(1 / rank if rank else 0.0)
+                detalle.append({
+                    "id": pregunta["id"],
+                    "rango": rank,
+                    "paginas_recuperadas": [doc.metadata.get("page", -1) + 1 for doc, _ in hits],
+                })
+
+    n = len(preguntas)
+    return {
+        "conjunto": {"archivo": os.path.basename(args.conjunto), "version": conjunto["version"], "preguntas": n},
+        "configuracion": {
+            "etiqueta": args.etiqueta,
+            "indice": type(vectorstore.index).__name__,
+            "documentos": vectorstore.index.ntotal,
+            "embeddings": EMBEDDINGS_MODEL,
+            "k_generacion": args.k,
+            "repeticiones": args.repeticiones,
+            "llm_latencia_simulada_ms": args.llm_latencia_ms,
+        },
+        "recuperacion": {
+            **{f"recall@{k}": round(aciertos[k] / n, 4) for k in ks},
+            f"mrr@{k_busqueda}": round(sum(reciprocos) / n, 4),
+        },
+        "latencia_ms": {
+            "carga_indice": round(carga_ms, 3),
+            **{etapa: percentiles(latencias[etapa]) for etapa in ETAPAS},
+        },
+        "preguntas": detalle,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación y latencia del RAG.")
+    parser.add_argument("--conjunto", default=os.path.join(BENCH_DIR, "rag_eval_v1.json"))
+    parser.add_argument("--data", default=os.path.join(BENCH_DIR, "..", "data"))
+    parser.add_argument("--cache-dir", default=EMBEDDINGS_CACHE_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--reindexar", action="store_true", help="Reconstruye el índice antes de medir.")
+    parser.add_argument("--ks", default="1,3,5", help="Valores de k para recall@k (separados por coma).")
+    parser.add_argument("--k", type=int, default=3, help="Documentos que se empaquetan para el LLM.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--llm-latencia-ms", type=float, default=0.0, help="Latencia simulada del LLM stub.")
+    parser.add_argument("--offline", action="store_true", help="Falla si algún embedding no está en caché.")
+    parser.add_argument("--etiqueta", default="default", help="Nombre de la configuración del índice.")
+    parser.add_argument("--salida", help="Archivo JSON de salida (por defecto stdout).")
+    args = parser.parse_args()
+
+    resultado = json.dumps(ejecutar(args), ensure_ascii=False, indent=2, sort_keys=True)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(resultado + "\n")
+    else:
+        print(resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Prueba local del índice RAG particionado: levanta N procesos de shard en esta máquina,
+consulta el conjunto de evaluación a través de CoordinadorShards y lo compara con el
+índice único (mismo top-k esperado), midiendo la latencia de la búsqueda scatter-gather.
+
+Con --lento se inyecta latencia en un shard para comprobar que el coordinador respeta
+el plazo por shard y degrada (resultado parcial) en lugar de esperar.
+
+Uso (desde la raíz del repositorio, con la caché de embeddings ya poblada):
+    python benchmark/bench_shards.py --shards 4 --lento 2:1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSISTANT_DIR = os.path.join(BENCH_DIR, "..", "assistant")
+sys.path.insert(0, ASSISTANT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from ass_rag_pipeline import Embeddings, VectorStore, EMBEDDINGS_CACHE_DIR
+from ass_rag_shard import CoordinadorShards, construir_shards
+from bench_rag import EmbeddingsSinConexion
+from bench_utils import percentiles
+
+
+def esperar_shard(url: str, proceso, plazo_s: float = 30):
+    limite = time.time() + plazo_s
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El shard {url} terminó al iniciar (código {proceso.returncode}).")
+        try:
+            requests.get(f"{url}/health", timeout=0.5).raise_for_status()
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El shard {url} no respondió en {plazo_s}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba local de shards del índice RAG.")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--puerto-base", type=int, default=5100)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--timeout-ms", type=int, default=250, help="Plazo por shard del coordinador.")
+    parser.add_argument("--lento", help="SHARD:MS, inyecta latencia en un shard.")
+    parser.add_argument("--conjunto", default=os.path.join(BENCH_DIR, "rag_eval_v1.json"))
+    parser.add_argument("--cache-dir", default=EMBEDDINGS_CACHE_DIR)
+    args = parser.parse_args()
+
+    embeddings = Embeddings.get_embeddings(cache_dir=args.cache_dir, underlying=EmbeddingsSinConexion())
+    lento_shard, lento_ms = (int(x) for x in args.lento.split(":")) if args.lento else (-1, 0)
+
+    with open(args.conjunto, encoding="utf-8") as f:
+        preguntas = [p["pregunta"] for p in json.load(f)["preguntas"]]
+
+    with tempfile.TemporaryDirectory() as base:
+        unico = VectorStore.obtencion_vectores(embeddings, directorio=os.path.join(base, "unico"))
+        construir_shards(args.shards, embeddings=embeddings, base=base)
+
+        procesos, urls = [], []
+        try:
+            for shard in range(args.shards):
+                puerto = args.puerto_base + shard
+                comando = [sys.executable, "ass_rag_shard.py", "servir", "--shard", str(shard),
+                           "--port", str(puerto), "--index-dir", base]
+                if shard == lento_shard:
+                    comando += ["--retardo-ms", str(lento_ms)]
+                procesos.append(subprocess.Popen(comando, cwd=ASSISTANT_DIR, stdout=subprocess.DEVNULL))
+                urls.append(f"http://localhost:{puerto}")
+            for url, proceso in zip(urls, procesos):
+                esperar_shard(url, proceso)
+
+            coordinador = CoordinadorShards(urls, timeout_ms=args.timeout_ms)
+            latencias, coincidencias = [], 0
+            for pregunta in preguntas:
+                vector = embeddings.embed_query(pregunta)
+                esperado = [(d.metadata["page"], round(s, 4)) for d, s in
+                            unico.similarity_search_with_score_by_vector(vector, k=args.k)]
+                t = time.perf_counter()
+                hits = coordinador.similarity_search_with_score_by_vector(vector, k=args.k)
+                latencias.append((time.perf_counter() - t) * 1000)
+                coincidencias += [(d.metadata["page"], round(s, 4)) for d, s in hits] == esperado
+
+            print(json.dumps({
+                "shards": args.shards,
+                "shard_lento": args.lento,
+                "timeout_shard_ms": args.timeout_ms,
+                "topk_identico_al_indice_unico": f"{coincidencias}/{len(preguntas)}",
+                "shards_omitidos": coordinador.shards_omitidos,
+                "latencia_busqueda_ms": percentiles(latencias),
+            }, ensure_ascii=False, indent=2, sort_keys=True))
+        finally:
+            for proceso in procesos:
+                proceso.terminate()
+            for proceso in procesos:
+                proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
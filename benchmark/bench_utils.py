@@ -0,0 +1,23 @@
+"""
+Utilidades compartidas por los scripts de benchmark.
+"""
+import math
+
+
+def percentiles(muestras: list) -> dict:
+    """Percentiles por rango más cercano, en milisegundos."""
+    ordenadas = sorted(muestras)
+    n = len(ordenadas)
+
+    def p(q):
+        idx = max(0, math.ceil(q / 100 * n) - 1)
+        return round(ordenadas[idx], 3)
+
+    return {
+        "n": n,
+        "media": round(sum(ordenadas) / n, 3),
+        "p50": p(50),
+        "p90": p(90),
+        "p99": p(99),
+        "max": round(ordenadas[-1], 3),
+    }
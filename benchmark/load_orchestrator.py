@@ -0,0 +1,172 @@
+"""
+Prueba de carga de /orchestrate.
+
+  - Contra una URL ya levantada:
+        python benchmark/load_orchestrator.py --url http://localhost:5000 --concurrencia 200
+  - Comparación automática entre el orquestador Flask (or_app.py) y el asyncio (or_app_async.py),
+    ambos frente a asistentes simulados con latencia fija (stub_assistants.py):
+        python benchmark/load_orchestrator.py --comparar --concurrencia 200 --solicitudes 2000
+  - Comparación del transporte orquestador -> asistentes (loopback TCP contra sockets Unix), con
+    la misma variante del orquestador; conviene latencia 0 para que domine el costo del salto:
+        python benchmark/load_orchestrator.py --comparar-transporte --variante asyncio --latencia-ms 0
+
+Los mensajes por defecto los resuelve el clasificador local, de modo que la prueba mide el
+orquestador y el salto HTTP, no la API de OpenAI.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import httpx
+
+from bench_utils import percentiles
+from stub_assistants import PUERTOS, SERVICIOS, socket_unix
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ORCHESTRATOR_DIR = os.path.join(BENCH_DIR, "..", "orchestrator")
+
+MENSAJES = [
+    "¿Qué es el ahorro?",
+    "Busca laptops baratas",
+    "¿Cómo funciona la tasa de interés de un crédito?",
+    "Quiero comprar un celular Samsung negro",
+]
+
+VARIANTES = {
+    # Servidor de desarrollo de Flask con un hilo por solicitud (sin el recargador de debug)
+    "flask": [sys.executable, "-c", "import or_app; or_app.app.run(port={puerto}, threaded=True)"],
+    "asyncio": [sys.executable, "-c", "from aiohttp import web; import or_app_async; "
+                                      "web.run_app(or_app_async.crear_app(), port={puerto}, access_log=None)"],
+}
+
+
+async def cargar(url: str, concurrencia: int, solicitudes: int, mensajes: list) -> dict:
+    latencias, errores = [], 0
+    cola = asyncio.Queue()
+    for i in range(solicitudes):
+        cola.put_nowait(mensajes[i % len(mensajes)])
+
+    async def trabajador(cliente):
+        nonlocal errores
+        while not cola.empty():
+            mensaje = cola.get_nowait()
+            t = time.perf_counter()
+            try:
+                async with cliente.post(f"{url}/orchestrate", json={"message": mensaje}) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errores += 1
+            except aiohttp.ClientError:
+                errores += 1
+            latencias.append((time.perf_counter() - t) * 1000)
+
+    # aiohttp como generador de carga: con httpx.AsyncClient el propio cliente se satura antes que el servidor
+    conector = aiohttp.TCPConnector(limit=concurrencia)
+    async with aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=120)) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+    return {
+        "url": url,
+        "concurrencia": concurrencia,
+        "solicitudes": solicitudes,
+        "errores": errores,
+        "duracion_s": round(duracion, 3),
+        "solicitudes_por_s": round(solicitudes / duracion, 1),
+        "latencia_ms": percentiles(latencias),
+    }
+
+
+def esperar(url: str, proceso, plazo_s: float = 30):
+    limite = time.time() + plazo_s
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El proceso de {url} terminó al iniciar.")
+        try:
+            httpx.get(f"{url}/metrics", timeout=0.5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {plazo_s}s.")
+
+
+def comparar(args) -> dict:
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stub_assistants.py"),
+                             "--latencia-ms", str(args.latencia_ms)], stdout=subprocess.DEVNULL)
+    resultados = {"latencia_asistentes_ms": args.latencia_ms}
+    try:
+        for nombre, comando in VARIANTES.items():
+            url = f"http://localhost:{args.puerto}"
+            proceso = subprocess.Popen([c.format(puerto=args.puerto) for c in comando], cwd=ORCHESTRATOR_DIR,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                esperar(url, proceso)
+                resultados[nombre] = asyncio.run(cargar(url, args.concurrencia, args.solicitudes, MENSAJES))
+            finally:
+                proceso.terminate()
+                proceso.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+    return resultados
+
+
+def comparar_transporte(args) -> dict:
+    url = f"http://localhost:{args.puerto}"
+    resultados = {"variante": args.variante, "latencia_asistentes_ms": args.latencia_ms}
+    with tempfile.TemporaryDirectory() as uds_dir:
+        for transporte in ("tcp", "uds"):
+            stub_args = ["--uds-dir", uds_dir] if transporte == "uds" else []
+            stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stub_assistants.py"),
+                                     "--latencia-ms", str(args.latencia_ms), *stub_args], stdout=subprocess.DEVNULL)
+            env = dict(os.environ)
+            for puerto in PUERTOS:
+                destino = f"unix://{socket_unix(uds_dir, puerto)}" if transporte == "uds" else f"http://localhost:{puerto}"
+                env[f"ASSISTANT_{SERVICIOS[puerto].upper()}_URLS"] = destino
+            proceso = subprocess.Popen([c.format(puerto=args.puerto) for c in VARIANTES[args.variante]],
+                                       cwd=ORCHESTRATOR_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                esperar(url, proceso)
+                resultados[transporte] = asyncio.run(cargar(url, args.concurrencia, args.solicitudes, MENSAJES))
+            finally:
+                proceso.terminate()
+                stub.terminate()
+                proceso.wait()
+                stub.wait()
+    tcp, uds = resultados["tcp"]["latencia_ms"], resultados["uds"]["latencia_ms"]
+    resultados["mejora_ms"] = {p: round(tcp[p] - uds[p], 3) for p in ("p50", "p99")}
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de /orchestrate.")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--concurrencia", type=int, default=100)
+    parser.add_argument("--solicitudes", type=int, default=1000)
+    parser.add_argument("--comparar", action="store_true", help="Compara or_app.py y or_app_async.py.")
+    parser.add_argument("--comparar-transporte", action="store_true",
+                        help="Compara loopback TCP y sockets Unix hacia los asistentes simulados.")
+    parser.add_argument("--variante", choices=sorted(VARIANTES), default="asyncio",
+                        help="Orquestador para --comparar-transporte.")
+    parser.add_argument("--latencia-ms", type=float, default=500, help="Latencia de los asistentes simulados.")
+    parser.add_argument("--puerto", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.comparar:
+        resultado = comparar(args)
+    elif args.comparar_transporte:
+        resultado = comparar_transporte(args)
+    else:
+        resultado = asyncio.run(cargar(args.url, args.concurrencia, args.solicitudes, MENSAJES))
+    print(json.dumps(resultado, ensure_ascii=False, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
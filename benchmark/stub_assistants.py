@@ -0,0 +1,76 @@
+"""
+Asistentes simulados para pruebas de carga del orquestador: responden en los mismos
+puertos y endpoints que los servicios reales tras una latencia fija, imitando la espera
+de red de una llamada al LLM, sin consumir la API de OpenAI.
+
+Uso:
+    python benchmark/stub_assistants.py --latencia-ms 500
+    python benchmark/stub_assistants.py --latencia-ms 0 --uds-dir /tmp/asistentes   # sockets Unix
+"""
+import argparse
+import asyncio
+import json
+import os
+from aiohttp import web
+
+PUERTOS = {
+    5001: ["/assistant/analyze-pdf"],
+    5002: ["/assistant/rag", "/assistant/rag/retrieve", "/assistant/rag/batch"],
+    5003: ["/assistant/shopping-advisor"],
+}
+# Con --uds-dir cada servicio escucha en <dir>/<servicio>.sock en lugar de su puerto
+SERVICIOS = {5001: "pdf", 5002: "rag", 5003: "shopping"}
+
+
+def crear_app(paths: list, latencia_ms: float):
+    def respuesta_simulada(path):
+        async def responder(request):
+            cuerpo = await request.read()
+            await asyncio.sleep(latencia_ms / 1000)
+            if path.endswith("/batch"):
+                n = len(json.loads(cuerpo)["messages"])
+                return web.json_response({"respuestas": [f"Respuesta simulada de {path}"] * n})
+            if path.endswith("/retrieve"):
+                return web.json_response({"contexto": [{"page_content": "Fragmento simulado", "metadata": {}}]})
+            return web.json_response({"respuesta": f"Respuesta simulada de {path}"})
+        return responder
+
+    async def health(request):
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    for path in paths:
+        app.router.add_post(path, respuesta_simulada(path))
+    app.router.add_get("/health", health)
+    return app
+
+
+def socket_unix(uds_dir: str, puerto: int) -> str:
+    return os.path.join(uds_dir, f"{SERVICIOS[puerto]}.sock")
+
+
+async def servir(latencia_ms: float, uds_dir: str = None):
+    runners = []
+    for puerto, paths in PUERTOS.items():
+        runner = web.AppRunner(crear_app(paths, latencia_ms), access_log=None)
+        await runner.setup()
+        if uds_dir:
+            await web.UnixSite(runner, socket_unix(uds_dir, puerto)).start()
+        else:
+            await web.TCPSite(runner, "localhost", puerto).start()
+        runners.append(runner)
+    destino = uds_dir or sorted(PUERTOS)
+    print(f"Asistentes simulados en {destino} con latencia {latencia_ms} ms", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asistentes simulados con latencia fija.")
+    parser.add_argument("--latencia-ms", type=float, default=500)
+    parser.add_argument("--uds-dir", help="Escuchar en sockets Unix dentro de esta carpeta en lugar de TCP.")
+    args = parser.parse_args()
+    asyncio.run(servir(args.latencia_ms, args.uds_dir))
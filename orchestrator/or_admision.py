@@ -0,0 +1,203 @@
+"""
+Control de admisión del orquestador: llamadas concurrentes por intención hacia los asistentes.
+
+  - Límite: cada intención admite hasta ORQ_LIMITE_<INTENCION> llamadas en vuelo (por defecto
+    ORQ_LIMITE_RAG=32, ORQ_LIMITE_SHOPPING=16, ORQ_LIMITE_PDF=4; 0 = sin límite).
+  - Cola: las que exceden el límite esperan en una cola de hasta ORQ_COLA_MAX solicitudes, como
+    máximo ORQ_COLA_ESPERA_MS (o lo que quede del plazo de la solicitud, si es menos).
+  - Descarte: con la cola llena o la espera agotada se responde 429 con Retry-After (estimado con
+    la duración reciente de las llamadas), sin llegar al asistente.
+  - Prioridad: el tráfico interactivo (/orchestrate) sale de la cola antes que el de lotes
+    (/orchestrate/batch), y los lotes solo encolan mientras la cola esté por debajo de
+    ORQ_COLA_LOTE_FRACCION de su capacidad, para dejar lugar a las solicitudes interactivas.
+
+Métricas: orquestador_admision_cola{intencion} y orquestador_admision_en_vuelo{intencion},
+orquestador_admision_espera_segundos{intencion,prioridad} y
+orquestador_admision_rechazos_total{intencion,motivo=cola_llena|espera_agotada}.
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from or_metrics import metricas
+
+ORQ_COLA_MAX = int(os.getenv("ORQ_COLA_MAX", "64"))
+ORQ_COLA_ESPERA_MS = int(os.getenv("ORQ_COLA_ESPERA_MS", "2000"))
+ORQ_COLA_LOTE_FRACCION = float(os.getenv("ORQ_COLA_LOTE_FRACCION", "0.5"))
+LIMITES_POR_DEFECTO = {"rag": 32, "shopping": 16, "pdf": 4}
+
+STATUS_SOBRECARGA = 429
+INTERACTIVA, LOTE = 0, 1
+_NOMBRE_PRIORIDAD = {INTERACTIVA: "interactiva", LOTE: "lote"}
+
+
+class Sobrecarga(Exception):
+    codigo = "sobrecarga"
+
+    def __init__(self, intencion: str, motivo: str, reintentar_en: float):
+        super().__init__(f"El servicio '{intencion}' está saturado; reintente en unos segundos")
+        self.intencion = intencion
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class _Compuerta:
+
+    def __init__(self, intencion: str, limite: int):
+        self.intencion = intencion
+        self.limite = limite
+        self.en_vuelo = 0
+        self._cola = []  # heap de [prioridad, orden, aviso]
+        self._orden = itertools.count()
+        self._duracion_s = 1.0  # media móvil de la duración de las llamadas admitidas
+
+    def _libre(self) -> bool:
+        return self.limite <= 0 or (self.en_vuelo < self.limite and not self._cola)
+
+    def _cabe_en_cola(self, prioridad: int) -> bool:
+        capacidad = ORQ_COLA_MAX if prioridad == INTERACTIVA else int(ORQ_COLA_MAX * ORQ_COLA_LOTE_FRACCION)
+        return len(self._cola) < capacidad
+
+    @staticmethod
+    def _espera_max(plazo) -> float:
+        espera = ORQ_COLA_ESPERA_MS / 1000
+        return min(espera, plazo.restante_ms() / 1000) if plazo is not None else espera
+
+    def _rechazo(self, motivo: str) -> Sobrecarga:
+        metricas.incrementar("orquestador_admision_rechazos_total", intencion=self.intencion, motivo=motivo)
+        # Lo que tardaría en vaciarse la cola actual con el límite de llamadas en paralelo
+        reintentar_en = (len(self._cola) + 1) * self._duracion_s / max(self.limite, 1)
+        return Sobrecarga(self.intencion, motivo, reintentar_en)
+
+    def _admitida(self, prioridad: int, espera: float):
+        metricas.observar("orquestador_admision_espera_segundos", espera,
+                          intencion=self.intencion, prioridad=_NOMBRE_PRIORIDAD[prioridad])
+
+    def _quitar(self, entrada: list):
+        self._cola.remove(entrada)
+        heapq.heapify(self._cola)
+
+    def _terminada(self, duracion: float):
+        self._duracion_s = 0.8 * self._duracion_s + 0.2 * duracion
+
+
+class Compuerta(_Compuerta):
+    """Compuerta para el orquestador Flask (un hilo por solicitud)."""
+
+    def __init__(self, intencion: str, limite: int):
+        super().__init__(intencion, limite)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admitir(self, prioridad: int = INTERACTIVA, plazo=None):
+        """Espera un lugar (Sobrecarga si no lo obtiene) y lo libera al salir del bloque."""
+        self._entrar(prioridad, plazo)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._terminada(time.perf_counter() - inicio)
+                self._liberar()
+
+    def _entrar(self, prioridad: int, plazo):
+        with self._lock:
+            if self._libre():
+                self.en_vuelo += 1
+                self._admitida(prioridad, 0.0)
+                return
+            if not self._cabe_en_cola(prioridad):
+                raise self._rechazo("cola_llena")
+            entrada = [prioridad, next(self._orden), threading.Event()]
+            heapq.heappush(self._cola, entrada)
+        inicio = time.perf_counter()
+        entrada[2].wait(self._espera_max(plazo))
+        with self._lock:
+            # El lugar pudo cederse justo al vencer la espera: se comprueba bajo el lock
+            if not entrada[2].is_set():
+                self._quitar(entrada)
+                raise self._rechazo("espera_agotada")
+        self._admitida(prioridad, time.perf_counter() - inicio)
+
+    def _liberar(self):
+        # El lugar pasa directamente al primero de la cola (en_vuelo no cambia)
+        if self._cola:
+            heapq.heappop(self._cola)[2].set()
+        else:
+            self.en_vuelo -= 1
+
+
+class CompuertaAsync(_Compuerta):
+    """Compuerta para el orquestador asyncio (todo ocurre en el event loop, sin locks)."""
+
+    @asynccontextmanager
+    async def admitir(self, prioridad: int = INTERACTIVA, plazo=None):
+        await self._entrar(prioridad, plazo)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._terminada(time.perf_counter() - inicio)
+            self._liberar()
+
+    async def _entrar(self, prioridad: int, plazo):
+        if self._libre():
+            self.en_vuelo += 1
+            self._admitida(prioridad, 0.0)
+            return
+        if not self._cabe_en_cola(prioridad):
+            raise self._rechazo("cola_llena")
+        aviso = asyncio.get_running_loop().create_future()
+        entrada = [prioridad, next(self._orden), aviso]
+        heapq.heappush(self._cola, entrada)
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(aviso), self._espera_max(plazo))
+        except asyncio.TimeoutError:
+            if not aviso.done():
+                self._quitar(entrada)
+                raise self._rechazo("espera_agotada")
+        except asyncio.CancelledError:
+            # El cliente se fue: si ya se le había cedido el lugar, pasa al siguiente
+            if aviso.done():
+                self._liberar()
+            else:
+                self._quitar(entrada)
+            raise
+        self._admitida(prioridad, time.perf_counter() - inicio)
+
+    def _liberar(self):
+        if self._cola:
+            heapq.heappop(self._cola)[2].set_result(None)
+        else:
+            self.en_vuelo -= 1
+
+
+_compuertas = []
+
+
+def crear_compuertas(clase) -> dict:
+    """Una compuerta por intención (Compuerta o CompuertaAsync) con su límite de ORQ_LIMITE_<INTENCION>."""
+    compuertas = {}
+    for intencion, limite in LIMITES_POR_DEFECTO.items():
+        compuertas[intencion] = clase(intencion, int(os.getenv(f"ORQ_LIMITE_{intencion.upper()}", str(limite))))
+        _compuertas.append(compuertas[intencion])
+    return compuertas
+
+
+def respuesta_sobrecarga(e: Sobrecarga) -> tuple:
+    """(cuerpo, headers) de la respuesta 429."""
+    cuerpo = {"error": str(e), "codigo": e.codigo, "intencion": e.intencion, "motivo": e.motivo}
+    return cuerpo, {"Retry-After": str(max(1, round(e.reintentar_en)))}
+
+
+metricas.registrar_calculada("orquestador_admision_cola", lambda: [
+    ({"intencion": c.intencion}, len(c._cola)) for c in _compuertas
+])
+metricas.registrar_calculada("orquestador_admision_en_vuelo", lambda: [
+    ({"intencion": c.intencion}, c.en_vuelo) for c in _compuertas
+])
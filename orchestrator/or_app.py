@@ -1,112 +1,245 @@
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, request, jsonify, Response
 import openai
 import os
+import time
 from dotenv import load_dotenv
 
+# Cargar el .env antes de los módulos locales, que leen su configuración al importarse
 load_dotenv()
+
+from or_metrics import metricas
+from or_clasificador import clasificador
+from or_registro import autorizar_admin
+from or_http import ClientesHTTP, ERRORES_TIMEOUT, UploadDemasiadoGrande, leer_en_bloques, ORQ_UPLOAD_MAX_BYTES
+from or_servicios import SERVICIOS, RUTAS, RUTA_PDF, sin_campos_internos
+from or_moderacion import moderar, rechazo, STATUS_RECHAZO
+from or_especulacion import ORQ_ESPECULATIVO, Especulacion
+from or_plazo import Plazo, plazo_vencido, STATUS_PLAZO_VENCIDO
+from or_resiliencia import CircuitoAbierto, respuesta_circuito_abierto, STATUS_CIRCUITO_ABIERTO
+from or_lote import validar_lote, procesar_lote
+from or_monolito import ORQ_MODO, ClientesMonolito
+from or_codec import formato_cliente, decodificar, codificar, crudo, leer_respuesta
+from or_admision import INTERACTIVA, Compuerta, crear_compuertas, Sobrecarga, respuesta_sobrecarga, STATUS_SOBRECARGA
+from or_sse import MIME_SSE, SIN_BUFFER, acepta_sse, evento, flujo_asistente, al_terminar
+from or_memoria import (memoria, con_historial, texto_respuesta, SesionDesconocida, respuesta_sesion_desconocida,
+                        STATUS_SESION_DESCONOCIDA, ORQ_MEMORIA_TTL_S)
+from or_descomposicion import descomponer, resolver_partes, combinar, texto_partes, eventos_partes
+
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 app = Flask(__name__)
 
-# Definir las URLs base de cada microservicio (en este ejemplo, se usan puertos distintos)
-ASSISTANT_RAG_URL = "http://localhost:5002"         # Servicio Rag
-ASSISTANT_PDF_URL = "http://localhost:5001"         # Servicio para análisis de PDF
-ASSISTANT_SHOPPING_URL = "http://localhost:5003"    # Servicio para asesor de compras
+# Clientes HTTP con pool de conexiones keep-alive, reutilizados por todas las solicitudes;
+# con ORQ_MODO=monolito los asistentes corren en este mismo proceso (ver or_monolito.py)
+clientes = ClientesMonolito() if ORQ_MODO == "monolito" else ClientesHTTP(SERVICIOS)
+# Límite de llamadas concurrentes por intención, con cola acotada (ver or_admision.py)
+compuertas = crear_compuertas(Compuerta)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas del orquestador en formato de texto de Prometheus."""
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
 
-def clasificador(message: str) -> str:
+def retransmitir(response, formato: str) -> Response:
+    """Respuesta del asistente al cliente; el cuerpo se reenvía tal cual si ya viene en `formato`."""
+    datos, content_type = crudo(response, formato)
+    return Response(datos, status=response.status_code, content_type=content_type)
+
+def transmitir(servicio: str, path: str, intent: str, data: dict, plazo: Plazo, conversacion):
     """
-    Clasifica la intención del mensaje del usuario.
-    Retorna:
-      - "rag" para Chat RAG.
-      - "pdf" para Análisis de PDF.
-      - "shopping" para Asesor de Compras.
-      - "irrazonable" para solicitudes fuera de tema o malintencionadas.
+    Eventos de /orchestrate con Accept: text/event-stream: primero la intención y luego los del
+    asistente a medida que llegan (ver or_sse.py). Con sesión, el turno se guarda al final.
     """
-    prompt = f"""
-Dado el siguiente mensaje de un usuario: "{message}"
-Clasifícalo en una de las siguientes intenciones:
-1. Chat RAG: Preguntas y respuestas sobre educación financiera.
-2. Análisis de PDF: Para obtener información, resumen y análisis de gastos en documentos PDF.
-3. Asesor de Compras: Recomendación de productos y precios.
-Si el mensaje no se relaciona con estos temas o es malintencionado/toxico,
-responde con "irrazonable".
-
-Responde solo con una de las siguientes palabras exactas:
-- "rag"
-- "pdf"
-- "shopping"
-- "irrazonable"
-"""
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": (
-                    "Eres un experto en clasificar la intención del usuario en uno de estos temas: "
-                    "educación financiera (preguntas y respuestas), análisis de PDF y asesor de compras. "
-                    "Si la consulta es malintencionada o tóxica, responde con 'irrazonable'."
-                )},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=10,
-            temperature=0.0,
-        )
-        answer = response.choices[0].message["content"].strip().lower().strip('"')
-        intent = answer.split()[0]
-        return intent
-    except Exception as e:
-        print(f"Error al clasificar la intención: {e}")
-        return "rag"  # Valor por defecto
+    yield evento("intencion", {"intencion": intent})
+    eventos = flujo_asistente(compuertas[servicio], clientes, servicio, path, plazo, json=con_historial(data, conversacion))
+    if conversacion is None:
+        yield from eventos
+    else:
+        yield from al_terminar(eventos, lambda fin: conversacion.agregar(data["message"], texto_respuesta(fin)))
 
 @app.route('/orchestrate', methods=['POST'])
 def orchestrate():
     """
     Orquestador:
-      - Si se envía un archivo PDF (campo "file" presente y no vacío), se redirige al análisis de PDF.
+      - Si se envía un archivo PDF (multipart/form-data), se redirige al análisis de PDF.
       - Si no se envía un archivo válido, se procesa la solicitud como JSON para clasificar la intención
         y redirigirla al endpoint correspondiente (rag o shopping).
+      - Las solicitudes irrazonables (tóxicas o fuera de tema) se rechazan con 422 (ver or_moderacion.py).
+      - Toda la solicitud tiene un plazo (ver or_plazo.py) que se propaga al asistente; si se agota, 504.
+      - Si todas las réplicas del asistente tienen el circuito abierto, 503 inmediato (ver or_resiliencia.py).
+      - Si la intención ya tiene su cupo de llamadas en vuelo y la cola está llena (o la espera
+        se agota), 429 con Retry-After (ver or_admision.py).
+      - La respuesta del asistente se retransmite sin decodificarla, en JSON o, con
+        Accept: application/msgpack, en MessagePack (ver or_codec.py).
+      - Con Accept: text/event-stream (solo JSON) se responde con Server-Sent Events: la intención
+        clasificada como primer evento y luego la respuesta del asistente a medida que la genera.
+      - Con el header X-Session-Id (emitido por POST /sesiones), el asistente recibe el historial
+        acotado de la conversación y el turno se agrega a la sesión; un id desconocido o expirado
+        responde 400 (ver or_memoria.py).
+      - Un mensaje con varias intenciones ("explícame qué es un crédito y busca laptops baratas")
+        se divide y cada parte va a su asistente en paralelo; la respuesta trae todas las partes
+        con sus tiempos (ver or_descomposicion.py).
     """
-    # Verificar si se envió el campo "file" y que tenga un nombre no vacío
-    file_present = ('file' in request.files and request.files['file'] and 
-                    request.files['file'].filename.strip() != "")
-    
-    if file_present:
-        # Se asume que se quiere analizar un PDF.
-        file = request.files['file']
-        question = request.form.get("question")  # Opcional
-        files = {"file": (file.filename, file, file.mimetype)}
-        data = {}
-        if question:
-            data["question"] = question
-        endpoint = f"{ASSISTANT_PDF_URL}/assistant/analyze-pdf"
+    plazo = Plazo.desde_headers(request.headers)
+    formato = formato_cliente(request.headers)
+    # Un cuerpo multipart trae el archivo PDF: se reenvía tal cual, en streaming y sin
+    # parsearlo aquí (el asistente valida el campo "file" y lee "question").
+    if request.mimetype == "multipart/form-data":
+        if request.content_length is not None and request.content_length > ORQ_UPLOAD_MAX_BYTES:
+            return jsonify({"error": f"El archivo supera el máximo de {ORQ_UPLOAD_MAX_BYTES} bytes"}), 413
+        headers = {"Content-Type": request.content_type, "Accept": formato, **plazo.headers()}
+        if request.content_length is not None:
+            headers["Content-Length"] = str(request.content_length)
         try:
-            response = requests.post(endpoint, files=files, data=data)
-            return jsonify(response.json()), response.status_code
+            with compuertas["pdf"].admitir(INTERACTIVA, plazo):
+                response = clientes.post(*RUTA_PDF, content=leer_en_bloques(request.stream), headers=headers,
+                                         timeout=plazo.timeout())
+            return retransmitir(response, formato)
+        except UploadDemasiadoGrande as e:
+            return jsonify({"error": str(e)}), 413
+        except Sobrecarga as e:
+            cuerpo, headers = respuesta_sobrecarga(e)
+            return jsonify(cuerpo), STATUS_SOBRECARGA, headers
+        except ERRORES_TIMEOUT:
+            return jsonify(plazo_vencido("asistente")), STATUS_PLAZO_VENCIDO
+        except CircuitoAbierto as e:
+            cuerpo, headers = respuesta_circuito_abierto(e)
+            return jsonify(cuerpo), STATUS_CIRCUITO_ABIERTO, headers
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     else:
-        # Procesar la solicitud como JSON
-        data = request.get_json()
+        # Procesar la solicitud como JSON (o MessagePack)
+        data = decodificar(request.get_data(), request.content_type or "")
         if not data or 'message' not in data:
             return jsonify({"error": "No se proporcionó 'message' en la solicitud"}), 400
+        data = sin_campos_internos(data)
         message = data['message']
-        intent = clasificador(message)
+        try:
+            conversacion = memoria.de_headers(request.headers)
+        except SesionDesconocida as e:
+            return jsonify(respuesta_sesion_desconocida(e)), STATUS_SESION_DESCONOCIDA
+
+        # Pre-filtro de moderación: lo tóxico o fuera de tema no llega a ningún asistente
+        motivo = moderar(message)
+        if motivo:
+            return jsonify(rechazo(motivo)), STATUS_RECHAZO
+
+        # Mensaje con varias intenciones: cada parte a su asistente, en paralelo
+        inicio = time.perf_counter()
+        partes = descomponer(message)
+        if partes is not None and len(partes) > 1:
+            clasificacion_ms = (time.perf_counter() - inicio) * 1000
+            if acepta_sse(request.headers):
+                return Response(eventos_partes(clientes, compuertas, message, partes, plazo, conversacion, inicio,
+                                               clasificacion_ms), mimetype=MIME_SSE, headers=SIN_BUFFER)
+            respuesta = combinar(list(resolver_partes(clientes, compuertas, message, partes, plazo, conversacion)), inicio,
+                                 clasificacion_ms)
+            if conversacion is not None:
+                conversacion.agregar(message, texto_partes(respuesta))
+            return Response(codificar(respuesta, formato), status=200, mimetype=formato)
+
+        # Modo especulativo: si hay que esperar al LLM, la recuperación RAG arranca en paralelo
+        especulacion = None
+        def especular():
+            nonlocal especulacion
+            especulacion = Especulacion(clientes, message, plazo)
+        if partes is not None:
+            intent = partes[0][1]  # todas las partes con la misma intención: ya está clasificado
+        else:
+            intent = clasificador(message, al_consultar_llm=especular if ORQ_ESPECULATIVO else None)
         print(f"Intención clasificada: {intent}")
         
+        if intent == "irrazonable":
+            if especulacion is not None:
+                especulacion.descartar()
+            return jsonify(rechazo("clasificador")), STATUS_RECHAZO
+
         # Si la intención es "pdf" pero no se envió un archivo, se rechaza la solicitud.
         if intent == "pdf":
+            if especulacion is not None:
+                especulacion.descartar()
             return jsonify({"error": "Para análisis de PDF se requiere enviar el archivo en 'file'"}), 400
-        elif intent == "shopping":
-            endpoint = f"{ASSISTANT_SHOPPING_URL}/assistant/shopping-advisor"
-        else:  # "rag"
-            endpoint = f"{ASSISTANT_RAG_URL}/assistant/rag"
-        
+        servicio, path = RUTAS.get(intent, RUTAS["rag"])  # "shopping" o "rag" (valor por defecto)
+        if especulacion is not None:
+            if servicio == "rag":
+                contexto = especulacion.contexto()
+                if contexto is not None:
+                    data = {**data, "contexto": contexto}
+            else:
+                especulacion.descartar()
+        if plazo.restante_ms() == 0:
+            return jsonify(plazo_vencido("clasificacion")), STATUS_PLAZO_VENCIDO
+        if acepta_sse(request.headers):
+            return Response(transmitir(servicio, path, intent, data, plazo, conversacion), mimetype=MIME_SSE,
+                            headers=SIN_BUFFER)
+
         try:
-            response = requests.post(endpoint, json=data)
-            return jsonify(response.json()), response.status_code
+            with compuertas[servicio].admitir(INTERACTIVA, plazo):
+                response = clientes.post(servicio, path, json=con_historial(data, conversacion),
+                                         headers={"Accept": formato, **plazo.headers()}, timeout=plazo.timeout())
+            if conversacion is not None and response.status_code == 200:
+                conversacion.agregar(message, texto_respuesta(leer_respuesta(response)))
+            return retransmitir(response, formato)
+        except Sobrecarga as e:
+            cuerpo, headers = respuesta_sobrecarga(e)
+            return jsonify(cuerpo), STATUS_SOBRECARGA, headers
+        except ERRORES_TIMEOUT:
+            return jsonify(plazo_vencido("asistente")), STATUS_PLAZO_VENCIDO
+        except CircuitoAbierto as e:
+            cuerpo, headers = respuesta_circuito_abierto(e)
+            return jsonify(cuerpo), STATUS_CIRCUITO_ABIERTO, headers
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+@app.route('/sesiones', methods=['POST'])
+def crear_sesion():
+    """Crea una sesión de conversación: {"sesion": id} para enviar en el header X-Session-Id."""
+    return jsonify({"sesion": memoria.crear(), "ttl_s": ORQ_MEMORIA_TTL_S}), 201
+
+@app.route('/orchestrate/batch', methods=['POST'])
+def orchestrate_batch():
+    """
+    Orquestador por lotes: recibe {"messages": [...]} y retorna {"resultados": [...]} en el mismo
+    orden, cada uno con la intención, el status y el cuerpo que habría respondido /orchestrate.
+    La clasificación se hace en bloque y las preguntas RAG se envían agrupadas (ver or_lote.py).
+    X-Deadline-Ms acota todo el lote, como en /orchestrate.
+    """
+    messages, error = validar_lote(decodificar(request.get_data(), request.content_type or ""))
+    if error:
+        return jsonify({"error": error}), 400
+    formato = formato_cliente(request.headers)
+    resultados = procesar_lote(clientes, compuertas, messages, Plazo.desde_headers(request.headers))
+    return Response(codificar({"resultados": resultados}, formato), status=200, mimetype=formato)
+
+@app.route('/admin/replicas', methods=['GET'])
+def replicas():
+    """
+    Estado de las réplicas de cada servicio: salud, drenado, solicitudes en vuelo y circuito.
+    Requiere el token de administración (ver or_registro.autorizar_admin).
+    """
+    rechazo_admin = autorizar_admin(request.headers)
+    if rechazo_admin is not None:
+        return jsonify(rechazo_admin[0]), rechazo_admin[1]
+    if clientes.registro is None:
+        return jsonify({"error": "Sin réplicas en modo monolito"}), 404
+    return jsonify(clientes.registro.estado()), 200
+
+@app.route('/admin/replicas/drenar', methods=['POST'])
+def drenar_replica():
+    """
+    Drena (o reactiva con "drenar": false) una réplica: {"servicio": "pdf", "url": "http://...", "drenar": true}.
+    La réplica deja de recibir solicitudes nuevas y termina las que tiene en vuelo.
+    Requiere el token de administración (ver or_registro.autorizar_admin).
+    """
+    rechazo_admin = autorizar_admin(request.headers)
+    if rechazo_admin is not None:
+        return jsonify(rechazo_admin[0]), rechazo_admin[1]
+    data = request.get_json(silent=True) or {}
+    if clientes.registro is None:
+        return jsonify({"error": "Sin réplicas en modo monolito"}), 404
+    if not clientes.registro.drenar(data.get("servicio"), data.get("url"), bool(data.get("drenar", True))):
+        return jsonify({"error": "Réplica no encontrada"}), 404
+    return jsonify(clientes.registro.estado()), 200
+
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
@@ -0,0 +1,286 @@
+"""
+Orquestador asyncio: mismo contrato de /orchestrate que or_app.py, pero la clasificación
+con el LLM y la llamada al asistente se esperan en el event loop en lugar de bloquear un
+hilo por solicitud. Se sirve con aiohttp (ya incluido en requirements.txt). Además expone el
+chat por WebSocket en /ws (ver or_ws.py).
+"""
+import os
+import time
+from aiohttp import web
+import openai
+from dotenv import load_dotenv
+
+# Cargar el .env antes de los módulos locales, que leen su configuración al importarse
+load_dotenv()
+
+from or_metrics import metricas
+from or_clasificador import aclasificador
+from or_registro import autorizar_admin
+from or_http import ClientesHTTPAsync, ERRORES_TIMEOUT, UploadDemasiadoGrande, aleer_en_bloques, ORQ_UPLOAD_MAX_BYTES
+from or_servicios import SERVICIOS, RUTAS, RUTA_PDF, sin_campos_internos
+from or_moderacion import amoderar, rechazo, STATUS_RECHAZO
+from or_especulacion import ORQ_ESPECULATIVO, EspeculacionAsync
+from or_plazo import Plazo, plazo_vencido, STATUS_PLAZO_VENCIDO
+from or_resiliencia import CircuitoAbierto, respuesta_circuito_abierto, STATUS_CIRCUITO_ABIERTO
+from or_lote import validar_lote, aprocesar_lote
+from or_monolito import ORQ_MODO, ClientesMonolitoAsync, importar_asistente
+from or_codec import formato_cliente, decodificar, codificar, crudo, leer_respuesta
+from or_admision import INTERACTIVA, CompuertaAsync, crear_compuertas, Sobrecarga, respuesta_sobrecarga, STATUS_SOBRECARGA
+from or_sse import MIME_SSE, SIN_BUFFER, acepta_sse, evento, aflujo_asistente, aal_terminar
+from or_memoria import (memoria, con_historial, texto_respuesta, SesionDesconocida, respuesta_sesion_desconocida,
+                        STATUS_SESION_DESCONOCIDA, ORQ_MEMORIA_TTL_S)
+from or_ws import chat
+from or_descomposicion import adescomponer, aresolver_partes, combinar, texto_partes, aeventos_partes
+
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# Sesión aiohttp para OpenAI, compartida con los asistentes asyncio (assistant/ass_openai_async.py)
+_openai_async = importar_asistente("ass_openai_async")
+
+
+async def abrir_clientes(app):
+    await _openai_async.abrir_sesion_openai(app)
+    app["clientes"] = ClientesMonolitoAsync() if ORQ_MODO == "monolito" else ClientesHTTPAsync(SERVICIOS)
+    app["clientes"].iniciar_vigilancia()
+    app["compuertas"] = crear_compuertas(CompuertaAsync)
+
+
+async def cerrar_clientes(app):
+    await _openai_async.cerrar_sesion_openai(app)
+    await app["clientes"].cerrar()
+
+
+async def metrics(request):
+    """Métricas del orquestador en formato de texto de Prometheus."""
+    return web.Response(text=metricas.exportar(), content_type="text/plain")
+
+
+def retransmitir(response, formato: str) -> web.Response:
+    """Respuesta del asistente al cliente; el cuerpo se reenvía tal cual si ya viene en `formato`."""
+    datos, content_type = crudo(response, formato)
+    return web.Response(body=datos, status=response.status_code, headers={"Content-Type": content_type})
+
+
+async def transmitir(request, servicio: str, path: str, intent: str, data: dict, plazo: Plazo,
+                     conversacion) -> web.StreamResponse:
+    """Respuesta en streaming de /orchestrate: mismo contrato que or_app.transmitir."""
+    respuesta = web.StreamResponse(headers={"Content-Type": MIME_SSE, **SIN_BUFFER})
+    await respuesta.prepare(request)
+    eventos = aflujo_asistente(request.app["compuertas"][servicio], request.app["clientes"], servicio, path, plazo,
+                               json=con_historial(data, conversacion))
+    if conversacion is not None:
+        eventos = aal_terminar(eventos, lambda fin: conversacion.agregar(data["message"], texto_respuesta(fin)))
+    try:
+        await respuesta.write(evento("intencion", {"intencion": intent}))
+        async for trozo in eventos:
+            await respuesta.write(trozo)
+        await respuesta.write_eof()
+    except ConnectionResetError:
+        pass  # El cliente se desconectó
+    finally:
+        # Cierra la llamada al asistente y libera el lugar en la compuerta
+        await eventos.aclose()
+    return respuesta
+
+
+async def transmitir_partes(request, eventos) -> web.StreamResponse:
+    """Respuesta en streaming de un mensaje con varias intenciones (ver or_descomposicion.py)."""
+    respuesta = web.StreamResponse(headers={"Content-Type": MIME_SSE, **SIN_BUFFER})
+    await respuesta.prepare(request)
+    try:
+        async for trozo in eventos:
+            await respuesta.write(trozo)
+        await respuesta.write_eof()
+    except ConnectionResetError:
+        pass  # El cliente se desconectó
+    finally:
+        # Cancela las partes que no terminaron
+        await eventos.aclose()
+    return respuesta
+
+
+async def orchestrate(request):
+    """
+    Orquestador:
+      - Si se envía un archivo PDF (multipart/form-data), se redirige al análisis de PDF.
+      - Si no se envía un archivo válido, se procesa la solicitud como JSON para clasificar la intención
+        y redirigirla al endpoint correspondiente (rag o shopping).
+      - Las solicitudes irrazonables (tóxicas o fuera de tema) se rechazan con 422 (ver or_moderacion.py).
+      - Toda la solicitud tiene un plazo (ver or_plazo.py) que se propaga al asistente; si se agota, 504.
+      - Si todas las réplicas del asistente tienen el circuito abierto, 503 inmediato (ver or_resiliencia.py).
+      - Con Accept: text/event-stream, Server-Sent Events como en or_app.orchestrate (ver or_sse.py).
+      - Con el header X-Session-Id (emitido por POST /sesiones), memoria de la conversación (ver or_memoria.py).
+      - Mensajes con varias intenciones, en paralelo (ver or_descomposicion.py).
+    """
+    clientes = request.app["clientes"]
+    compuertas = request.app["compuertas"]
+    plazo = Plazo.desde_headers(request.headers)
+    formato = formato_cliente(request.headers)
+
+    # Un cuerpo multipart trae el archivo PDF: se reenvía tal cual, en streaming y sin parsearlo aquí
+    if request.content_type == "multipart/form-data":
+        if request.content_length is not None and request.content_length > ORQ_UPLOAD_MAX_BYTES:
+            return web.json_response({"error": f"El archivo supera el máximo de {ORQ_UPLOAD_MAX_BYTES} bytes"}, status=413)
+        headers = {"Content-Type": request.headers["Content-Type"], "Accept": formato, **plazo.headers()}
+        if request.content_length is not None:
+            headers["Content-Length"] = str(request.content_length)
+        try:
+            async with compuertas["pdf"].admitir(INTERACTIVA, plazo):
+                response = await clientes.post(*RUTA_PDF, content=aleer_en_bloques(request.content), headers=headers,
+                                               timeout=plazo.timeout())
+            return retransmitir(response, formato)
+        except UploadDemasiadoGrande as e:
+            return web.json_response({"error": str(e)}, status=413)
+        except Sobrecarga as e:
+            cuerpo, headers = respuesta_sobrecarga(e)
+            return web.json_response(cuerpo, status=STATUS_SOBRECARGA, headers=headers)
+        except ERRORES_TIMEOUT:
+            return web.json_response(plazo_vencido("asistente"), status=STATUS_PLAZO_VENCIDO)
+        except CircuitoAbierto as e:
+            cuerpo, headers = respuesta_circuito_abierto(e)
+            return web.json_response(cuerpo, status=STATUS_CIRCUITO_ABIERTO, headers=headers)
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=500)
+
+    # Procesar la solicitud como JSON (o MessagePack)
+    data = decodificar(await request.read(), request.content_type)
+    if not data or 'message' not in data:
+        return web.json_response({"error": "No se proporcionó 'message' en la solicitud"}, status=400)
+    data = sin_campos_internos(data)
+    try:
+        conversacion = memoria.de_headers(request.headers)
+    except SesionDesconocida as e:
+        return web.json_response(respuesta_sesion_desconocida(e), status=STATUS_SESION_DESCONOCIDA)
+
+    # Pre-filtro de moderación: lo tóxico o fuera de tema no llega a ningún asistente
+    motivo = await amoderar(data['message'])
+    if motivo:
+        return web.json_response(rechazo(motivo), status=STATUS_RECHAZO)
+
+    # Mensaje con varias intenciones: cada parte a su asistente, en paralelo
+    inicio = time.perf_counter()
+    partes = await adescomponer(data['message'])
+    if partes is not None and len(partes) > 1:
+        clasificacion_ms = (time.perf_counter() - inicio) * 1000
+        if acepta_sse(request.headers):
+            return await transmitir_partes(request, aeventos_partes(clientes, compuertas, data['message'], partes,
+                                                                    plazo, conversacion, inicio, clasificacion_ms))
+        respuesta = combinar([r async for r in aresolver_partes(clientes, compuertas, data['message'], partes, plazo, conversacion)],
+                             inicio, clasificacion_ms)
+        if conversacion is not None:
+            conversacion.agregar(data['message'], texto_partes(respuesta))
+        return web.Response(body=codificar(respuesta, formato), content_type=formato)
+
+    # Modo especulativo: si hay que esperar al LLM, la recuperación RAG arranca en paralelo
+    especulacion = None
+    def especular():
+        nonlocal especulacion
+        especulacion = EspeculacionAsync(clientes, data['message'], plazo)
+    if partes is not None:
+        intent = partes[0][1]  # todas las partes con la misma intención: ya está clasificado
+    else:
+        intent = await aclasificador(data['message'], al_consultar_llm=especular if ORQ_ESPECULATIVO else None)
+    print(f"Intención clasificada: {intent}")
+
+    if intent == "irrazonable":
+        if especulacion is not None:
+            especulacion.descartar()
+        return web.json_response(rechazo("clasificador"), status=STATUS_RECHAZO)
+
+    # Si la intención es "pdf" pero no se envió un archivo, se rechaza la solicitud.
+    if intent == "pdf":
+        if especulacion is not None:
+            especulacion.descartar()
+        return web.json_response({"error": "Para análisis de PDF se requiere enviar el archivo en 'file'"}, status=400)
+    servicio, path = RUTAS.get(intent, RUTAS["rag"])  # "shopping" o "rag" (valor por defecto)
+    if especulacion is not None:
+        if servicio == "rag":
+            contexto = await especulacion.contexto()
+            if contexto is not None:
+                data = {**data, "contexto": contexto}
+        else:
+            especulacion.descartar()
+    if plazo.restante_ms() == 0:
+        return web.json_response(plazo_vencido("clasificacion"), status=STATUS_PLAZO_VENCIDO)
+    if acepta_sse(request.headers):
+        return await transmitir(request, servicio, path, intent, data, plazo, conversacion)
+
+    try:
+        async with compuertas[servicio].admitir(INTERACTIVA, plazo):
+            response = await clientes.post(servicio, path, json=con_historial(data, conversacion),
+                                           headers={"Accept": formato, **plazo.headers()}, timeout=plazo.timeout())
+        if conversacion is not None and response.status_code == 200:
+            conversacion.agregar(data['message'], texto_respuesta(leer_respuesta(response)))
+        return retransmitir(response, formato)
+    except Sobrecarga as e:
+        cuerpo, headers = respuesta_sobrecarga(e)
+        return web.json_response(cuerpo, status=STATUS_SOBRECARGA, headers=headers)
+    except ERRORES_TIMEOUT:
+        return web.json_response(plazo_vencido("asistente"), status=STATUS_PLAZO_VENCIDO)
+    except CircuitoAbierto as e:
+        cuerpo, headers = respuesta_circuito_abierto(e)
+        return web.json_response(cuerpo, status=STATUS_CIRCUITO_ABIERTO, headers=headers)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def crear_sesion(request):
+    """Crea una sesión de conversación: mismo contrato que or_app.crear_sesion."""
+    return web.json_response({"sesion": memoria.crear(), "ttl_s": ORQ_MEMORIA_TTL_S}, status=201)
+
+
+async def orchestrate_batch(request):
+    """Orquestador por lotes: mismo contrato que or_app.orchestrate_batch."""
+    messages, error = validar_lote(decodificar(await request.read(), request.content_type))
+    if error:
+        return web.json_response({"error": error}, status=400)
+    formato = formato_cliente(request.headers)
+    resultados = await aprocesar_lote(request.app["clientes"], request.app["compuertas"], messages,
+                                      Plazo.desde_headers(request.headers))
+    return web.Response(body=codificar({"resultados": resultados}, formato), content_type=formato)
+
+
+async def replicas(request):
+    """Estado de las réplicas de cada servicio: mismo contrato que or_app.replicas."""
+    rechazo_admin = autorizar_admin(request.headers)
+    if rechazo_admin is not None:
+        return web.json_response(rechazo_admin[0], status=rechazo_admin[1])
+    registro = request.app["clientes"].registro
+    if registro is None:
+        return web.json_response({"error": "Sin réplicas en modo monolito"}, status=404)
+    return web.json_response(registro.estado())
+
+
+async def drenar_replica(request):
+    """Drena o reactiva una réplica: mismo contrato que or_app.drenar_replica."""
+    rechazo_admin = autorizar_admin(request.headers)
+    if rechazo_admin is not None:
+        return web.json_response(rechazo_admin[0], status=rechazo_admin[1])
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    registro = request.app["clientes"].registro
+    if registro is None:
+        return web.json_response({"error": "Sin réplicas en modo monolito"}, status=404)
+    if not registro.drenar(data.get("servicio"), data.get("url"), bool(data.get("drenar", True))):
+        return web.json_response({"error": "Réplica no encontrada"}, status=404)
+    return web.json_response(registro.estado())
+
+
+def crear_app():
+    app = web.Application(middlewares=[_openai_async.sesion_openai])
+    app.on_startup.append(abrir_clientes)
+    app.on_cleanup.append(cerrar_clientes)
+    app.router.add_post('/orchestrate', orchestrate)
+    app.router.add_post('/orchestrate/batch', orchestrate_batch)
+    app.router.add_post('/sesiones', crear_sesion)
+    app.router.add_get('/ws', chat)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/admin/replicas', replicas)
+    app.router.add_post('/admin/replicas/drenar', drenar_replica)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(crear_app(), port=5000)
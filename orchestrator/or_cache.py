@@ -0,0 +1,128 @@
+"""
+Caché LRU con TTL para resultados de clasificación (y otros veredictos baratos de reutilizar).
+
+  - En memoria: OrderedDict acotado a `tamano` entradas; cada entrada expira tras `ttl` segundos.
+  - Opcionalmente respaldada por un archivo SQLite local compartido entre procesos del
+    orquestador en el mismo host: un fallo en memoria consulta el disco antes de recalcular.
+    Las filas expiradas se borran al escribir, como máximo cada `purga_s` segundos por proceso.
+
+Los contadores (hit, miss, evicción, expiración) y las entradas en memoria
+(orquestador_cache_entradas) se exportan en /metrics con la etiqueta `cache`.
+"""
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from or_metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+# Cachés creadas en el proceso, para orquestador_cache_entradas{cache}
+_caches = []
+
+
+class CacheDisco:
+    """Almacén clave -> valor con expiración en SQLite (modo WAL para lectores concurrentes)."""
+
+    def __init__(self, path: str, tabla: str, purga_s: float = 300):
+        self.path = path
+        self.tabla = tabla
+        self.purga_s = purga_s
+        self._proxima_purga = time.time() + purga_s
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (clave TEXT PRIMARY KEY, valor TEXT, expira REAL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {tabla}_expira ON {tabla} (expira)")
+
+    def _conexion(self):
+        # sqlite3 no permite compartir conexiones entre hilos: una por hilo
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def obtener(self, clave: str):
+        # La caché en disco es una optimización: un error de SQLite equivale a un miss
+        try:
+            fila = self._conexion().execute(
+                f"SELECT valor, expira FROM {self.tabla} WHERE clave = ?", (clave,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error al leer la caché en disco %s: %s", self.path, e)
+            return None
+        if fila and fila[1] > time.time():
+            return fila
+        return None
+
+    def guardar(self, clave: str, valor: str, expira: float):
+        ahora = time.time()
+        purgar = ahora >= self._proxima_purga
+        if purgar:
+            self._proxima_purga = ahora + self.purga_s
+        try:
+            with self._conexion() as conn:
+                conn.execute(f"INSERT OR REPLACE INTO {self.tabla} VALUES (?, ?, ?)", (clave, valor, expira))
+                if purgar:
+                    conn.execute(f"DELETE FROM {self.tabla} WHERE expira <= ?", (ahora,))
+        except sqlite3.Error as e:
+            logger.error("Error al escribir la caché en disco %s: %s", self.path, e)
+
+
+class CacheTTL:
+
+    def __init__(self, nombre: str, tamano: int = 10000, ttl: float = 3600, path_disco: str = ""):
+        self.nombre = nombre
+        self.tamano = tamano
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.disco = CacheDisco(path_disco, nombre) if path_disco else None
+        _caches.append(self)
+
+    def _contar(self, evento: str):
+        metricas.incrementar("orquestador_cache_total", cache=self.nombre, evento=evento)
+
+    def obtener(self, clave: str):
+        """Retorna el valor cacheado o None."""
+        ahora = time.time()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira > ahora:
+                    self._datos.move_to_end(clave)
+                    self._contar("hit")
+                    return valor
+                del self._datos[clave]
+                self._contar("expiracion")
+        if self.disco is not None:
+            fila = self.disco.obtener(clave)
+            if fila is not None:
+                self._contar("hit_disco")
+                self._insertar(clave, fila[0], fila[1])
+                return fila[0]
+        self._contar("miss")
+        return None
+
+    def guardar(self, clave: str, valor: str):
+        expira = time.time() + self.ttl
+        self._insertar(clave, valor, expira)
+        if self.disco is not None:
+            self.disco.guardar(clave, valor, expira)
+
+    def _insertar(self, clave: str, valor: str, expira: float):
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+                self._contar("eviccion")
+
+
+metricas.registrar_calculada("orquestador_cache_entradas", lambda: [
+    ({"cache": cache.nombre}, len(cache._datos)) for cache in _caches
+])
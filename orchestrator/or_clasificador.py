@@ -0,0 +1,249 @@
+"""
+Clasificación de intenciones compartida por el orquestador Flask (or_app.py) y el
+orquestador asyncio (or_app_async.py): caché -> reglas/modelo local -> LLM.
+"""
+import os
+import json
+import asyncio
+import openai
+
+from or_intents import INTENCIONES, clasificar_local, normalizar_mensaje
+from or_metrics import metricas
+from or_cache import CacheTTL
+
+# Caché de intenciones por mensaje normalizado (CLASIFICADOR_CACHE_DB: SQLite compartido entre procesos)
+cache_intenciones = CacheTTL(
+    "clasificador",
+    tamano=int(os.getenv("CLASIFICADOR_CACHE_TAMANO", "10000")),
+    ttl=float(os.getenv("CLASIFICADOR_CACHE_TTL", "3600")),
+    path_disco=os.getenv("CLASIFICADOR_CACHE_DB", ""),
+)
+# Timeout de cada llamada de clasificación al LLM; si vence se usa INTENCION_RESPALDO
+CLASIFICADOR_TIMEOUT = float(os.getenv("CLASIFICADOR_TIMEOUT", "5"))
+# Intención cuando el LLM falla o responde algo inesperado. No se guarda en la caché: el
+# próximo mensaje igual vuelve a consultar al LLM.
+INTENCION_RESPALDO = "rag"
+# Mensajes por llamada al LLM en la clasificación por lotes
+CLASIFICADOR_LOTE_LLM = int(os.getenv("CLASIFICADOR_LOTE_LLM", "50"))
+
+SISTEMA_CLASIFICACION = (
+    "Eres un experto en clasificar la intención del usuario en uno de estos temas: "
+    "educación financiera (preguntas y respuestas), análisis de PDF y asesor de compras. "
+    "Si la consulta es malintencionada o tóxica, responde con 'irrazonable'."
+)
+
+def mensajes_clasificacion(message: str) -> list:
+    prompt = f"""
+Dado el siguiente mensaje de un usuario: "{message}"
+Clasifícalo en una de las siguientes intenciones:
+1. Chat RAG: Preguntas y respuestas sobre educación financiera.
+2. Análisis de PDF: Para obtener información, resumen y análisis de gastos en documentos PDF.
+3. Asesor de Compras: Recomendación de productos y precios.
+Si el mensaje no se relaciona con estos temas o es malintencionado/toxico,
+responde con "irrazonable".
+
+Responde solo con una de las siguientes palabras exactas:
+- "rag"
+- "pdf"
+- "shopping"
+- "irrazonable"
+"""
+    return [
+        {"role": "system", "content": SISTEMA_CLASIFICACION},
+        {"role": "user", "content": prompt}
+    ]
+
+def intencion_de_respuesta(response):
+    answer = response.choices[0].message["content"].strip().lower().strip('"')
+    intent = answer.split()[0] if answer else None
+    return intent if intent in INTENCIONES else None
+
+def clasificador_llm(message: str):
+    """
+    Clasifica la intención del mensaje del usuario con el LLM.
+    Retorna:
+      - "rag" para Chat RAG.
+      - "pdf" para Análisis de PDF.
+      - "shopping" para Asesor de Compras.
+      - "irrazonable" para solicitudes fuera de tema o malintencionadas.
+      - None si la llamada falla o la respuesta no es una intención.
+    """
+    try:
+        response = openai.ChatCompletion.create(
+            model="gpt-4o-mini",
+            messages=mensajes_clasificacion(message),
+            max_tokens=10,
+            temperature=0.0,
+            request_timeout=CLASIFICADOR_TIMEOUT,
+        )
+        return intencion_de_respuesta(response)
+    except Exception as e:
+        print(f"Error al clasificar la intención: {e}")
+        return None
+
+async def aclasificador_llm(message: str):
+    """Variante asíncrona de clasificador_llm para el orquestador asyncio."""
+    try:
+        response = await openai.ChatCompletion.acreate(
+            model="gpt-4o-mini",
+            messages=mensajes_clasificacion(message),
+            max_tokens=10,
+            temperature=0.0,
+            request_timeout=CLASIFICADOR_TIMEOUT,
+        )
+        return intencion_de_respuesta(response)
+    except Exception as e:
+        print(f"Error al clasificar la intención: {e}")
+        return None
+
+def _registrar(clave: str, intent, origen: str) -> str:
+    """Cuenta la clasificación y la guarda en la caché; intent None = respaldo, sin caché."""
+    if intent is None:
+        metricas.incrementar("orquestador_clasificacion_respaldo_total")
+        intent = INTENCION_RESPALDO
+    else:
+        cache_intenciones.guardar(clave, intent)
+    metricas.incrementar("orquestador_clasificacion_total", origen=origen, intencion=intent)
+    return intent
+
+def clasificador(message: str, al_consultar_llm=None) -> str:
+    """
+    Clasifica la intención del mensaje en cascada: caché por mensaje normalizado, reglas y
+    modelo local (ver or_intents.py); solo si la confianza local es baja se consulta al LLM.
+    `al_consultar_llm()` se invoca justo antes de la llamada al LLM (p. ej. para adelantar trabajo).
+    """
+    clave = normalizar_mensaje(message)
+    intent = cache_intenciones.obtener(clave)
+    if intent is not None:
+        return intent
+    intent, origen, _ = clasificar_local(message)
+    if intent is None:
+        if al_consultar_llm is not None:
+            al_consultar_llm()
+        intent = clasificador_llm(message)
+    return _registrar(clave, intent, origen)
+
+async def aclasificador(message: str, al_consultar_llm=None) -> str:
+    """Variante asíncrona de clasificador: solo la llamada al LLM cede el event loop."""
+    clave = normalizar_mensaje(message)
+    intent = cache_intenciones.obtener(clave)
+    if intent is not None:
+        return intent
+    intent, origen, _ = clasificar_local(message)
+    if intent is None:
+        if al_consultar_llm is not None:
+            al_consultar_llm()
+        intent = await aclasificador_llm(message)
+    return _registrar(clave, intent, origen)
+
+def mensajes_clasificacion_lote(messages: list) -> list:
+    numerados = "\n".join(f"{i}. {json.dumps(m, ensure_ascii=False)}" for i, m in enumerate(messages, 1))
+    prompt = f"""
+Clasifica cada uno de los siguientes {len(messages)} mensajes de usuarios:
+{numerados}
+
+Intenciones posibles:
+- "rag": preguntas y respuestas sobre educación financiera.
+- "pdf": información, resumen y análisis de gastos en documentos PDF.
+- "shopping": recomendación de productos y precios.
+- "irrazonable": no se relaciona con estos temas o es malintencionado/tóxico.
+
+Responde solo con un arreglo JSON de {len(messages)} intenciones, en el mismo orden de los mensajes.
+"""
+    return [{"role": "system", "content": SISTEMA_CLASIFICACION}, {"role": "user", "content": prompt}]
+
+def intenciones_de_respuesta_lote(response, n: int):
+    """
+    Lista de n intenciones (None en las que no son una intención válida), o None si la
+    respuesta no se puede interpretar.
+    """
+    try:
+        intents = json.loads(response.choices[0].message["content"].strip().strip("`").removeprefix("json"))
+    except ValueError:
+        return None
+    if not isinstance(intents, list) or len(intents) != n:
+        return None
+    return [i if i in INTENCIONES else None for i in (str(x).strip().lower() for x in intents)]
+
+def _parametros_lote(messages: list) -> dict:
+    return dict(model="gpt-4o-mini", messages=mensajes_clasificacion_lote(messages),
+                max_tokens=8 * len(messages) + 10, temperature=0.0, request_timeout=CLASIFICADOR_TIMEOUT)
+
+def clasificador_llm_lote(messages: list) -> list:
+    """
+    Clasifica varios mensajes con una sola llamada al LLM. Si la respuesta no trae una
+    intención por mensaje, se clasifican uno por uno. None en los que fallan (ver clasificador_llm).
+    """
+    try:
+        intents = intenciones_de_respuesta_lote(openai.ChatCompletion.create(**_parametros_lote(messages)), len(messages))
+    except Exception as e:
+        print(f"Error al clasificar el lote: {e}")
+        intents = None
+    return intents or [clasificador_llm(m) for m in messages]
+
+async def aclasificador_llm_lote(messages: list) -> list:
+    try:
+        response = await openai.ChatCompletion.acreate(**_parametros_lote(messages))
+        intents = intenciones_de_respuesta_lote(response, len(messages))
+    except Exception as e:
+        print(f"Error al clasificar el lote: {e}")
+        intents = None
+    return intents or list(await asyncio.gather(*(aclasificador_llm(m) for m in messages)))
+
+def _lote_local(messages: list):
+    """
+    Caché y clasificador local para cada mensaje. Retorna (intenciones, pendientes), donde
+    pendientes agrupa por mensaje normalizado los que requieren al LLM: {clave: (mensaje, [índices])}.
+    """
+    intents, pendientes = [None] * len(messages), {}
+    for i, message in enumerate(messages):
+        clave = normalizar_mensaje(message)
+        if clave in pendientes:
+            pendientes[clave][1].append(i)
+            continue
+        intent = cache_intenciones.obtener(clave)
+        if intent is None:
+            intent, origen, _ = clasificar_local(message)
+            if intent is None:
+                pendientes[clave] = (message, [i])
+                continue
+            intent = _registrar(clave, intent, origen)
+        intents[i] = intent
+    return intents, pendientes
+
+def _completar_lote(intents: list, pendientes: dict, respuestas: list) -> list:
+    for (clave, (_, indices)), intent in zip(pendientes.items(), respuestas):
+        intent = _registrar(clave, intent, "llm")
+        for i in indices:
+            intents[i] = intent
+    return intents
+
+def _trozos(lista: list, tamano: int) -> list:
+    return [lista[i:i + tamano] for i in range(0, len(lista), tamano)]
+
+def clasificador_lote(messages: list) -> list:
+    """
+    Clasifica una lista de mensajes (mismo orden): caché y modelo local por mensaje, y los
+    que quedan sin decidir (sin repetir mensajes iguales) en llamadas de hasta
+    CLASIFICADOR_LOTE_LLM mensajes al LLM.
+    """
+    intents, pendientes = _lote_local(messages)
+    textos = [message for message, _ in pendientes.values()]
+    respuestas = [i for trozo in _trozos(textos, CLASIFICADOR_LOTE_LLM) for i in clasificador_llm_lote(trozo)]
+    return _completar_lote(intents, pendientes, respuestas)
+
+async def aclasificador_lote(messages: list) -> list:
+    """Variante asíncrona de clasificador_lote: las llamadas al LLM de cada trozo van en paralelo."""
+    intents, pendientes = _lote_local(messages)
+    textos = [message for message, _ in pendientes.values()]
+    trozos = await asyncio.gather(*(aclasificador_llm_lote(t) for t in _trozos(textos, CLASIFICADOR_LOTE_LLM)))
+    return _completar_lote(intents, pendientes, [i for trozo in trozos for i in trozo])
+
+def proporcion_clasificacion_local() -> float:
+    total = sum(metricas.valor("orquestador_clasificacion_total", origen=origen, intencion=intent)
+                for origen in ("regla", "modelo", "llm") for intent in INTENCIONES)
+    llm = sum(metricas.valor("orquestador_clasificacion_total", origen="llm", intencion=intent)
+              for intent in INTENCIONES)
+    return (total - llm) / total if total else 0.0
+
+metricas.registrar_calculada("orquestador_clasificacion_local_ratio", proporcion_clasificacion_local)
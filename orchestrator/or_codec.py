@@ -0,0 +1,79 @@
+"""
+Codificación de los cuerpos entre el orquestador y los asistentes (ver assistant/ass_codec.py).
+
+  - Solicitudes a los asistentes: JSON, o MessagePack con ORQ_CODEC=msgpack (todos los
+    asistentes deben tener ass_codec.py).
+  - Respuestas que el orquestador decodifica (lotes, especulación): se piden en MessagePack
+    con Accept: application/msgpack, application/json; un asistente sin soporte responde JSON.
+  - Respuestas que solo se retransmiten (/orchestrate): se piden en el formato que aceptó el
+    cliente y el cuerpo se reenvía tal cual, sin decodificarlo ni volver a codificarlo.
+"""
+import os
+import json
+
+import msgpack
+
+MIME_JSON = "application/json"
+MIME_MSGPACK = "application/msgpack"
+ORQ_CODEC = os.getenv("ORQ_CODEC", "json")
+ACCEPT_INTERNO = f"{MIME_MSGPACK}, {MIME_JSON}"
+
+
+def formato_cliente(headers) -> str:
+    """Formato de respuesta que acepta el cliente: MessagePack si lo pide en Accept, si no JSON."""
+    return MIME_MSGPACK if MIME_MSGPACK in headers.get("Accept", "") else MIME_JSON
+
+
+def _mimetype(content_type: str) -> str:
+    return content_type.split(";")[0].strip().lower()
+
+
+def decodificar(datos: bytes, content_type: str):
+    """Cuerpo JSON o MessagePack (None si viene vacío o no se puede decodificar)."""
+    if not datos:
+        return None
+    try:
+        if _mimetype(content_type) == MIME_MSGPACK:
+            return msgpack.unpackb(datos)
+        return json.loads(datos)
+    except (ValueError, msgpack.UnpackException):
+        return None
+
+
+def codificar(cuerpo, formato: str) -> bytes:
+    if formato == MIME_MSGPACK:
+        return msgpack.packb(cuerpo)
+    return json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+
+
+def preparar_solicitud(kwargs: dict) -> dict:
+    """Agrega el Accept interno (si el llamador no fijó uno) y, con ORQ_CODEC=msgpack, codifica `json`."""
+    headers = {"Accept": ACCEPT_INTERNO, **(kwargs.get("headers") or {})}
+    kwargs = {**kwargs, "headers": headers}
+    if ORQ_CODEC == "msgpack" and kwargs.get("json") is not None:
+        kwargs["content"] = msgpack.packb(kwargs.pop("json"))
+        headers["Content-Type"] = MIME_MSGPACK
+    return kwargs
+
+
+def leer_respuesta(response):
+    """
+    Cuerpo decodificado de la respuesta de un asistente (httpx.Response, or_http.RespuestaHTTP o
+    RespuestaLocal, que ya trae el cuerpo decodificado y no tiene `content`).
+    """
+    if getattr(response, "content", None) is None:
+        return response.json()
+    if _mimetype(response.headers.get("Content-Type", "")) == MIME_MSGPACK:
+        return msgpack.unpackb(response.content)
+    return response.json()
+
+
+def crudo(response, formato: str) -> tuple:
+    """
+    (bytes, content_type) para retransmitir la respuesta de un asistente en `formato`. Si ya viene
+    en ese formato se usa el cuerpo recibido tal cual; si no (asistente sin MessagePack, modo
+    monolito) se decodifica y se codifica una vez.
+    """
+    if getattr(response, "content", None) is not None and _mimetype(response.headers.get("Content-Type", "")) == formato:
+        return response.content, response.headers["Content-Type"]
+    return codificar(leer_respuesta(response), formato), formato
@@ -0,0 +1,239 @@
+"""
+Mensajes con varias intenciones ("explícame qué es un crédito y busca laptops baratas").
+
+/orchestrate separa el mensaje en partes y, si tienen intenciones distintas, las resuelve en
+paralelo contra el asistente de cada una y responde con todas juntas (ORQ_MULTI_INTENCION=0
+lo desactiva):
+  1. División local, solo entre pedidos independientes: puntuación o "y"/"además"/"también"
+     seguidos de un verbo de pedido con su objeto ("...crédito y busca laptops baratas"), y
+     con un pedido o una pregunta completa antes. Las continuaciones ("y cómo funciona",
+     "que tenga buena cámara") no se separan. Un mensaje sin separadores (la gran mayoría,
+     aunque tenga varias oraciones) sigue el camino normal, sin clasificación extra.
+  2. Clasificación de las partes en bloque (ver or_clasificador.clasificador_lote: caché y
+     modelo local, y una sola llamada al LLM para las indecisas). Las partes contiguas con la
+     misma intención se vuelven a unir; si queda una sola, es un mensaje simple.
+  3. Cada parte se envía a su asistente en paralelo, con el mismo plazo y admisión interactiva,
+     y con el mensaje completo como contexto ("consulta" en el historial, ver
+     assistant/ass_historial.py) para que la parte no pierda el sujeto.
+
+Respuesta: {"partes": [{"mensaje", "intencion", "status", "cuerpo", "duracion_ms"}, ...],
+"clasificacion_ms", "duracion_ms"}, en el orden del mensaje; cada parte con el status y el cuerpo
+que habría respondido /orchestrate. Como máximo ORQ_MULTI_MAX_PARTES partes (el resto se une a la
+última).
+
+Con Accept: text/event-stream: evento "intencion" con {"intencion": "multiple", "partes": [...]},
+un evento "parte" por cada parte a medida que termina (con su "indice" en el mensaje) y al final
+"fin" con la respuesta completa. Con sesión (X-Session-Id) se guarda un solo turno con las
+respuestas de todas las partes.
+
+Métricas: orquestador_multi_intencion_total{intencion} por parte resuelta.
+"""
+import os
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from or_metrics import metricas
+from or_codec import leer_respuesta
+from or_clasificador import clasificador_lote, aclasificador_lote
+from or_moderacion import rechazo, STATUS_RECHAZO
+from or_servicios import RUTAS
+from or_admision import INTERACTIVA
+from or_memoria import con_historial, texto_respuesta
+from or_sse import evento, evento_final, respuesta_de_error
+
+ORQ_MULTI_INTENCION = os.getenv("ORQ_MULTI_INTENCION", "1") == "1"
+ORQ_MULTI_MAX_PARTES = int(os.getenv("ORQ_MULTI_MAX_PARTES", "4"))
+# Hilos para las partes en el orquestador Flask
+ORQ_MULTI_HILOS = int(os.getenv("ORQ_MULTI_HILOS", "16"))
+
+# Verbos que abren un pedido independiente ("busca laptops", "explícame el ahorro"). Una pregunta
+# que sigue a "y" ("y cómo funciona", "y cuánto cuesta") casi siempre depende de la anterior:
+# no abre una parte nueva.
+_PEDIDO = (r"(?:b[uú]sca(?:me)?|encu[eé]ntra(?:me)?|recomi[eé]nda(?:me)?|compara|cotiza|expl[ií]ca(?:me)?|"
+           r"dime|cu[eé]ntame|analiza)")
+_CONECTOR = r"(?:y|adem[aá]s|tambi[eé]n)\b,?\s*"
+# Puntuación o conector seguido de un verbo de pedido con su objeto ("...crédito y busca laptops")
+_SEPARADOR = re.compile(
+    rf"\s*(?:[;.?!]+\s*|,?\s+(?={_CONECTOR}))(?:{_CONECTOR})*(?={_PEDIDO}\b[ \t]+[^\s,.;?!])",
+    re.IGNORECASE,
+)
+# La parte anterior al primer separador también tiene que ser un pedido o una pregunta completa
+_INDEPENDIENTE = re.compile(
+    rf"\b(?:{_PEDIDO}|busco|quiero|necesito|qu[eé]|c[oó]mo|cu[aá]l(?:es)?|cu[aá]nto|d[oó]nde)\b", re.IGNORECASE)
+_MIN_PALABRAS = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ORQ_MULTI_HILOS, thread_name_prefix="multi")
+        return _executor
+
+
+def _tramos(message: str) -> list:
+    """(inicio, fin) de cada pedido independiente del mensaje, sin los separadores."""
+    tramos, inicio = [], 0
+    for separador in _SEPARADOR.finditer(message):
+        tramos.append((inicio, separador.start()))
+        inicio = separador.end()
+    tramos.append((inicio, len(message)))
+    # Lo que va antes del primer verbo de pedido ("Hola, por favor. Busca...") se une al siguiente
+    while len(tramos) > 1:
+        primero = message[tramos[0][0]:tramos[0][1]]
+        if _INDEPENDIENTE.search(primero) and len(primero.split()) >= _MIN_PALABRAS:
+            break
+        tramos[:2] = [(tramos[0][0], tramos[1][1])]
+    if len(tramos) > ORQ_MULTI_MAX_PARTES:
+        tramos[ORQ_MULTI_MAX_PARTES - 1:] = [(tramos[ORQ_MULTI_MAX_PARTES - 1][0], tramos[-1][1])]
+    return tramos
+
+
+def _agrupar(message: str, tramos: list, intents: list) -> list:
+    """[(texto, intención)], uniendo las partes contiguas con la misma intención."""
+    grupos = []
+    for (inicio, fin), intent in zip(tramos, intents):
+        if grupos and grupos[-1][2] == intent:
+            grupos[-1][1] = fin
+        else:
+            grupos.append([inicio, fin, intent])
+    return [(message[inicio:fin].strip(" ,.;¿¡"), intent) for inicio, fin, intent in grupos]
+
+
+def descomponer(message: str):
+    """[(texto, intención)] si el mensaje tiene varias partes; None si no tiene separadores."""
+    tramos = _tramos(message) if ORQ_MULTI_INTENCION else []
+    if len(tramos) < 2:
+        return None
+    return _agrupar(message, tramos, clasificador_lote([message[i:f] for i, f in tramos]))
+
+
+async def adescomponer(message: str):
+    """Variante asíncrona de descomponer."""
+    tramos = _tramos(message) if ORQ_MULTI_INTENCION else []
+    if len(tramos) < 2:
+        return None
+    return _agrupar(message, tramos, await aclasificador_lote([message[i:f] for i, f in tramos]))
+
+
+def _sin_asistente(intent: str):
+    """(status, cuerpo) de una parte que no llega a ningún asistente, o None."""
+    if intent == "irrazonable":
+        return STATUS_RECHAZO, rechazo("clasificador")
+    if intent == "pdf":
+        return 400, {"error": "Para análisis de PDF se requiere enviar el archivo en 'file'"}
+    return None
+
+
+def _parte(indice: int, texto: str, intent: str, status: int, cuerpo: dict, inicio: float) -> dict:
+    metricas.incrementar("orquestador_multi_intencion_total", intencion=intent)
+    return {"indice": indice, "mensaje": texto, "intencion": intent, "status": status, "cuerpo": cuerpo,
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+
+
+def _resolver(clientes, compuertas: dict, message: str, indice: int, texto: str, intent: str, plazo,
+              conversacion) -> dict:
+    inicio = time.perf_counter()
+    resultado = _sin_asistente(intent)
+    if resultado is None:
+        servicio, path = RUTAS.get(intent, RUTAS["rag"])
+        try:
+            with compuertas[servicio].admitir(INTERACTIVA, plazo):
+                response = clientes.post(servicio, path, json=con_historial({"message": texto}, conversacion, message),
+                                         headers=plazo.headers(), timeout=plazo.timeout())
+            resultado = response.status_code, leer_respuesta(response)
+        except Exception as e:
+            resultado = respuesta_de_error(e)
+    return _parte(indice, texto, intent, *resultado, inicio)
+
+
+async def _aresolver(clientes, compuertas: dict, message: str, indice: int, texto: str, intent: str, plazo,
+                     conversacion) -> dict:
+    inicio = time.perf_counter()
+    resultado = _sin_asistente(intent)
+    if resultado is None:
+        servicio, path = RUTAS.get(intent, RUTAS["rag"])
+        try:
+            async with compuertas[servicio].admitir(INTERACTIVA, plazo):
+                response = await clientes.post(servicio, path,
+                                               json=con_historial({"message": texto}, conversacion, message),
+                                               headers=plazo.headers(), timeout=plazo.timeout())
+            resultado = response.status_code, leer_respuesta(response)
+        except Exception as e:
+            resultado = respuesta_de_error(e)
+    return _parte(indice, texto, intent, *resultado, inicio)
+
+
+def resolver_partes(clientes, compuertas: dict, message: str, partes: list, plazo, conversacion=None):
+    """Resuelve las partes en paralelo y genera el resultado de cada una a medida que termina."""
+    futuros = [_pool().submit(_resolver, clientes, compuertas, message, i, texto, intent, plazo, conversacion)
+               for i, (texto, intent) in enumerate(partes)]
+    for futuro in as_completed(futuros):
+        yield futuro.result()
+
+
+async def aresolver_partes(clientes, compuertas: dict, message: str, partes: list, plazo, conversacion=None):
+    """Variante asíncrona de resolver_partes."""
+    tareas = [asyncio.create_task(_aresolver(clientes, compuertas, message, i, texto, intent, plazo, conversacion))
+              for i, (texto, intent) in enumerate(partes)]
+    try:
+        for tarea in asyncio.as_completed(tareas):
+            yield await tarea
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+
+def combinar(resultados: list, inicio: float, clasificacion_ms: float) -> dict:
+    """Respuesta de /orchestrate con las partes en el orden del mensaje."""
+    partes = sorted(resultados, key=lambda r: r["indice"])
+    return {
+        "partes": [{k: v for k, v in r.items() if k != "indice"} for r in partes],
+        "clasificacion_ms": round(clasificacion_ms, 1),
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def texto_partes(respuesta: dict) -> str:
+    """Texto de las partes respondidas, para el historial de la conversación."""
+    return "\n".join(texto_respuesta(p["cuerpo"]) for p in respuesta["partes"] if p["status"] == 200)
+
+
+def eventos_partes(clientes, compuertas: dict, message: str, partes: list, plazo, conversacion,
+                   inicio: float, clasificacion_ms: float):
+    """Eventos SSE de un mensaje con varias intenciones (ver la descripción del módulo)."""
+    yield evento("intencion", {"intencion": "multiple",
+                               "partes": [{"mensaje": texto, "intencion": intent} for texto, intent in partes]})
+    resultados = []
+    for resultado in resolver_partes(clientes, compuertas, message, partes, plazo, conversacion):
+        resultados.append(resultado)
+        yield evento("parte", resultado)
+    respuesta = combinar(resultados, inicio, clasificacion_ms)
+    if conversacion is not None:
+        conversacion.agregar(message, texto_partes(respuesta))
+    yield evento_final(200, respuesta)
+
+
+async def aeventos_partes(clientes, compuertas: dict, message: str, partes: list, plazo, conversacion,
+                          inicio: float, clasificacion_ms: float):
+    """Variante asíncrona de eventos_partes."""
+    yield evento("intencion", {"intencion": "multiple",
+                               "partes": [{"mensaje": texto, "intencion": intent} for texto, intent in partes]})
+    resultados = []
+    pendientes = aresolver_partes(clientes, compuertas, message, partes, plazo, conversacion)
+    try:
+        async for resultado in pendientes:
+            resultados.append(resultado)
+            yield evento("parte", resultado)
+    finally:
+        await pendientes.aclose()
+    respuesta = combinar(resultados, inicio, clasificacion_ms)
+    if conversacion is not None:
+        conversacion.agregar(message, texto_partes(respuesta))
+    yield evento_final(200, respuesta)
@@ -0,0 +1,128 @@
+"""
+Ejecución especulativa de la recuperación RAG (ORQ_ESPECULATIVO=1).
+
+La mayoría de los mensajes terminan en el asistente RAG. Cuando la clasificación necesita
+al LLM (caché y clasificador local no deciden), se lanza en paralelo /assistant/rag/retrieve
+(embedding + búsqueda, sin generación):
+  - Si la intención resulta "rag", el contexto ya recuperado viaja en la llamada a
+    /assistant/rag y el asistente omite esas etapas.
+  - Si resulta otra intención, la recuperación se cancela (o se descarta si ya corría).
+La recuperación lleva el plazo de la solicitud (X-Deadline-Ms): el asistente no la continúa
+una vez vencido.
+
+Métricas en /metrics:
+  orquestador_especulacion_total{resultado=acierto|desperdicio|error}
+  orquestador_especulacion_ahorro_segundos      tiempo de recuperación solapado con la clasificación
+  orquestador_especulacion_desperdicio_segundos tiempo de recuperación descartado
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from or_metrics import metricas
+from or_codec import leer_respuesta
+from or_servicios import RUTA_RAG_RETRIEVE
+
+logger = logging.getLogger(__name__)
+
+ORQ_ESPECULATIVO = os.getenv("ORQ_ESPECULATIVO", "0") == "1"
+ORQ_ESPECULATIVO_HILOS = int(os.getenv("ORQ_ESPECULATIVO_HILOS", "32"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ORQ_ESPECULATIVO_HILOS, thread_name_prefix="especulacion")
+        return _executor
+
+
+class _Base:
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.duracion = None  # segundos que tardó la recuperación, si terminó
+
+    def _registrar_acierto(self, esperado_desde: float):
+        # Lo ahorrado es la parte de la recuperación que corrió mientras se clasificaba
+        ahorro = min(esperado_desde - self.inicio, self.duracion)
+        metricas.incrementar("orquestador_especulacion_total", resultado="acierto")
+        metricas.observar("orquestador_especulacion_ahorro_segundos", ahorro)
+
+    def _registrar_error(self, error: Exception):
+        logger.error("Falló la recuperación especulativa: %s", error)
+        metricas.incrementar("orquestador_especulacion_total", resultado="error")
+
+    def _registrar_desperdicio(self, iniciada: bool):
+        metricas.incrementar("orquestador_especulacion_total", resultado="desperdicio")
+        if iniciada:
+            desperdicio = self.duracion if self.duracion is not None else time.perf_counter() - self.inicio
+            metricas.observar("orquestador_especulacion_desperdicio_segundos", desperdicio)
+
+
+class Especulacion(_Base):
+    """Recuperación especulativa en un hilo del pool, para el orquestador Flask."""
+
+    def __init__(self, clientes, message: str, plazo):
+        super().__init__()
+        self.clientes = clientes
+        self.futuro = _pool().submit(self._recuperar, message, plazo)
+
+    def _recuperar(self, message: str, plazo) -> list:
+        response = self.clientes.post(*RUTA_RAG_RETRIEVE, json={"message": message},
+                                      headers=plazo.headers(), timeout=plazo.timeout())
+        response.raise_for_status()
+        self.duracion = time.perf_counter() - self.inicio
+        return leer_respuesta(response)["contexto"]
+
+    def contexto(self):
+        """Espera la recuperación y retorna el contexto, o None si falló."""
+        esperado_desde = time.perf_counter()
+        try:
+            contexto = self.futuro.result()
+        except Exception as e:
+            self._registrar_error(e)
+            return None
+        self._registrar_acierto(esperado_desde)
+        return contexto
+
+    def descartar(self):
+        # Un hilo que ya envió la solicitud no se puede interrumpir: su trabajo queda desperdiciado
+        self._registrar_desperdicio(iniciada=not self.futuro.cancel())
+
+
+class EspeculacionAsync(_Base):
+    """Recuperación especulativa como tarea del event loop, para el orquestador asyncio."""
+
+    def __init__(self, clientes, message: str, plazo):
+        super().__init__()
+        self.clientes = clientes
+        self.tarea = asyncio.create_task(self._recuperar(message, plazo))
+
+    async def _recuperar(self, message: str, plazo) -> list:
+        response = await self.clientes.post(*RUTA_RAG_RETRIEVE, json={"message": message},
+                                            headers=plazo.headers(), timeout=plazo.timeout())
+        response.raise_for_status()
+        self.duracion = time.perf_counter() - self.inicio
+        return leer_respuesta(response)["contexto"]
+
+    async def contexto(self):
+        esperado_desde = time.perf_counter()
+        try:
+            contexto = await self.tarea
+        except Exception as e:
+            self._registrar_error(e)
+            return None
+        self._registrar_acierto(esperado_desde)
+        return contexto
+
+    def descartar(self):
+        # Cancelar la tarea cierra la conexión: el asistente deja de recibir la solicitud en vuelo
+        self.tarea.cancel()
+        self._registrar_desperdicio(iniciada=True)
@@ -0,0 +1,434 @@
+"""
+Clientes HTTP compartidos del orquestador hacia los asistentes.
+
+Un cliente por réplica de cada servicio downstream (cada réplica es un host), de modo que el
+límite de conexiones es por host: httpx.Client en or_app.py y aiohttp.ClientSession en
+or_app_async.py. La réplica de cada llamada la elige el registro (salud, balanceo y drenado,
+ver or_registro.py); cada réplica tiene un circuit breaker y con ORQ_HEDGING=1 las llamadas lentas
+se repiten en otra réplica (ver or_resiliencia.py). Las conexiones se reutilizan con keep-alive entre solicitudes
+y todas las llamadas tienen timeouts de conexión y de lectura. Una réplica en el mismo host puede
+configurarse como unix:///ruta.sock para evitar el loopback TCP (asistente con UNIX_SOCKET).
+Los cuerpos pueden viajar en MessagePack (ver or_codec.py). stream() abre la respuesta sin leer
+el cuerpo, para retransmitir los eventos de un asistente a medida que llegan (ver or_sse.py).
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeout, wait
+import aiohttp
+import httpx
+from multidict import CIMultiDict
+
+from or_metrics import metricas
+from or_resiliencia import ORQ_HEDGING, retardo_hedge
+from or_codec import preparar_solicitud, decodificar
+from or_plazo import STATUS_PLAZO_VENCIDO
+from or_registro import Registro, ORQ_HEALTH_INTERVALO_S, ORQ_HEALTH_TIMEOUT_S
+
+logger = logging.getLogger(__name__)
+
+ORQ_HTTP_CONNECT_TIMEOUT = float(os.getenv("ORQ_HTTP_CONNECT_TIMEOUT", "2"))
+ORQ_HTTP_READ_TIMEOUT = float(os.getenv("ORQ_HTTP_READ_TIMEOUT", "60"))
+ORQ_HTTP_MAX_CONEXIONES = int(os.getenv("ORQ_HTTP_MAX_CONEXIONES", "100"))
+ORQ_HTTP_KEEPALIVE = int(os.getenv("ORQ_HTTP_KEEPALIVE", "20"))
+# Subidas de archivos: se reenvían en bloques de tamaño fijo, sin almacenarlas en el orquestador
+ORQ_UPLOAD_BLOQUE = int(os.getenv("ORQ_UPLOAD_BLOQUE", str(64 * 1024)))
+ORQ_UPLOAD_MAX_BYTES = int(os.getenv("ORQ_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# HTTP/2 requiere el paquete opcional `h2` (pip install httpx[http2])
+ORQ_HTTP2 = os.getenv("ORQ_HTTP2", "0") == "1"
+# Réplica en el mismo host escuchando en un socket Unix: unix:///ruta/al/asistente.sock
+PREFIJO_UNIX = "unix://"
+# Por el socket Unix la URL base solo aporta el header Host
+BASE_URL_UNIX = "http://localhost"
+
+
+# Timeouts de ClientesHTTP (httpx) y de ClientesHTTPAsync (aiohttp)
+ERRORES_TIMEOUT = (httpx.TimeoutException, asyncio.TimeoutError)
+# Timeouts de conexión: la réplica no aceptó la conexión, aunque la llamada llevara el plazo del cliente
+ERRORES_CONEXION = (httpx.ConnectTimeout, aiohttp.ConnectionTimeoutError)
+
+
+class UploadDemasiadoGrande(Exception):
+    pass
+
+
+class ErrorRespuesta(Exception):
+
+    def __init__(self, respuesta):
+        super().__init__(f"El asistente respondió {respuesta.status_code} ({respuesta.url})")
+        self.respuesta = respuesta
+
+
+class RespuestaHTTP:
+    """Respuesta de ClientesHTTPAsync.post con el cuerpo ya leído: lo que usa el orquestador de httpx.Response."""
+
+    def __init__(self, status_code: int, headers, content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = CIMultiDict(headers)
+        self.content = content
+        self.url = url
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ErrorRespuesta(self)
+
+
+def leer_en_bloques(stream, maximo: int = ORQ_UPLOAD_MAX_BYTES, bloque: int = ORQ_UPLOAD_BLOQUE):
+    """
+    Genera el cuerpo de la solicitud en bloques de `bloque` bytes. Aborta con
+    UploadDemasiadoGrande en cuanto se supera `maximo`, aunque no haya Content-Length.
+    """
+    total = 0
+    while True:
+        datos = stream.read(bloque)
+        if not datos:
+            return
+        total += len(datos)
+        if total > maximo:
+            raise UploadDemasiadoGrande(f"El archivo supera el máximo de {maximo} bytes")
+        yield datos
+
+
+async def aleer_en_bloques(stream, maximo: int = ORQ_UPLOAD_MAX_BYTES, bloque: int = ORQ_UPLOAD_BLOQUE):
+    """Variante asíncrona de leer_en_bloques para un aiohttp.StreamReader."""
+    total = 0
+    while True:
+        datos = await stream.read(bloque)
+        if not datos:
+            return
+        total += len(datos)
+        if total > maximo:
+            raise UploadDemasiadoGrande(f"El archivo supera el máximo de {maximo} bytes")
+        yield datos
+
+
+def _http2_disponible() -> bool:
+    if not ORQ_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.error("ORQ_HTTP2=1 pero el paquete 'h2' no está instalado; se usa HTTP/1.1.")
+        return False
+
+
+def _socket_unix(url: str):
+    """Ruta del socket de una réplica unix://..., o None si es una URL http(s)."""
+    return url[len(PREFIJO_UNIX):] if url.startswith(PREFIJO_UNIX) else None
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(ORQ_HTTP_READ_TIMEOUT, connect=ORQ_HTTP_CONNECT_TIMEOUT)
+
+
+def _limites() -> httpx.Limits:
+    return httpx.Limits(max_connections=ORQ_HTTP_MAX_CONEXIONES, max_keepalive_connections=ORQ_HTTP_KEEPALIVE)
+
+
+class _ClientesReplicados:
+    """
+    Réplicas por servicio ({"rag": [url, ...], ...}; una url suelta equivale a una réplica),
+    cada una con su pool de conexiones y su circuit breaker. La elección de réplica, los
+    chequeos de salud y el drenado están en or_registro.py.
+    """
+
+    def __init__(self, servicios: dict, crear_cliente):
+        self.registro = Registro(servicios, crear_cliente)
+
+    def _hedging(self, servicio: str, kwargs: dict) -> bool:
+        # Un cuerpo en streaming (subida de PDF) no se puede enviar dos veces; uno en bytes sí
+        return (ORQ_HEDGING and len(self.registro.replicas[servicio]) > 1
+                and isinstance(kwargs.get("content", b""), bytes))
+
+    @staticmethod
+    def _exitosa(response) -> bool:
+        return response.status_code < 500
+
+    def _registrar(self, replica, inicio: float, response=None, error: Exception = None, con_plazo: bool = False):
+        """
+        Resultado de la llamada en el breaker de la réplica. Lo que causa el cliente no cuenta
+        (solo libera la sonda): el 504 plazo_vencido del asistente, el timeout del plazo del
+        cliente y UploadDemasiadoGrande al leer su subida. Así un cliente con un X-Deadline-Ms
+        mínimo o un PDF demasiado grande no abre el circuito para todos.
+        """
+        if error is not None:
+            del_cliente = _error_del_cliente(error, con_plazo)
+        else:
+            del_cliente = _plazo_vencido(response)
+        if del_cliente:
+            replica.breaker.liberar_sonda()
+        else:
+            replica.breaker.registrar(error is None and self._exitosa(response), time.perf_counter() - inicio)
+
+
+def _plazo_vencido(response) -> bool:
+    """504 plazo_vencido del asistente: se agotó el plazo del cliente, la réplica respondió bien."""
+    if response.status_code != STATUS_PLAZO_VENCIDO:
+        return False
+    datos = decodificar(response.content, response.headers.get("Content-Type", ""))
+    return isinstance(datos, dict) and datos.get("codigo") == "plazo_vencido"
+
+
+def _error_del_cliente(e: Exception, con_plazo: bool) -> bool:
+    if isinstance(e, UploadDemasiadoGrande):
+        return True
+    # Con el plazo del cliente como timeout, vencerlo no dice nada de la réplica; no conectar, sí
+    return con_plazo and isinstance(e, ERRORES_TIMEOUT) and not isinstance(e, ERRORES_CONEXION)
+
+
+class ClientesHTTP(_ClientesReplicados):
+    """Clientes httpx por réplica para el orquestador Flask."""
+
+    def __init__(self, servicios: dict):
+        http2 = _http2_disponible()
+
+        def crear_cliente(url: str) -> httpx.Client:
+            socket_unix = _socket_unix(url)
+            if socket_unix:
+                transporte = httpx.HTTPTransport(uds=socket_unix, limits=_limites(), http2=http2)
+                return httpx.Client(base_url=BASE_URL_UNIX, timeout=_timeout(), transport=transporte)
+            return httpx.Client(base_url=url, timeout=_timeout(), limits=_limites(), http2=http2)
+
+        super().__init__(servicios, crear_cliente)
+        # Se crea aquí y no en la primera llamada: el cliente lo comparten todos los hilos de Flask
+        self._hedges = (ThreadPoolExecutor(max_workers=ORQ_HTTP_MAX_CONEXIONES, thread_name_prefix="hedge")
+                        if ORQ_HEDGING else None)
+        if ORQ_HEALTH_INTERVALO_S > 0:
+            threading.Thread(target=self._vigilar, name="health", daemon=True).start()
+
+    def _vigilar(self):
+        while True:
+            for replica in self.registro.todas():
+                try:
+                    ok = replica.cliente.get("/health", timeout=ORQ_HEALTH_TIMEOUT_S).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                except Exception:
+                    # Cualquier otro error no debe detener el hilo de chequeos: la réplica cuenta como caída
+                    logger.exception("Error inesperado en el chequeo de salud de %s", replica.url)
+                    ok = False
+                replica.registrar_salud(ok)
+            time.sleep(ORQ_HEALTH_INTERVALO_S)
+
+    def _llamar(self, replica, path: str, kwargs: dict) -> httpx.Response:
+        inicio = time.perf_counter()
+        replica.iniciar()
+        try:
+            response = replica.cliente.post(path, **kwargs)
+        except Exception as e:
+            self._registrar(replica, inicio, error=e, con_plazo="timeout" in kwargs)
+            raise
+        finally:
+            replica.terminar()
+        self._registrar(replica, inicio, response)
+        return response
+
+    def post(self, servicio: str, path: str, **kwargs) -> httpx.Response:
+        kwargs = preparar_solicitud(kwargs)
+        primera = self.registro.primera(servicio)
+        if not self._hedging(servicio, kwargs):
+            return self._llamar(primera, path, kwargs)
+
+        futuro = self._hedges.submit(self._llamar, primera, path, kwargs)
+        try:
+            return futuro.result(timeout=retardo_hedge(primera.breaker))
+        except FuturesTimeout:
+            pass
+        segunda = self.registro.elegir(servicio, excluir=primera)
+        if segunda is None:
+            return futuro.result()
+        metricas.incrementar("orquestador_hedge_total", servicio=servicio, resultado="enviado")
+        hedge = self._hedges.submit(self._llamar, segunda, path, kwargs)
+        # La primera respuesta exitosa gana; el intento perdedor termina en segundo plano
+        pendientes = {futuro, hedge}
+        while pendientes:
+            hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for f in hechos:
+                if f.exception() is None and self._exitosa(f.result()):
+                    if f is hedge:
+                        metricas.incrementar("orquestador_hedge_total", servicio=servicio, resultado="ganado")
+                    return f.result()
+        return futuro.result()
+
+    @contextmanager
+    def stream(self, servicio: str, path: str, **kwargs):
+        """
+        Como post, pero el cuerpo de la respuesta se lee a medida que llega (iter_raw) y el
+        timeout aplica entre un trozo y el siguiente. Sin hedging: una respuesta ya empezada no
+        se repite en otra réplica. El circuito registra el status al recibir los headers; la
+        llamada cuenta como en vuelo en la réplica hasta salir del bloque.
+        """
+        kwargs = preparar_solicitud(kwargs)
+        replica = self.registro.primera(servicio)
+        inicio = time.perf_counter()
+        replica.iniciar()
+        try:
+            try:
+                response = replica.cliente.send(replica.cliente.build_request("POST", path, **kwargs), stream=True)
+            except Exception as e:
+                self._registrar(replica, inicio, error=e, con_plazo="timeout" in kwargs)
+                raise
+            if response.status_code == STATUS_PLAZO_VENCIDO:
+                response.read()  # cuerpo corto de error; relevo lo reutiliza
+            self._registrar(replica, inicio, response)
+            try:
+                yield response
+            finally:
+                response.close()
+        finally:
+            replica.terminar()
+
+    def cerrar(self):
+        for replica in self.registro.todas():
+            replica.cliente.close()
+        if self._hedges is not None:
+            self._hedges.shutdown(wait=False)
+
+
+def _sin_envoltura(e: Exception) -> Exception:
+    # aiohttp envuelve en ClientConnectionError los errores del generador del cuerpo (la subida)
+    if isinstance(e, aiohttp.ClientConnectionError) and isinstance(e.__cause__, UploadDemasiadoGrande):
+        return e.__cause__
+    return e
+
+
+class ClientesHTTPAsync(_ClientesReplicados):
+    """
+    Equivalente de ClientesHTTP para el orquestador asyncio, con una aiohttp.ClientSession por
+    réplica (bajo carga alta rinde bastante mejor que httpx.AsyncClient). Acepta los mismos
+    argumentos que ClientesHTTP.post (`timeout` en segundos) y retorna una RespuestaHTTP con
+    el cuerpo ya leído. En el hedging, el intento perdedor se cancela.
+    """
+
+    def __init__(self, servicios: dict):
+        timeout = aiohttp.ClientTimeout(sock_connect=ORQ_HTTP_CONNECT_TIMEOUT, sock_read=ORQ_HTTP_READ_TIMEOUT)
+
+        def crear_cliente(url: str) -> aiohttp.ClientSession:
+            socket_unix = _socket_unix(url)
+            if socket_unix:
+                conector = aiohttp.UnixConnector(path=socket_unix, limit=ORQ_HTTP_MAX_CONEXIONES, keepalive_timeout=30)
+                return aiohttp.ClientSession(base_url=BASE_URL_UNIX, timeout=timeout, connector=conector)
+            conector = aiohttp.TCPConnector(limit=ORQ_HTTP_MAX_CONEXIONES, keepalive_timeout=30)
+            return aiohttp.ClientSession(base_url=url, timeout=timeout, connector=conector)
+
+        super().__init__(servicios, crear_cliente)
+
+        self._vigilancia = None
+
+    def iniciar_vigilancia(self):
+        """Arranca los chequeos de salud; requiere un event loop en marcha (on_startup)."""
+        if ORQ_HEALTH_INTERVALO_S > 0:
+            self._vigilancia = asyncio.create_task(self._vigilar())
+
+    async def _salud(self, replica) -> bool:
+        try:
+            async with replica.cliente.get("/health", timeout=aiohttp.ClientTimeout(total=ORQ_HEALTH_TIMEOUT_S)) as r:
+                return r.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        except Exception:
+            # Un error inesperado no debe cortar el gather ni la tarea de chequeos
+            logger.exception("Error inesperado en el chequeo de salud de %s", replica.url)
+            return False
+
+    async def _vigilar(self):
+        while True:
+            replicas = self.registro.todas()
+            for replica, ok in zip(replicas, await asyncio.gather(*(self._salud(r) for r in replicas))):
+                replica.registrar_salud(ok)
+            await asyncio.sleep(ORQ_HEALTH_INTERVALO_S)
+
+    async def _llamar(self, replica, path: str, content=None, timeout: float = None, **kwargs) -> RespuestaHTTP:
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=ORQ_HTTP_CONNECT_TIMEOUT)
+        inicio = time.perf_counter()
+        replica.iniciar()
+        try:
+            async with replica.cliente.post(path, data=content, **kwargs) as response:
+                cuerpo = await response.read()
+                resultado = RespuestaHTTP(response.status, response.headers, cuerpo, str(response.url))
+        except asyncio.CancelledError:
+            replica.breaker.liberar_sonda()
+            raise
+        except Exception as e:
+            e = _sin_envoltura(e)
+            self._registrar(replica, inicio, error=e, con_plazo=timeout is not None)
+            raise e
+        finally:
+            replica.terminar()
+        self._registrar(replica, inicio, resultado)
+        return resultado
+
+    async def post(self, servicio: str, path: str, **kwargs) -> RespuestaHTTP:
+        kwargs = preparar_solicitud(kwargs)
+        primera = self.registro.primera(servicio)
+        if not self._hedging(servicio, kwargs):
+            return await self._llamar(primera, path, **kwargs)
+
+        tarea = asyncio.create_task(self._llamar(primera, path, **kwargs))
+        hechos, _ = await asyncio.wait({tarea}, timeout=retardo_hedge(primera.breaker))
+        segunda = None if hechos else self.registro.elegir(servicio, excluir=primera)
+        if segunda is None:
+            return await tarea
+        metricas.incrementar("orquestador_hedge_total", servicio=servicio, resultado="enviado")
+        hedge = asyncio.create_task(self._llamar(segunda, path, **kwargs))
+        pendientes = {tarea, hedge}
+        try:
+            while pendientes:
+                hechos, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for t in hechos:
+                    if t.exception() is None and self._exitosa(t.result()):
+                        if t is hedge:
+                            metricas.incrementar("orquestador_hedge_total", servicio=servicio, resultado="ganado")
+                        return t.result()
+            return tarea.result()
+        finally:
+            for t in pendientes:
+                t.cancel()
+
+    @asynccontextmanager
+    async def stream(self, servicio: str, path: str, timeout: float = None, **kwargs):
+        """
+        Como ClientesHTTP.stream; entrega el aiohttp.ClientResponse sin leer el cuerpo. `timeout`
+        acota el relevo completo (headers y todos los trozos), no la espera entre un trozo y el
+        siguiente: un flujo que gotea no pasa del plazo.
+        """
+        kwargs = preparar_solicitud(kwargs)
+        content = kwargs.pop("content", None)
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=ORQ_HTTP_CONNECT_TIMEOUT)
+        replica = self.registro.primera(servicio)
+        inicio = time.perf_counter()
+        replica.iniciar()
+        try:
+            try:
+                response = await replica.cliente.post(path, data=content, **kwargs)
+            except asyncio.CancelledError:
+                replica.breaker.liberar_sonda()
+                raise
+            except Exception as e:
+                e = _sin_envoltura(e)
+                self._registrar(replica, inicio, error=e, con_plazo=timeout is not None)
+                raise e
+            cuerpo = await response.read() if response.status == STATUS_PLAZO_VENCIDO else b""
+            self._registrar(replica, inicio, RespuestaHTTP(response.status, response.headers, cuerpo, str(response.url)))
+            try:
+                yield response
+            finally:
+                response.release()
+        finally:
+            replica.terminar()
+
+    async def cerrar(self):
+        if self._vigilancia is not None:
+            self._vigilancia.cancel()
+        for replica in self.registro.todas():
+            await replica.cliente.close()
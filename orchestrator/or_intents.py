@@ -0,0 +1,131 @@
+"""
+Clasificación local de intenciones, previa a la llamada al LLM.
+
+Cascada:
+  1. Modelo local TF-IDF + centroide más cercano, entrenado con intents_ejemplos.json.
+  2. Reglas (palabras clave / regex): solo refuerzan al modelo. Una coincidencia por sí sola vale
+     CLASIFICADOR_CONFIANZA_REGLA (por debajo del umbral); si el modelo predice la misma intención,
+     las dos confianzas se combinan. Si la regla y el modelo no coinciden, decide el LLM.
+  3. Si la confianza resultante es menor que CLASIFICADOR_UMBRAL, decide el LLM (or_clasificador.clasificador_llm).
+"""
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+INTENCIONES = ("rag", "pdf", "shopping", "irrazonable")
+
+EJEMPLOS_PATH = os.getenv(
+    "CLASIFICADOR_EJEMPLOS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents_ejemplos.json")
+)
+CLASIFICADOR_UMBRAL = float(os.getenv("CLASIFICADOR_UMBRAL", "0.7"))
+# Confianza de una regla sin el respaldo del modelo; debe quedar por debajo de CLASIFICADOR_UMBRAL
+CLASIFICADOR_CONFIANZA_REGLA = float(os.getenv("CLASIFICADOR_CONFIANZA_REGLA", "0.5"))
+# Temperatura del softmax sobre las similitudes coseno (más baja = confianza más marcada)
+TEMPERATURA = 0.1
+
+
+def normalizar_mensaje(message: str) -> str:
+    """Minúsculas, sin tildes, sin puntuación y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", message.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+# Pedidos de daño explícitos (armas, explosivos, drogas, delitos). Solo el pedido, no el tema:
+# "¿qué es el lavado de dinero?" o "bomba de agua" no coinciden.
+PATRON_IRRAZONABLE = re.compile(
+    r"\b((fabricar|hacer|armar|construir|conseguir|comprar) (un |una |unos |unas )?"
+    r"(armas?|bombas?|explosivos?|drogas?)|armas? de fuego|bombas? (casera|caseras|molotov)|"
+    r"(vender|traficar) drogas?|hackear|lavar dinero)\b"
+)
+
+# Reglas sobre el mensaje normalizado. Si coinciden reglas de intenciones distintas, el mensaje
+# es ambiguo y no aportan nada. "pdf" exige un documento: "mis gastos" solo también es una
+# pregunta de educación financiera.
+REGLAS = [
+    ("irrazonable", PATRON_IRRAZONABLE),
+    ("pdf", re.compile(r"\b(pdf|(mi|este|el|del|adjunto|adjunta) (estado de cuenta|extracto( bancario)?|archivo|documento))\b")),
+    ("shopping", re.compile(r"\b(comprar|compro|cotiza(r|me)?|ofertas? de|busca(r|me)? (un |una |unos |unas )?(\w+ ){1,3}(barat[oa]s?|economic[oa]s?))\b")),
+    ("rag", re.compile(r"^(que|como|cual|cuales|por que|para que)\b.*\b(ahorro|credito|interes|inversion|presupuesto|deudas?|endeudamiento|bienestar financiero|educacion financiera|cooperativas?)\b")),
+]
+
+
+def clasificar_por_reglas(normalizado: str):
+    coincidencias = {intent for intent, patron in REGLAS if patron.search(normalizado)}
+    if len(coincidencias) == 1:
+        return coincidencias.pop()
+    return None
+
+
+def _tokens(normalizado: str) -> list:
+    palabras = [p for p in normalizado.split() if len(p) > 1]
+    return palabras + [f"{a}_{b}" for a, b in zip(palabras, palabras[1:])]
+
+
+class ClasificadorLocal:
+    """TF-IDF (unigramas + bigramas) con clasificación por centroide más cercano (coseno)."""
+
+    def __init__(self, ejemplos: dict):
+        documentos = [(intent, Counter(_tokens(normalizar_mensaje(texto))))
+                      for intent, textos in ejemplos.items() for texto in textos]
+        df = Counter(token for _, tf in documentos for token in tf)
+        n = len(documentos)
+        self.idf = {token: math.log((1 + n) / (1 + freq)) + 1 for token, freq in df.items()}
+
+        sumas = defaultdict(lambda: defaultdict(float))
+        for intent, tf in documentos:
+            for token, peso in self._vector(tf).items():
+                sumas[intent][token] += peso
+        self.centroides = {intent: self._normalizar(dict(vector)) for intent, vector in sumas.items()}
+
+    @staticmethod
+    def _normalizar(vector: dict) -> dict:
+        norma = math.sqrt(sum(v * v for v in vector.values()))
+        return {k: v / norma for k, v in vector.items()} if norma else vector
+
+    def _vector(self, tf: Counter) -> dict:
+        return self._normalizar({t: f * self.idf[t] for t, f in tf.items() if t in self.idf})
+
+    def predecir(self, normalizado: str) -> tuple:
+        """Retorna (intención, confianza) con confianza = probabilidad softmax de la mejor clase."""
+        vector = self._vector(Counter(_tokens(normalizado)))
+        similitudes = {
+            intent: sum(peso * centroide.get(token, 0.0) for token, peso in vector.items())
+            for intent, centroide in self.centroides.items()
+        }
+        exponentes = {intent: math.exp(sim / TEMPERATURA) for intent, sim in similitudes.items()}
+        total = sum(exponentes.values())
+        mejor = max(exponentes, key=exponentes.get)
+        return mejor, exponentes[mejor] / total
+
+    @classmethod
+    def desde_archivo(cls, path: str = EJEMPLOS_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["ejemplos"])
+
+
+clasificador_local = ClasificadorLocal.desde_archivo()
+
+
+def clasificar_local(message: str, umbral: float = CLASIFICADOR_UMBRAL) -> tuple:
+    """
+    Ejecuta las etapas locales de la cascada.
+    Retorna (intención, origen, confianza); intención es None si hay que consultar al LLM.
+    """
+    normalizado = normalizar_mensaje(message)
+    intent, confianza = clasificador_local.predecir(normalizado)
+    regla = clasificar_por_reglas(normalizado)
+    if regla is not None:
+        if regla != intent:
+            return None, "llm", min(confianza, CLASIFICADOR_CONFIANZA_REGLA)
+        # Evidencias independientes: la regla reduce la duda que le queda al modelo
+        confianza = 1 - (1 - confianza) * (1 - CLASIFICADOR_CONFIANZA_REGLA)
+        if confianza >= umbral:
+            return intent, "regla", confianza
+    if confianza >= umbral:
+        return intent, "modelo", confianza
+    return None, "llm", confianza
@@ -0,0 +1,172 @@
+"""
+/orchestrate/batch: varias solicitudes de /orchestrate en una sola llamada.
+
+  1. Moderación (pre-filtro local por mensaje y, si está activo, el endpoint de OpenAI con
+     varios mensajes por llamada; ver or_moderacion.moderar_lote).
+  2. Clasificación por lotes (caché y modelo local por mensaje; los indecisos en una sola
+     llamada al LLM, ver or_clasificador.clasificador_lote).
+  3. Agrupación por intención: las preguntas RAG viajan a /assistant/rag/batch en trozos de
+     ORQ_LOTE_RAG_TAMANO; el resto se envía mensaje por mensaje al asistente que corresponda.
+     Como máximo ORQ_LOTE_PARALELISMO llamadas a asistentes en paralelo, cada una admitida con
+     prioridad de lote (ver or_admision.py); un trozo RAG ocupa un solo lugar.
+
+Todo el lote comparte un plazo (ver or_plazo.py; X-Deadline-Ms u ORQ_PLAZO_MS) que se propaga a
+cada llamada; un mensaje sin respuesta a tiempo queda con 504 plazo_vencido. Si el asistente
+responde un trozo RAG con menos respuestas que preguntas, las que faltan quedan con 502.
+
+Los resultados se retornan en el orden de entrada: {"intencion", "status", "cuerpo"}, con
+el status y el cuerpo JSON que habría respondido /orchestrate para ese mensaje.
+"""
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from or_metrics import metricas
+from or_codec import leer_respuesta
+from or_clasificador import clasificador_lote, aclasificador_lote
+from or_moderacion import moderar_lote, amoderar_lote, rechazo, STATUS_RECHAZO
+from or_servicios import RUTAS, RUTA_RAG_LOTE
+from or_admision import LOTE
+from or_sse import respuesta_de_error
+
+ORQ_LOTE_MAX = int(os.getenv("ORQ_LOTE_MAX", "1000"))
+ORQ_LOTE_PARALELISMO = int(os.getenv("ORQ_LOTE_PARALELISMO", "8"))
+# Debe ser <= RAG_LOTE_MAX del asistente
+ORQ_LOTE_RAG_TAMANO = int(os.getenv("ORQ_LOTE_RAG_TAMANO", "32"))
+# Items del lote sin respuesta del asistente (respondió menos de las que se le enviaron)
+STATUS_RESPUESTA_INCOMPLETA = 502
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ORQ_LOTE_PARALELISMO, thread_name_prefix="lote")
+        return _executor
+
+
+def validar_lote(data):
+    """Retorna (mensajes, error) para el cuerpo {"messages": [...]} de /orchestrate/batch."""
+    messages = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, str) for m in messages):
+        return None, "Se espera 'messages': una lista no vacía de textos"
+    if len(messages) > ORQ_LOTE_MAX:
+        return None, f"El lote supera el máximo de {ORQ_LOTE_MAX} mensajes"
+    return messages, None
+
+
+def _item(intent: str, status: int, cuerpo: dict) -> dict:
+    metricas.incrementar("orquestador_lote_mensajes_total", intencion=intent)
+    return {"intencion": intent, "status": status, "cuerpo": cuerpo}
+
+
+def _moderados(messages: list, motivos: list) -> tuple:
+    """(resultados con los rechazos ya resueltos, índices de los mensajes que siguen)."""
+    resultados, pendientes = [None] * len(messages), []
+    for i, motivo in enumerate(motivos):
+        if motivo:
+            resultados[i] = _item("irrazonable", STATUS_RECHAZO, rechazo(motivo))
+        else:
+            pendientes.append(i)
+    return resultados, pendientes
+
+
+def _agrupar(indices: list, intents: list, resultados: list) -> tuple:
+    """
+    Resuelve en `resultados` los mensajes que no llegan a ningún asistente y retorna
+    (índices rag en trozos, [(índice, intención)] para enviar uno por uno).
+    """
+    rag, individuales = [], []
+    for i, intent in zip(indices, intents):
+        if intent == "irrazonable":
+            resultados[i] = _item(intent, STATUS_RECHAZO, rechazo("clasificador"))
+        elif intent == "pdf":
+            resultados[i] = _item(intent, 400, {"error": "Para análisis de PDF se requiere enviar el archivo en 'file'"})
+        elif intent in RUTAS and intent != "rag":
+            individuales.append((i, intent))
+        else:
+            rag.append(i)
+    trozos = [rag[j:j + ORQ_LOTE_RAG_TAMANO] for j in range(0, len(rag), ORQ_LOTE_RAG_TAMANO)]
+    return trozos, individuales
+
+
+def _resultados_rag(indices: list, resultados: list, status: int, cuerpo: dict):
+    if status == 200:
+        respuestas = cuerpo.get("respuestas") if isinstance(cuerpo, dict) else None
+        respuestas = respuestas if isinstance(respuestas, list) else []
+        for i, respuesta in zip(indices, respuestas):
+            resultados[i] = _item("rag", 200, {"respuesta": respuesta})
+        # Un asistente que devuelve menos respuestas que preguntas no deja items vacíos en el lote
+        for i in indices[len(respuestas):]:
+            resultados[i] = _item("rag", STATUS_RESPUESTA_INCOMPLETA, {
+                "error": f"El asistente respondió {len(respuestas)} de {len(indices)} preguntas del lote",
+                "codigo": "respuesta_incompleta",
+            })
+    else:
+        for i in indices:
+            resultados[i] = _item("rag", status, cuerpo)
+
+
+def procesar_lote(clientes, compuertas: dict, messages: list, plazo) -> list:
+    resultados, pendientes = _moderados(messages, moderar_lote(messages))
+    intents = clasificador_lote([messages[i] for i in pendientes])
+    trozos, individuales = _agrupar(pendientes, intents, resultados)
+
+    def enviar_rag(indices):
+        try:
+            with compuertas["rag"].admitir(LOTE, plazo):
+                response = clientes.post(*RUTA_RAG_LOTE, json={"messages": [messages[i] for i in indices]},
+                                         headers=plazo.headers(), timeout=plazo.timeout())
+            _resultados_rag(indices, resultados, response.status_code, leer_respuesta(response))
+        except Exception as e:
+            _resultados_rag(indices, resultados, *respuesta_de_error(e))
+
+    def enviar(i, intent):
+        try:
+            with compuertas[intent].admitir(LOTE, plazo):
+                response = clientes.post(*RUTAS[intent], json={"message": messages[i]},
+                                         headers=plazo.headers(), timeout=plazo.timeout())
+            resultados[i] = _item(intent, response.status_code, leer_respuesta(response))
+        except Exception as e:
+            resultados[i] = _item(intent, *respuesta_de_error(e))
+
+    futuros = [_pool().submit(enviar_rag, indices) for indices in trozos]
+    futuros += [_pool().submit(enviar, i, intent) for i, intent in individuales]
+    wait(futuros)
+    return resultados
+
+
+async def aprocesar_lote(clientes, compuertas: dict, messages: list, plazo) -> list:
+    """Variante asíncrona de procesar_lote: el paralelismo se acota con un semáforo por lote."""
+    resultados, pendientes = _moderados(messages, await amoderar_lote(messages))
+    intents = await aclasificador_lote([messages[i] for i in pendientes])
+    trozos, individuales = _agrupar(pendientes, intents, resultados)
+    limite = asyncio.Semaphore(ORQ_LOTE_PARALELISMO)
+
+    async def enviar_rag(indices):
+        async with limite:
+            try:
+                async with compuertas["rag"].admitir(LOTE, plazo):
+                    response = await clientes.post(*RUTA_RAG_LOTE, json={"messages": [messages[i] for i in indices]},
+                                                   headers=plazo.headers(), timeout=plazo.timeout())
+                _resultados_rag(indices, resultados, response.status_code, leer_respuesta(response))
+            except Exception as e:
+                _resultados_rag(indices, resultados, *respuesta_de_error(e))
+
+    async def enviar(i, intent):
+        async with limite:
+            try:
+                async with compuertas[intent].admitir(LOTE, plazo):
+                    response = await clientes.post(*RUTAS[intent], json={"message": messages[i]},
+                                                   headers=plazo.headers(), timeout=plazo.timeout())
+                resultados[i] = _item(intent, response.status_code, leer_respuesta(response))
+            except Exception as e:
+                resultados[i] = _item(intent, *respuesta_de_error(e))
+
+    await asyncio.gather(*(enviar_rag(indices) for indices in trozos),
+                         *(enviar(i, intent) for i, intent in individuales))
+    return resultados
@@ -0,0 +1,287 @@
+"""
+Memoria de conversación por sesión: el header X-Session-Id en /orchestrate, o la sesión de /ws.
+
+Los ids los emite el orquestador (POST /sesiones, o el evento "sesion" de /ws) y son
+imposibles de adivinar; un X-Session-Id que no emitió, o que ya expiró, se rechaza con 400
+(codigo "sesion_desconocida") en lugar de crear una sesión con ese id. Si no, cualquiera que
+conociera o adivinara un id recibiría el historial de otro usuario en sus prompts.
+
+El orquestador guarda el historial y envía a los asistentes un contexto acotado en el campo
+"historial" del cuerpo: {"resumen": "...", "turnos": [{"pregunta", "respuesta"}, ...]}
+(ver assistant/ass_historial.py). Sin X-Session-Id todo sigue igual, sin historial.
+  - Los últimos ORQ_MEMORIA_TURNOS turnos van textuales.
+  - Los anteriores se integran a un resumen acumulado que se actualiza en segundo plano, con una
+    llamada al LLM que recibe el resumen previo y solo los turnos que salen (nunca todo el
+    historial). La respuesta al usuario no espera al resumen: hasta que termina, esos turnos
+    siguen viajando textuales.
+  - El contexto nunca supera ORQ_MEMORIA_MAX_TOKENS tokens, y el resumen ORQ_MEMORIA_RESUMEN_TOKENS.
+    Si no cabe, se descartan primero los turnos más viejos. El costo del prompt queda acotado
+    por larga que sea la conversación.
+  - Las sesiones inactivas por ORQ_MEMORIA_TTL_S se descartan (como máximo ORQ_MEMORIA_SESIONES_MAX,
+    en memoria del proceso).
+
+Métricas: orquestador_memoria_sesiones, orquestador_memoria_resumenes_total{resultado=ok|error}
+y orquestador_memoria_contexto_tokens (suma y conteo).
+"""
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from or_metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+HEADER_SESION = "X-Session-Id"
+STATUS_SESION_DESCONOCIDA = 400
+ORQ_MEMORIA_TURNOS = int(os.getenv("ORQ_MEMORIA_TURNOS", "4"))
+ORQ_MEMORIA_MAX_TOKENS = int(os.getenv("ORQ_MEMORIA_MAX_TOKENS", "1500"))
+ORQ_MEMORIA_RESUMEN_TOKENS = int(os.getenv("ORQ_MEMORIA_RESUMEN_TOKENS", "300"))
+ORQ_MEMORIA_TTL_S = float(os.getenv("ORQ_MEMORIA_TTL_S", "1800"))
+ORQ_MEMORIA_SESIONES_MAX = int(os.getenv("ORQ_MEMORIA_SESIONES_MAX", "10000"))
+ORQ_MEMORIA_MODELO = os.getenv("ORQ_MEMORIA_MODELO", "gpt-4o-mini")
+ORQ_MEMORIA_TIMEOUT_S = float(os.getenv("ORQ_MEMORIA_TIMEOUT_S", "20"))
+# Hilos para los resúmenes en segundo plano (sirven igual al orquestador Flask y al asyncio)
+ORQ_MEMORIA_HILOS = int(os.getenv("ORQ_MEMORIA_HILOS", "4"))
+
+PROMPT_RESUMEN = (
+    "Actualiza el resumen de una conversación entre un usuario y un asistente financiero. "
+    "Integra los nuevos turnos al resumen actual conservando los datos que el usuario dio "
+    "(montos, productos, preferencias, preguntas pendientes) y omitiendo cortesías. "
+    "Responde solo con el resumen actualizado, en español y en no más de {palabras} palabras."
+)
+
+
+class _Tokens:
+    """
+    Conteo de tokens con tiktoken (cl100k_base, el de gpt-3.5/gpt-4). Si no está instalado o no
+    puede descargar el vocabulario, se estima en 4 caracteres por token.
+    """
+
+    def __init__(self):
+        self._codificador = None
+        self._cargado = False
+
+    def _cargar(self):
+        if not self._cargado:
+            try:
+                import tiktoken
+                self._codificador = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning("Sin tiktoken (%s); los tokens de la memoria se estiman por caracteres.", e)
+            self._cargado = True
+        return self._codificador
+
+    def contar(self, texto: str) -> int:
+        codificador = self._cargar()
+        if codificador is None:
+            return (len(texto) + 3) // 4
+        return len(codificador.encode(texto))
+
+    def recortar(self, texto: str, maximo: int) -> str:
+        """Los primeros `maximo` tokens de `texto`."""
+        if self.contar(texto) <= maximo:
+            return texto
+        codificador = self._cargar()
+        if codificador is None:
+            return texto[:maximo * 4]
+        return codificador.decode(codificador.encode(texto)[:maximo])
+
+
+tokens = _Tokens()
+_resumidores = ThreadPoolExecutor(max_workers=ORQ_MEMORIA_HILOS, thread_name_prefix="memoria")
+
+
+def _tokens_turno(turno: dict) -> int:
+    return tokens.contar(turno["pregunta"]) + tokens.contar(turno["respuesta"])
+
+
+def texto_respuesta(cuerpo) -> str:
+    """Texto de la respuesta de un asistente para el historial (la de RAG, o el cuerpo en JSON)."""
+    respuesta = cuerpo.get("respuesta") if isinstance(cuerpo, dict) else None
+    if isinstance(respuesta, dict) and isinstance(respuesta.get("result"), str):
+        return respuesta["result"]
+    if isinstance(respuesta, str):
+        return respuesta
+    return json.dumps(cuerpo, ensure_ascii=False)
+
+
+def resumir(resumen: str, turnos: list) -> str:
+    """Resumen previo + turnos nuevos -> resumen actualizado (una llamada al LLM)."""
+    nuevos = "\n".join(f"Usuario: {t['pregunta']}\nAsistente: {t['respuesta']}" for t in turnos)
+    response = openai.ChatCompletion.create(
+        model=ORQ_MEMORIA_MODELO,
+        messages=[
+            {"role": "system", "content": PROMPT_RESUMEN.format(palabras=ORQ_MEMORIA_RESUMEN_TOKENS * 3 // 4)},
+            {"role": "user", "content": f"Resumen actual:\n{resumen or '(vacío)'}\n\nNuevos turnos:\n{nuevos}"},
+        ],
+        max_tokens=ORQ_MEMORIA_RESUMEN_TOKENS,
+        temperature=0.0,
+        request_timeout=ORQ_MEMORIA_TIMEOUT_S,
+    )
+    return response.choices[0].message["content"].strip()
+
+
+class Conversacion:
+
+    def __init__(self):
+        self.resumen = ""
+        self.turnos = deque()
+        # Turnos que salieron de `turnos` y esperan a integrarse al resumen
+        self.pendientes = []
+        self.ultimo_uso = time.monotonic()
+        self._resumiendo = False
+        self._lock = threading.Lock()
+
+    def contexto(self):
+        """Historial acotado a ORQ_MEMORIA_MAX_TOKENS, o None si la conversación recién empieza."""
+        with self._lock:
+            resumen = self.resumen
+            turnos = self.pendientes + list(self.turnos)
+        if not resumen and not turnos:
+            return None
+        resumen = tokens.recortar(resumen, min(ORQ_MEMORIA_RESUMEN_TOKENS, ORQ_MEMORIA_MAX_TOKENS))
+        disponibles = ORQ_MEMORIA_MAX_TOKENS - tokens.contar(resumen)
+        incluidos = []
+        # Del más reciente al más viejo, mientras quepan; el último siempre va, recortado si hace falta
+        for turno in reversed(turnos):
+            costo = _tokens_turno(turno)
+            if costo > disponibles:
+                if not incluidos and disponibles > 0:
+                    pregunta = tokens.recortar(turno["pregunta"], disponibles // 2)
+                    respuesta = tokens.recortar(turno["respuesta"], disponibles - tokens.contar(pregunta))
+                    incluidos.append({"pregunta": pregunta, "respuesta": respuesta})
+                    disponibles = 0
+                break
+            incluidos.append(turno)
+            disponibles -= costo
+        metricas.observar("orquestador_memoria_contexto_tokens", ORQ_MEMORIA_MAX_TOKENS - disponibles)
+        return {"resumen": resumen, "turnos": incluidos[::-1]}
+
+    def agregar(self, pregunta: str, respuesta: str):
+        """Registra un turno; los que exceden ORQ_MEMORIA_TURNOS se resumen en segundo plano."""
+        turno = {"pregunta": tokens.recortar(pregunta, ORQ_MEMORIA_MAX_TOKENS),
+                 "respuesta": tokens.recortar(respuesta, ORQ_MEMORIA_MAX_TOKENS)}
+        with self._lock:
+            self.turnos.append(turno)
+            while len(self.turnos) > ORQ_MEMORIA_TURNOS:
+                self.pendientes.append(self.turnos.popleft())
+            if not self.pendientes or self._resumiendo:
+                return
+            # Si el último resumen falló, los pendientes no crecen sin límite: se pierden los más viejos
+            del self.pendientes[:-max(ORQ_MEMORIA_TURNOS, 1)]
+            self._resumiendo = True
+        _resumidores.submit(self._resumir)
+
+    def _resumir(self):
+        while True:
+            with self._lock:
+                lote, resumen = list(self.pendientes), self.resumen
+                if not lote:
+                    self._resumiendo = False
+                    return
+            try:
+                nuevo = resumir(resumen, lote)
+            except Exception as e:
+                metricas.incrementar("orquestador_memoria_resumenes_total", resultado="error")
+                logger.warning("No se pudo actualizar el resumen de la conversación: %s", e)
+                with self._lock:
+                    self._resumiendo = False  # se reintenta con el próximo turno
+                return
+            metricas.incrementar("orquestador_memoria_resumenes_total", resultado="ok")
+            with self._lock:
+                self.resumen = tokens.recortar(nuevo, ORQ_MEMORIA_RESUMEN_TOKENS)
+                # Los turnos que llegaron mientras tanto quedan para la próxima vuelta
+                self.pendientes = [t for t in self.pendientes if not any(t is r for r in lote)]
+
+
+class SesionDesconocida(Exception):
+    codigo = "sesion_desconocida"
+
+    def __init__(self):
+        super().__init__("La sesión no existe o expiró; crea una nueva con POST /sesiones")
+
+
+def respuesta_sesion_desconocida(e: SesionDesconocida) -> dict:
+    return {"error": str(e), "codigo": e.codigo}
+
+
+def con_historial(data: dict, conversacion, consulta: str = None) -> dict:
+    """
+    El cuerpo para el asistente, con el "historial" de la conversación si hay. Un "historial"
+    que ya venga en `data` se descarta siempre: solo lo puede agregar el orquestador.
+    `consulta`: el mensaje completo, cuando data["message"] es solo una parte (ver or_descomposicion.py).
+    """
+    data = {campo: valor for campo, valor in data.items() if campo != "historial"}
+    historial = conversacion.contexto() if conversacion is not None else None
+    if consulta:
+        historial = {**(historial or {"resumen": "", "turnos": []}), "consulta": consulta}
+    return {**data, "historial": historial} if historial else data
+
+
+class Memoria:
+    """Conversaciones por id de sesión, las usadas más recientemente al final."""
+
+    def __init__(self):
+        self._conversaciones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _podar(self, ahora: float, lugar: int = 0):
+        while self._conversaciones:
+            primera = next(iter(self._conversaciones.values()))
+            if ahora - primera.ultimo_uso < ORQ_MEMORIA_TTL_S and len(self._conversaciones) + lugar <= ORQ_MEMORIA_SESIONES_MAX:
+                break
+            self._conversaciones.popitem(last=False)
+
+    def crear(self, id_sesion: str = None) -> str:
+        """
+        Registra una conversación y retorna su id: uno nuevo y aleatorio, o `id_sesion` si ya lo
+        emitió el orquestador (el de una sesión de /ws). Si ya existe, la conserva.
+        """
+        id_sesion = id_sesion or secrets.token_urlsafe(32)
+        ahora = time.monotonic()
+        with self._lock:
+            if id_sesion not in self._conversaciones:
+                self._podar(ahora, lugar=1)
+                self._conversaciones[id_sesion] = Conversacion()
+            self._conversaciones.move_to_end(id_sesion)
+            self._conversaciones[id_sesion].ultimo_uso = ahora
+        return id_sesion
+
+    def obtener(self, id_sesion: str):
+        """La conversación `id_sesion` si existe y no expiró; None si no."""
+        ahora = time.monotonic()
+        with self._lock:
+            self._podar(ahora)
+            conversacion = self._conversaciones.get(id_sesion)
+            if conversacion is not None:
+                self._conversaciones.move_to_end(id_sesion)
+                conversacion.ultimo_uso = ahora
+            return conversacion
+
+    def de_headers(self, headers):
+        """
+        La conversación del header X-Session-Id, o None si la solicitud no lo trae.
+        SesionDesconocida si el id no lo emitió el orquestador o ya expiró.
+        """
+        id_sesion = headers.get(HEADER_SESION)
+        if not id_sesion:
+            return None
+        conversacion = self.obtener(id_sesion)
+        if conversacion is None:
+            raise SesionDesconocida()
+        return conversacion
+
+    def __len__(self):
+        return len(self._conversaciones)
+
+
+memoria = Memoria()
+
+metricas.registrar_calculada("orquestador_memoria_sesiones", lambda: len(memoria))
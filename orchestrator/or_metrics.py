@@ -0,0 +1,67 @@
+"""
+Métricas del orquestador en formato de texto de Prometheus (GET /metrics).
+
+Registro mínimo y thread-safe: contadores, gauges, observaciones (suma + conteo) y
+gauges calculados en el momento de exportar.
+"""
+import threading
+from collections import defaultdict
+
+
+def _clave(nombre: str, etiquetas: dict) -> tuple:
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def _formatear(nombre: str, etiquetas: tuple, valor: float) -> str:
+    if etiquetas:
+        texto = ",".join(f'{k}="{v}"' for k, v in etiquetas)
+        return f"{nombre}{{{texto}}} {valor:g}"
+    return f"{nombre} {valor:g}"
+
+
+class Metricas:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = defaultdict(float)
+        self._gauges = {}
+        self._calculadas = {}
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        with self._lock:
+            self._contadores[_clave(nombre, etiquetas)] += valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        with self._lock:
+            self._gauges[_clave(nombre, etiquetas)] = valor
+
+    def observar(self, nombre: str, valor: float, **etiquetas):
+        """Acumula una observación (p. ej. latencia) como <nombre>_sum y <nombre>_count."""
+        with self._lock:
+            self._contadores[_clave(f"{nombre}_sum", etiquetas)] += valor
+            self._contadores[_clave(f"{nombre}_count", etiquetas)] += 1
+
+    def registrar_calculada(self, nombre: str, funcion):
+        """`funcion()` retorna un valor o una lista de (etiquetas: dict, valor) al exportar."""
+        self._calculadas[nombre] = funcion
+
+    def valor(self, nombre: str, **etiquetas) -> float:
+        with self._lock:
+            clave = _clave(nombre, etiquetas)
+            return self._contadores.get(clave, self._gauges.get(clave, 0))
+
+    def exportar(self) -> str:
+        with self._lock:
+            series = list(self._contadores.items()) + list(self._gauges.items())
+        for nombre, funcion in self._calculadas.items():
+            resultado = funcion()
+            if isinstance(resultado, list):
+                series.extend((_clave(nombre, etiquetas), valor) for etiquetas, valor in resultado)
+            else:
+                series.append((_clave(nombre, {}), resultado))
+        lineas = [_formatear(nombre, etiquetas, valor) for (nombre, etiquetas), valor in sorted(series)]
+        return "\n".join(lineas) + "\n"
+
+
+# Registro compartido por todo el proceso del orquestador
+metricas = Metricas()
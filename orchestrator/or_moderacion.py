@@ -0,0 +1,202 @@
+"""
+Moderación del orquestador: las solicitudes tóxicas o fuera de tema se rechazan sin llegar
+a ningún asistente.
+
+Pre-filtro, antes de clasificar:
+  1. Lista de bloqueo (regex sobre el mensaje normalizado): sub-milisegundo, sin red. Es
+     estrecha a propósito: solo pedidos inequívocos ("cómo fabrico una bomba", "ignora tus
+     instrucciones"); un tema sensible ("¿qué es el lavado de dinero?", "bomba de agua") sigue
+     al moderador de OpenAI o al clasificador, que lo ven en contexto.
+  2. Opcional (MODERACION_OPENAI=1): veredicto del endpoint de moderación de OpenAI,
+     cacheado por mensaje normalizado en una CacheTTL.
+Después, si el clasificador responde "irrazonable", también se rechaza.
+
+/orchestrate/batch modera con moderar_lote: el pre-filtro por mensaje y, para los que no están
+en la caché, una llamada al endpoint de OpenAI por cada MODERACION_LOTE mensajes distintos
+(en paralelo en la variante asíncrona).
+
+Los rechazos responden con HTTP 422 y se cuentan en orquestador_rechazos_total{motivo}.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import openai
+
+from or_intents import normalizar_mensaje
+from or_metrics import metricas
+from or_cache import CacheTTL
+
+logger = logging.getLogger(__name__)
+
+STATUS_RECHAZO = 422
+MODERACION_OPENAI = os.getenv("MODERACION_OPENAI", "0") == "1"
+MODERACION_TIMEOUT = float(os.getenv("MODERACION_TIMEOUT", "2"))
+# Mensajes por llamada al endpoint de moderación en moderar_lote
+MODERACION_LOTE = int(os.getenv("MODERACION_LOTE", "32"))
+
+# Lista de bloqueo (rechazo 422 directo): pedidos explícitos de daño e intentos de sobrescribir
+# las instrucciones del sistema. No usa or_intents.PATRON_IRRAZONABLE, que es una señal más amplia.
+LISTA_BLOQUEO = [
+    re.compile(r"\b(como|donde|ensename a|ayudame a) (fabrico|fabricar|hago|hacer|armo|armar|construyo|construir) "
+               r"(un |una )?(bomba|explosivo|artefacto explosivo)\b"),
+    re.compile(r"\bbombas? (casera|caseras|molotov)\b"),
+    re.compile(r"\b(como|donde|ayudame a) (lavo|lavar) (el )?dinero\b"),
+    re.compile(r"\b(ignora|olvida|omite) (todas )?(las |tus )?(instrucciones|reglas)( anteriores| previas)?\b"),
+]
+
+cache_moderacion = CacheTTL(
+    "moderacion",
+    tamano=int(os.getenv("MODERACION_CACHE_TAMANO", "10000")),
+    ttl=float(os.getenv("MODERACION_CACHE_TTL", "86400")),
+    path_disco=os.getenv("MODERACION_CACHE_DB", ""),
+)
+
+BLOQUEADO, PERMITIDO = "bloqueado", "permitido"
+
+
+def en_lista_bloqueo(normalizado: str) -> bool:
+    return any(patron.search(normalizado) for patron in LISTA_BLOQUEO)
+
+
+def veredicto_de_respuesta(response) -> str:
+    return BLOQUEADO if response["results"][0]["flagged"] else PERMITIDO
+
+
+def veredictos_de_respuesta(response, n: int) -> list:
+    """Veredicto de cada uno de los n textos de una llamada con varios; None si no coinciden."""
+    resultados = response["results"]
+    if len(resultados) != n:
+        return [None] * n
+    return [BLOQUEADO if r["flagged"] else PERMITIDO for r in resultados]
+
+
+def _prefiltro(message: str):
+    """Retorna (motivo | None, clave, veredicto | None); veredicto None = consultar a OpenAI."""
+    clave = normalizar_mensaje(message)
+    if en_lista_bloqueo(clave):
+        return "lista", clave, BLOQUEADO
+    if not MODERACION_OPENAI:
+        return None, clave, PERMITIDO
+    return None, clave, cache_moderacion.obtener(clave)
+
+
+def _rechazo_de(motivo, veredicto: str):
+    if motivo is None and veredicto == BLOQUEADO:
+        return "moderacion"
+    return motivo
+
+
+def _motivo(motivo, veredicto: str, inicio: float):
+    metricas.observar("orquestador_moderacion_segundos", time.perf_counter() - inicio)
+    return _rechazo_de(motivo, veredicto)
+
+
+def moderar(message: str):
+    """
+    Retorna el motivo del rechazo ("lista" o "moderacion") o None si el mensaje puede seguir.
+    Un error (o timeout) del endpoint de moderación no bloquea la solicitud: el clasificador aún puede
+    marcarla como "irrazonable".
+    """
+    inicio = time.perf_counter()
+    motivo, clave, veredicto = _prefiltro(message)
+    if veredicto is None:
+        try:
+            veredicto = veredicto_de_respuesta(openai.Moderation.create(input=message, request_timeout=MODERACION_TIMEOUT))
+            cache_moderacion.guardar(clave, veredicto)
+        except Exception as e:
+            logger.error("Error en la moderación de OpenAI: %s", e)
+            veredicto = PERMITIDO
+    return _motivo(motivo, veredicto, inicio)
+
+
+async def amoderar(message: str):
+    """Variante asíncrona de moderar para el orquestador asyncio."""
+    inicio = time.perf_counter()
+    motivo, clave, veredicto = _prefiltro(message)
+    if veredicto is None:
+        try:
+            veredicto = veredicto_de_respuesta(await openai.Moderation.acreate(input=message, request_timeout=MODERACION_TIMEOUT))
+            cache_moderacion.guardar(clave, veredicto)
+        except Exception as e:
+            logger.error("Error en la moderación de OpenAI: %s", e)
+            veredicto = PERMITIDO
+    return _motivo(motivo, veredicto, inicio)
+
+
+def _prefiltro_lote(messages: list):
+    """
+    Pre-filtro de cada mensaje. Retorna (motivos, pendientes), donde pendientes agrupa por
+    mensaje normalizado los que requieren a OpenAI: {clave: (mensaje, [índices])}.
+    """
+    motivos, pendientes = [None] * len(messages), {}
+    for i, message in enumerate(messages):
+        motivo, clave, veredicto = _prefiltro(message)
+        if veredicto is None:
+            pendientes.setdefault(clave, (message, []))[1].append(i)
+        else:
+            motivos[i] = _rechazo_de(motivo, veredicto)
+    return motivos, pendientes
+
+
+def _completar_lote(motivos: list, pendientes: dict, veredictos: list, inicio: float) -> list:
+    for (clave, (_, indices)), veredicto in zip(pendientes.items(), veredictos):
+        if veredicto is None:
+            veredicto = PERMITIDO  # como en moderar: un error no bloquea
+        else:
+            cache_moderacion.guardar(clave, veredicto)
+        for i in indices:
+            motivos[i] = _rechazo_de(None, veredicto)
+    metricas.observar("orquestador_moderacion_segundos", time.perf_counter() - inicio)
+    return motivos
+
+
+def _trozos(textos: list) -> list:
+    return [textos[i:i + MODERACION_LOTE] for i in range(0, len(textos), MODERACION_LOTE)]
+
+
+def _moderar_trozo(textos: list) -> list:
+    try:
+        response = openai.Moderation.create(input=textos, request_timeout=MODERACION_TIMEOUT)
+        return veredictos_de_respuesta(response, len(textos))
+    except Exception as e:
+        logger.error("Error en la moderación de OpenAI: %s", e)
+        return [None] * len(textos)
+
+
+async def _amoderar_trozo(textos: list) -> list:
+    try:
+        response = await openai.Moderation.acreate(input=textos, request_timeout=MODERACION_TIMEOUT)
+        return veredictos_de_respuesta(response, len(textos))
+    except Exception as e:
+        logger.error("Error en la moderación de OpenAI: %s", e)
+        return [None] * len(textos)
+
+
+def moderar_lote(messages: list) -> list:
+    """Motivo de rechazo (o None) de cada mensaje, en el mismo orden; ver la descripción del módulo."""
+    inicio = time.perf_counter()
+    motivos, pendientes = _prefiltro_lote(messages)
+    textos = [message for message, _ in pendientes.values()]
+    veredictos = [v for trozo in _trozos(textos) for v in _moderar_trozo(trozo)]
+    return _completar_lote(motivos, pendientes, veredictos, inicio)
+
+
+async def amoderar_lote(messages: list) -> list:
+    """Variante asíncrona de moderar_lote: las llamadas de cada trozo van en paralelo."""
+    inicio = time.perf_counter()
+    motivos, pendientes = _prefiltro_lote(messages)
+    textos = [message for message, _ in pendientes.values()]
+    trozos = await asyncio.gather(*(_amoderar_trozo(trozo) for trozo in _trozos(textos)))
+    return _completar_lote(motivos, pendientes, [v for trozo in trozos for v in trozo], inicio)
+
+
+def rechazo(motivo: str) -> dict:
+    """Registra el rechazo y retorna el cuerpo de la respuesta (se envía con STATUS_RECHAZO)."""
+    metricas.incrementar("orquestador_rechazos_total", motivo=motivo)
+    return {
+        "error": "La solicitud no se relaciona con los servicios del asistente o no está permitida.",
+        "intencion": "irrazonable",
+        "motivo": motivo,
+    }
@@ -0,0 +1,217 @@
+"""
+Modo monolito (ORQ_MODO=monolito): el orquestador importa los asistentes y llama a sus
+handlers en el mismo proceso, sin el salto HTTP a localhost (serializar el JSON, abrir el
+socket, parsear la solicitud y la respuesta). Para despliegues pequeños o rutas sensibles
+a la latencia; el modo por defecto (ORQ_MODO=http) sigue usando los microservicios.
+
+ClientesMonolito y ClientesMonolitoAsync tienen la misma interfaz post(servicio, path, ...)
+que ClientesHTTP/ClientesHTTPAsync, así que or_app.py, or_lote.py y or_especulacion.py no
+cambian. El cuerpo JSON se pasa como dict tal cual; una subida multipart se separa aquí
+(el asistente recibe el archivo ya extraído). El plazo viaja igual, en X-Deadline-Ms.
+stream() entrega los eventos de los asistentes que transmiten su respuesta (ver or_sse.py).
+
+No aplican réplicas, circuit breakers ni hedging: un fallo del asistente es un fallo del proceso.
+El orquestador necesita además las dependencias de assistant/requirements.txt.
+"""
+import io
+import os
+import sys
+import importlib
+import asyncio
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from werkzeug.formparser import parse_form_data
+
+from or_servicios import RUTAS, RUTA_PDF, RUTA_RAG_RETRIEVE, RUTA_RAG_LOTE
+
+ORQ_MODO = os.getenv("ORQ_MODO", "http")
+# Carpeta con los módulos de los asistentes (ass_app_*.py)
+ORQ_ASSISTANT_DIR = os.getenv("ORQ_ASSISTANT_DIR",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assistant"))
+# Hilos del orquestador asyncio para los handlers (bloqueantes) de los asistentes
+ORQ_MONOLITO_HILOS = int(os.getenv("ORQ_MONOLITO_HILOS", "32"))
+
+
+class ErrorAsistente(Exception):
+
+    def __init__(self, respuesta):
+        super().__init__(f"El asistente respondió {respuesta.status_code}: {respuesta.cuerpo}")
+        self.respuesta = respuesta
+
+
+class RespuestaLocal:
+    """Lo que usa el orquestador de una respuesta de httpx, sin serializar el cuerpo."""
+
+    def __init__(self, cuerpo: dict, status_code: int, flujo=None):
+        self.cuerpo = cuerpo
+        self.status_code = status_code
+        # Eventos SSE del asistente, si transmite la respuesta (ver stream)
+        self.flujo = flujo
+
+    def json(self) -> dict:
+        return self.cuerpo
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ErrorAsistente(self)
+
+
+def importar_asistente(nombre: str):
+    """Módulo de ORQ_ASSISTANT_DIR: los asistentes en modo monolito y lo que comparten con el orquestador."""
+    if ORQ_ASSISTANT_DIR not in sys.path:
+        sys.path.append(ORQ_ASSISTANT_DIR)
+    return importlib.import_module(nombre)
+
+
+def _separar_multipart(cuerpo: bytes, headers: dict) -> tuple:
+    """(archivo, question) de una subida multipart, como los lee la ruta /assistant/analyze-pdf."""
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": headers.get("Content-Type", ""),
+        "CONTENT_LENGTH": str(len(cuerpo)),
+        "wsgi.input": io.BytesIO(cuerpo),
+    }
+    _, form, files = parse_form_data(environ)
+    return files.get("file"), form.get("question")
+
+
+class _Asistentes:
+    """
+    Handlers de los asistentes por (servicio, path). Cada módulo se importa en la primera
+    solicitud de su ruta (la cadena RAG, además, en la primera pregunta; ver
+    ass_app_QA.obtener_cadena), así que no hace falta instalar lo que no se usa.
+    """
+
+    def __init__(self):
+        self._plazo = importar_asistente("ass_plazo").Plazo
+        self._handlers = {
+            RUTAS["rag"]: ("ass_app_QA", lambda m, data, plazo: m.responder_rag(data, plazo)),
+            RUTA_RAG_RETRIEVE: ("ass_app_QA", lambda m, data, plazo: m.recuperar_contexto(data, plazo)),
+            RUTA_RAG_LOTE: ("ass_app_QA", lambda m, data, plazo: m.responder_lote(data, plazo)),
+            RUTAS["shopping"]: ("ass_app_Shopping", lambda m, data, plazo: m.asesorar_compras(data, plazo)),
+            RUTA_PDF: ("ass_app_PDFAnalyzer", lambda m, data, plazo: m.analizar_estado_cuenta(*data, plazo)),
+        }
+        # Rutas que pueden transmitir la respuesta: con status 200 el cuerpo es un generador de eventos
+        self._flujos = {
+            RUTAS["rag"]: ("ass_app_QA", lambda m, data, plazo: m.transmitir_rag(data, plazo)),
+        }
+
+    def despachar(self, servicio: str, path: str, json=None, content: bytes = None, headers: dict = None,
+                  flujo: bool = False) -> RespuestaLocal:
+        if flujo and (servicio, path) in self._flujos:
+            modulo, handler = self._flujos[(servicio, path)]
+        elif (servicio, path) in self._handlers:
+            modulo, handler = self._handlers[(servicio, path)]
+        else:
+            return RespuestaLocal({"error": f"Ruta no disponible en modo monolito: {path}"}, 404)
+        headers = headers or {}
+        # El plazo de la solicitud lo aplican los propios handlers, igual que en modo HTTP
+        plazo = self._plazo.desde_headers(headers)
+        data = _separar_multipart(content, headers) if content is not None else json
+        cuerpo, status = handler(importar_asistente(modulo), data, plazo)
+        if flujo and status == 200 and (servicio, path) in self._flujos:
+            return RespuestaLocal(None, status, flujo=cuerpo)
+        return RespuestaLocal(cuerpo, status)
+
+
+class ClientesMonolito:
+    """Equivalente en proceso de ClientesHTTP, para el orquestador Flask."""
+
+    # Sin réplicas: /admin/replicas responde 404
+    registro = None
+
+    def __init__(self):
+        self._asistentes = _Asistentes()
+
+    def post(self, servicio: str, path: str, content=None, timeout: float = None, **kwargs) -> RespuestaLocal:
+        if content is not None:
+            content = b"".join(content)
+        return self._asistentes.despachar(servicio, path, content=content, **kwargs)
+
+    @contextmanager
+    def stream(self, servicio: str, path: str, timeout: float = None, **kwargs):
+        """Como post, pero si el asistente transmite, la respuesta trae el generador de eventos en `flujo`."""
+        response = self._asistentes.despachar(servicio, path, flujo=True, **kwargs)
+        try:
+            yield response
+        finally:
+            if response.flujo is not None:
+                response.flujo.close()
+
+    def cerrar(self):
+        pass
+
+
+class _FlujoEnPool:
+    """Iterador asíncrono sobre un generador de eventos bloqueante: cada next corre en el pool."""
+
+    _FIN = object()
+
+    def __init__(self, pool: ThreadPoolExecutor, eventos):
+        self._pool = pool
+        self._eventos = eventos
+        self._pendiente = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._pendiente = self._pool.submit(next, self._eventos, self._FIN)
+        evento = await asyncio.wrap_future(self._pendiente)
+        if evento is self._FIN:
+            raise StopAsyncIteration
+        return evento
+
+    def _cerrar(self):
+        # Si el cliente se fue durante un next, ese hilo sigue dentro del generador y cerrarlo ahora
+        # fallaría ("generator already executing"): se espera a que el next termine
+        if self._pendiente is not None and not self._pendiente.cancel():
+            wait([self._pendiente])
+        self._eventos.close()
+
+    async def aclose(self):
+        await asyncio.wrap_future(self._pool.submit(self._cerrar))
+
+
+class ClientesMonolitoAsync:
+    """
+    Equivalente en proceso de ClientesHTTPAsync. Los handlers de los asistentes son bloqueantes
+    (OpenAI, SerpAPI, pdfplumber), así que corren en un pool de hilos fuera del event loop.
+    """
+
+    registro = None
+
+    def __init__(self):
+        self._asistentes = _Asistentes()
+        self._pool = ThreadPoolExecutor(max_workers=ORQ_MONOLITO_HILOS, thread_name_prefix="monolito")
+
+    def iniciar_vigilancia(self):
+        pass
+
+    async def post(self, servicio: str, path: str, content=None, timeout: float = None, **kwargs) -> RespuestaLocal:
+        if content is not None:
+            content = b"".join([bloque async for bloque in content])
+        loop = asyncio.get_running_loop()
+        futuro = loop.run_in_executor(
+            self._pool, lambda: self._asistentes.despachar(servicio, path, content=content, **kwargs))
+        # Como en ClientesHTTPAsync, el timeout vence la espera (504); el hilo termina por su cuenta
+        return await asyncio.wait_for(futuro, timeout)
+
+    @asynccontextmanager
+    async def stream(self, servicio: str, path: str, timeout: float = None, **kwargs):
+        """Como ClientesMonolito.stream; cada evento se genera en el pool de hilos."""
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self._pool, lambda: self._asistentes.despachar(servicio, path, flujo=True, **kwargs))
+        if response.flujo is not None:
+            response.flujo = _FlujoEnPool(self._pool, response.flujo)
+        try:
+            yield response
+        finally:
+            if response.flujo is not None:
+                # Cierra el generador del asistente (y su llamada al LLM) si el cliente se fue antes del final
+                await response.flujo.aclose()
+
+    async def cerrar(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,51 @@
+"""
+Plazo (deadline) de cada solicitud a /orchestrate.
+
+Se fija al recibir la solicitud: ORQ_PLAZO_MS, o menos si el cliente envía X-Deadline-Ms.
+Al reenviar al asistente se le pasa en el mismo header el presupuesto restante (en ms, relativo)
+y la llamada HTTP usa ese presupuesto más ORQ_PLAZO_GRACIA_MS como timeout, para que llegue
+primero el 504 estructurado del asistente. Si el plazo se agota en el orquestador se responde
+504 con {"error", "codigo": "plazo_vencido", "etapa"}.
+"""
+import os
+import time
+
+from or_metrics import metricas
+
+HEADER_PLAZO = "X-Deadline-Ms"
+ORQ_PLAZO_MS = int(os.getenv("ORQ_PLAZO_MS", "30000"))
+ORQ_PLAZO_GRACIA_MS = int(os.getenv("ORQ_PLAZO_GRACIA_MS", "250"))
+STATUS_PLAZO_VENCIDO = 504
+
+
+class Plazo:
+
+    def __init__(self, ms: float):
+        self.limite = time.monotonic() + ms / 1000
+
+    @classmethod
+    def desde_headers(cls, headers):
+        try:
+            ms = min(int(headers.get(HEADER_PLAZO, ORQ_PLAZO_MS)), ORQ_PLAZO_MS)
+        except ValueError:
+            ms = ORQ_PLAZO_MS
+        return cls(ms)
+
+    def restante_ms(self) -> int:
+        return max(0, int((self.limite - time.monotonic()) * 1000))
+
+    def headers(self) -> dict:
+        return {HEADER_PLAZO: str(self.restante_ms())}
+
+    def timeout(self) -> float:
+        """Timeout en segundos para la llamada al asistente."""
+        return (self.restante_ms() + ORQ_PLAZO_GRACIA_MS) / 1000
+
+
+def plazo_vencido(etapa: str) -> dict:
+    metricas.incrementar("orquestador_plazo_vencido_total", etapa=etapa)
+    return {
+        "error": f"Se agotó el plazo de la solicitud en la etapa '{etapa}'",
+        "codigo": "plazo_vencido",
+        "etapa": etapa,
+    }
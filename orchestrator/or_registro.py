@@ -0,0 +1,177 @@
+"""
+Registro de réplicas de los asistentes, con chequeos de salud y balanceo de carga.
+
+Réplicas por servicio (or_servicios.py): ASSISTANT_{RAG,PDF,SHOPPING}_URLS separadas por coma,
+o un archivo JSON en ORQ_REGISTRO ({"rag": ["http://...", ...], ...}) que tiene prioridad.
+
+  - Salud: cada ORQ_HEALTH_INTERVALO_S se consulta GET /health de cada réplica; tras
+    ORQ_HEALTH_FALLOS fallos seguidos deja de recibir tráfico, y vuelve con el primer éxito.
+  - Balanceo (ORQ_BALANCEO): "p2c" (por defecto; de dos réplicas al azar, la que tiene menos
+    solicitudes en vuelo), "menos_pendientes" (la de menos solicitudes en vuelo) o "rotativo".
+    Solo se eligen réplicas sanas, sin drenar y con el circuit breaker cerrado o en sonda.
+  - Drenado: una réplica drenada no recibe solicitudes nuevas y termina las que tiene en vuelo
+    (POST /admin/replicas/drenar); así se retira sin cortar respuestas.
+  - Administración: /admin/replicas y /admin/replicas/drenar exigen el header
+    "Authorization: Bearer <ORQ_ADMIN_TOKEN>"; sin ORQ_ADMIN_TOKEN configurado responden 403.
+"""
+import os
+import hmac
+import json
+import random
+import logging
+import itertools
+import threading
+
+from or_metrics import metricas
+from or_resiliencia import CircuitoAbierto, crear_breaker, CERRADO
+
+logger = logging.getLogger(__name__)
+
+ORQ_BALANCEO = os.getenv("ORQ_BALANCEO", "p2c")
+ORQ_HEALTH_INTERVALO_S = float(os.getenv("ORQ_HEALTH_INTERVALO_S", "5"))
+ORQ_HEALTH_TIMEOUT_S = float(os.getenv("ORQ_HEALTH_TIMEOUT_S", "1"))
+ORQ_HEALTH_FALLOS = int(os.getenv("ORQ_HEALTH_FALLOS", "2"))
+ORQ_ADMIN_TOKEN = os.getenv("ORQ_ADMIN_TOKEN", "")
+STATUS_NO_AUTORIZADO = 401
+STATUS_ADMIN_DESHABILITADO = 403
+
+
+class SinReplicasDisponibles(CircuitoAbierto):
+    """Todas las réplicas del servicio están drenadas o caídas."""
+    codigo = "sin_replicas"
+
+    def __init__(self, servicio: str, reintentar_en: float):
+        super().__init__(servicio, reintentar_en, f"El servicio '{servicio}' no tiene réplicas disponibles")
+
+
+class Replica:
+
+    def __init__(self, servicio: str, url: str, cliente):
+        self.servicio = servicio
+        self.url = url
+        self.cliente = cliente
+        self.breaker = crear_breaker(servicio, url)
+        self.sana = True
+        self.drenando = False
+        self.en_vuelo = 0
+        self._fallos = 0
+        self._lock = threading.Lock()
+
+    def disponible(self) -> bool:
+        return self.sana and not self.drenando and self.breaker.disponible()
+
+    def iniciar(self):
+        with self._lock:
+            self.en_vuelo += 1
+
+    def terminar(self):
+        with self._lock:
+            self.en_vuelo -= 1
+
+    def registrar_salud(self, ok: bool):
+        if ok:
+            if not self.sana:
+                logger.warning("Réplica %s de '%s' de nuevo sana.", self.url, self.servicio)
+            self._fallos, self.sana = 0, True
+            return
+        self._fallos += 1
+        if self.sana and self._fallos >= ORQ_HEALTH_FALLOS:
+            logger.error("Réplica %s de '%s' no responde a /health; se retira del balanceo.", self.url, self.servicio)
+            self.sana = False
+
+    def estado(self) -> dict:
+        return {"url": self.url, "sana": self.sana, "drenando": self.drenando,
+                "en_vuelo": self.en_vuelo, "circuito": self.breaker.estado}
+
+
+def cargar_servicios(servicios: dict) -> dict:
+    """Aplica ORQ_REGISTRO (si está definido) sobre las réplicas de or_servicios."""
+    path = os.getenv("ORQ_REGISTRO", "")
+    if not path:
+        return servicios
+    with open(path, encoding="utf-8") as f:
+        return {**servicios, **json.load(f)}
+
+
+class Registro:
+
+    def __init__(self, servicios: dict, crear_cliente):
+        self.replicas = {
+            servicio: [Replica(servicio, url, crear_cliente(url)) for url in ([urls] if isinstance(urls, str) else urls)]
+            for servicio, urls in cargar_servicios(servicios).items()
+        }
+        self._turno = itertools.count()
+        _registros.append(self)
+
+    def _candidatas(self, servicio: str, excluir) -> list:
+        candidatas = [r for r in self.replicas[servicio] if r is not excluir and r.disponible()]
+        if candidatas:
+            return candidatas
+        # Si los chequeos de salud descartaron todo, se intenta igual con las no drenadas
+        return [r for r in self.replicas[servicio]
+                if r is not excluir and not r.drenando and r.breaker.disponible()]
+
+    def _ordenar(self, candidatas: list) -> list:
+        if ORQ_BALANCEO == "rotativo":
+            inicio = next(self._turno) % len(candidatas)
+            return candidatas[inicio:] + candidatas[:inicio]
+        if ORQ_BALANCEO == "menos_pendientes":
+            return sorted(candidatas, key=lambda r: r.en_vuelo)
+        # p2c: de dos al azar, primero la menos cargada; el resto queda como respaldo
+        if len(candidatas) > 2:
+            dos = random.sample(candidatas, 2)
+            return sorted(dos, key=lambda r: r.en_vuelo) + [r for r in candidatas if r not in dos]
+        return sorted(candidatas, key=lambda r: (r.en_vuelo, random.random()))
+
+    def elegir(self, servicio: str, excluir: Replica = None):
+        """Réplica para la siguiente llamada (reserva la sonda del breaker si está semiabierto), o None."""
+        for replica in self._ordenar(self._candidatas(servicio, excluir)):
+            if replica.breaker.permitir():
+                return replica
+        return None
+
+    def primera(self, servicio: str) -> Replica:
+        replica = self.elegir(servicio)
+        if replica is not None:
+            return replica
+        replicas = self.replicas[servicio]
+        if any(r.breaker.estado != CERRADO for r in replicas):
+            raise CircuitoAbierto(servicio, min(r.breaker.reintentar_en() for r in replicas))
+        raise SinReplicasDisponibles(servicio, ORQ_HEALTH_INTERVALO_S)
+
+    def drenar(self, servicio: str, url: str, drenar: bool = True) -> bool:
+        for replica in self.replicas.get(servicio, []):
+            if replica.url == url:
+                replica.drenando = drenar
+                return True
+        return False
+
+    def estado(self) -> dict:
+        return {servicio: [r.estado() for r in replicas] for servicio, replicas in self.replicas.items()}
+
+    def todas(self) -> list:
+        return [r for replicas in self.replicas.values() for r in replicas]
+
+
+def autorizar_admin(headers):
+    """None si la solicitud trae el token de administración; si no, (cuerpo, status) del rechazo."""
+    if not ORQ_ADMIN_TOKEN:
+        return {"error": "Administración deshabilitada: configure ORQ_ADMIN_TOKEN",
+                "codigo": "admin_deshabilitado"}, STATUS_ADMIN_DESHABILITADO
+    esquema, _, token = headers.get("Authorization", "").partition(" ")
+    if esquema.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ORQ_ADMIN_TOKEN.encode()):
+        return {"error": "Token de administración inválido", "codigo": "no_autorizado"}, STATUS_NO_AUTORIZADO
+    return None
+
+
+_registros = []
+
+
+def _series(atributo: str) -> list:
+    return [({"servicio": r.servicio, "replica": r.url}, int(getattr(r, atributo)))
+            for registro in _registros for r in registro.todas()]
+
+
+metricas.registrar_calculada("orquestador_replica_en_vuelo", lambda: _series("en_vuelo"))
+metricas.registrar_calculada("orquestador_replica_sana", lambda: _series("sana"))
+metricas.registrar_calculada("orquestador_replica_drenando", lambda: _series("drenando"))
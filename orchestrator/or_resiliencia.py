@@ -0,0 +1,174 @@
+"""
+Circuit breakers y hedging para las llamadas del orquestador a los asistentes.
+
+Circuit breaker (uno por réplica de cada servicio):
+  - cerrado:     se registran éxito/error y latencia en una ventana deslizante de BREAKER_VENTANA_S.
+                 Con al menos BREAKER_MIN_SOLICITUDES en la ventana, se abre si la proporción de
+                 errores (excepción o HTTP 5xx) supera BREAKER_UMBRAL_ERRORES o la de llamadas
+                 más lentas que BREAKER_LENTA_S supera BREAKER_UMBRAL_LENTAS. El plazo vencido
+                 del cliente y su subida demasiado grande no cuentan (ver or_http._registrar).
+  - abierto:     falla rápido (CircuitoAbierto -> HTTP 503 con Retry-After) durante BREAKER_ABIERTO_S.
+  - semiabierto: deja pasar BREAKER_SONDAS solicitudes de prueba; si responden bien se cierra,
+                 si fallan vuelve a abrirse. Una sonda cancelada libera su lugar (liberar_sonda).
+
+Hedging (ORQ_HEDGING=1, solo con 2+ réplicas y cuerpos reenviables): si la primera réplica no
+respondió tras el p95 de su latencia reciente, se envía un segundo intento a otra réplica y se
+usa la primera respuesta exitosa.
+
+Métricas: orquestador_breaker_estado{servicio,replica} (0 cerrado, 1 semiabierto, 2 abierto),
+orquestador_breaker_transiciones_total, orquestador_breaker_rechazos_total y
+orquestador_hedge_total{servicio,resultado=enviado|ganado}.
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from or_metrics import metricas
+
+BREAKER_VENTANA_S = float(os.getenv("BREAKER_VENTANA_S", "30"))
+BREAKER_MIN_SOLICITUDES = int(os.getenv("BREAKER_MIN_SOLICITUDES", "20"))
+BREAKER_UMBRAL_ERRORES = float(os.getenv("BREAKER_UMBRAL_ERRORES", "0.5"))
+BREAKER_LENTA_S = float(os.getenv("BREAKER_LENTA_S", "10"))
+BREAKER_UMBRAL_LENTAS = float(os.getenv("BREAKER_UMBRAL_LENTAS", "0.8"))
+BREAKER_ABIERTO_S = float(os.getenv("BREAKER_ABIERTO_S", "15"))
+BREAKER_SONDAS = int(os.getenv("BREAKER_SONDAS", "1"))
+
+ORQ_HEDGING = os.getenv("ORQ_HEDGING", "0") == "1"
+# Retardo del segundo intento: p95 de la réplica, acotado; el valor por defecto se usa sin historial
+ORQ_HEDGE_MIN_MS = float(os.getenv("ORQ_HEDGE_MIN_MS", "50"))
+ORQ_HEDGE_MAX_MS = float(os.getenv("ORQ_HEDGE_MAX_MS", "5000"))
+ORQ_HEDGE_POR_DEFECTO_MS = float(os.getenv("ORQ_HEDGE_POR_DEFECTO_MS", "1000"))
+
+STATUS_CIRCUITO_ABIERTO = 503
+CERRADO, SEMIABIERTO, ABIERTO = "cerrado", "semiabierto", "abierto"
+_VALOR_ESTADO = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+
+class CircuitoAbierto(Exception):
+    codigo = "circuito_abierto"
+
+    def __init__(self, servicio: str, reintentar_en: float, mensaje: str = None):
+        super().__init__(mensaje or f"El servicio '{servicio}' no está disponible temporalmente (circuito abierto)")
+        self.servicio = servicio
+        self.reintentar_en = reintentar_en
+
+
+class CircuitBreaker:
+
+    def __init__(self, servicio: str, replica: str):
+        self.servicio = servicio
+        self.replica = replica
+        self.estado = CERRADO
+        self._ventana = deque()  # (instante, ok, duracion)
+        self._abierto_hasta = 0.0
+        self._sondas = 0
+        self._p95 = (0.0, None)  # (calculado_en, valor)
+        self._lock = threading.Lock()
+
+    def _cambiar(self, estado: str):
+        self.estado = estado
+        metricas.incrementar("orquestador_breaker_transiciones_total",
+                             servicio=self.servicio, replica=self.replica, estado=estado)
+
+    def _podar(self, ahora: float):
+        while self._ventana and self._ventana[0][0] < ahora - BREAKER_VENTANA_S:
+            self._ventana.popleft()
+
+    def reintentar_en(self) -> float:
+        return max(0.0, self._abierto_hasta - time.monotonic())
+
+    def permitir(self) -> bool:
+        """True si la llamada puede salir. En semiabierto cuenta como sonda y hay que registrarla."""
+        with self._lock:
+            if self.estado == ABIERTO:
+                if time.monotonic() < self._abierto_hasta:
+                    return False
+                self._cambiar(SEMIABIERTO)
+                self._sondas = 0
+            if self.estado == SEMIABIERTO:
+                if self._sondas >= BREAKER_SONDAS:
+                    return False
+                self._sondas += 1
+            return True
+
+    def disponible(self) -> bool:
+        """Como permitir(), pero sin reservar una sonda."""
+        with self._lock:
+            if self.estado == ABIERTO:
+                return time.monotonic() >= self._abierto_hasta
+            return self.estado == CERRADO or self._sondas < BREAKER_SONDAS
+
+    def liberar_sonda(self):
+        """
+        Para una llamada cancelada antes de terminar (hedge perdedor, especulación descartada,
+        cliente desconectado): no dice nada de la réplica, pero si era una sonda su lugar se
+        libera; si no, el circuito quedaría semiabierto sin sondas para siempre.
+        """
+        with self._lock:
+            if self.estado == SEMIABIERTO and self._sondas > 0:
+                self._sondas -= 1
+
+    def registrar(self, ok: bool, duracion: float):
+        ahora = time.monotonic()
+        with self._lock:
+            if self.estado == SEMIABIERTO:
+                if ok:
+                    self._ventana.clear()
+                    self._cambiar(CERRADO)
+                else:
+                    self._abrir(ahora)
+                return
+            self._ventana.append((ahora, ok, duracion))
+            self._podar(ahora)
+            total = len(self._ventana)
+            if self.estado != CERRADO or total < BREAKER_MIN_SOLICITUDES:
+                return
+            errores = sum(1 for _, exito, _ in self._ventana if not exito)
+            lentas = sum(1 for _, _, d in self._ventana if d >= BREAKER_LENTA_S)
+            if errores / total >= BREAKER_UMBRAL_ERRORES or lentas / total >= BREAKER_UMBRAL_LENTAS:
+                self._abrir(ahora)
+
+    def _abrir(self, ahora: float):
+        self._abierto_hasta = ahora + BREAKER_ABIERTO_S
+        self._ventana.clear()
+        self._cambiar(ABIERTO)
+
+    def p95(self):
+        """p95 (segundos) de las llamadas exitosas de la ventana; None sin historial suficiente."""
+        ahora = time.monotonic()
+        with self._lock:
+            calculado_en, valor = self._p95
+            if ahora - calculado_en < 1.0:
+                return valor
+            duraciones = sorted(d for _, ok, d in self._ventana if ok)
+            valor = duraciones[int(0.95 * (len(duraciones) - 1))] if len(duraciones) >= BREAKER_MIN_SOLICITUDES else None
+            self._p95 = (ahora, valor)
+            return valor
+
+
+_breakers = []
+
+
+def crear_breaker(servicio: str, replica: str) -> CircuitBreaker:
+    breaker = CircuitBreaker(servicio, replica)
+    _breakers.append(breaker)
+    return breaker
+
+
+def retardo_hedge(breaker: CircuitBreaker) -> float:
+    p95 = breaker.p95()
+    ms = p95 * 1000 if p95 is not None else ORQ_HEDGE_POR_DEFECTO_MS
+    return min(max(ms, ORQ_HEDGE_MIN_MS), ORQ_HEDGE_MAX_MS) / 1000
+
+
+def respuesta_circuito_abierto(e: CircuitoAbierto) -> tuple:
+    """(cuerpo, headers) de la respuesta 503."""
+    metricas.incrementar("orquestador_breaker_rechazos_total", servicio=e.servicio)
+    cuerpo = {"error": str(e), "codigo": e.codigo, "servicio": e.servicio}
+    return cuerpo, {"Retry-After": str(max(1, round(e.reintentar_en)))}
+
+
+metricas.registrar_calculada("orquestador_breaker_estado", lambda: [
+    ({"servicio": b.servicio, "replica": b.replica}, _VALOR_ESTADO[b.estado]) for b in _breakers
+])
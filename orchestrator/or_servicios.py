@@ -0,0 +1,46 @@
+"""
+Servicios downstream del orquestador y ruta de cada intención.
+
+Cada servicio puede tener varias réplicas (p. ej. ASSISTANT_PDF_URLS=http://pdf-1:5001,http://pdf-2:5001,
+cada una levantada con su PORT), y ORQ_REGISTRO puede reemplazarlas desde un JSON (ver or_registro.py).
+Un asistente en el mismo host puede escuchar en un socket Unix (UNIX_SOCKET=/run/asistente/rag.sock)
+y configurarse aquí como ASSISTANT_RAG_URLS=unix:///run/asistente/rag.sock.
+"""
+import os
+
+# Definir las URLs base de cada microservicio (en este ejemplo, se usan puertos distintos)
+ASSISTANT_RAG_URL = "http://localhost:5002"         # Servicio Rag
+ASSISTANT_PDF_URL = "http://localhost:5001"         # Servicio para análisis de PDF
+ASSISTANT_SHOPPING_URL = "http://localhost:5003"    # Servicio para asesor de compras
+
+
+def _replicas(variable: str, por_defecto: str) -> list:
+    """Réplicas del servicio: lista separada por comas en `variable`, o la URL por defecto."""
+    return [url.strip() for url in os.getenv(variable, por_defecto).split(",") if url.strip()]
+
+
+SERVICIOS = {
+    "rag": _replicas("ASSISTANT_RAG_URLS", ASSISTANT_RAG_URL),
+    "pdf": _replicas("ASSISTANT_PDF_URLS", ASSISTANT_PDF_URL),
+    "shopping": _replicas("ASSISTANT_SHOPPING_URLS", ASSISTANT_SHOPPING_URL),
+}
+
+# Intención clasificada -> (servicio, endpoint). "pdf" sin archivo se rechaza antes de enrutar.
+RUTAS = {
+    "shopping": ("shopping", "/assistant/shopping-advisor"),
+    "rag": ("rag", "/assistant/rag"),
+}
+RUTA_PDF = ("pdf", "/assistant/analyze-pdf")
+# Solo la recuperación del RAG (embedding + búsqueda), usada por la ejecución especulativa
+RUTA_RAG_RETRIEVE = ("rag", "/assistant/rag/retrieve")
+# Varias preguntas RAG en una sola solicitud (/orchestrate/batch)
+RUTA_RAG_LOTE = ("rag", "/assistant/rag/batch")
+# Campos del cuerpo hacia los asistentes que solo agrega el orquestador: el contexto de la
+# recuperación especulativa (el asistente RAG lo usa en lugar de buscar) y el historial de la
+# sesión. Si el cliente los envía se descartan: si no, elegiría los documentos de la respuesta.
+CAMPOS_INTERNOS = ("contexto", "historial")
+
+
+def sin_campos_internos(data: dict) -> dict:
+    """El cuerpo del cliente sin los campos que solo puede agregar el orquestador."""
+    return {campo: valor for campo, valor in data.items() if campo not in CAMPOS_INTERNOS}
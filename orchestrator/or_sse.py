@@ -0,0 +1,196 @@
+"""
+Respuestas en streaming (Server-Sent Events) de /orchestrate.
+
+Con Accept: text/event-stream el orquestador no espera la respuesta completa del asistente:
+  1. Envía de inmediato el evento "intencion" con la intención clasificada.
+  2. Si el asistente transmite (text/event-stream, ver assistant/ass_codec.py), reenvía sus
+     eventos ("fragmento", ...) a medida que llegan, sin acumularlos ni decodificarlos.
+  3. Si el asistente responde con un cuerpo completo (compras, o un error antes de empezar),
+     lo envía como un único evento final.
+El flujo siempre termina con un evento "fin" o "error" con el status y el mismo cuerpo que
+tendría la respuesta sin streaming; los errores del orquestador (429, 503, 504) también llegan
+así, porque el 200 ya se envió con el evento "intencion". El chat por WebSocket (or_ws.py) usa
+los mismos eventos, uno por mensaje.
+"""
+import json
+
+import aiohttp
+import httpx
+
+from or_codec import MIME_JSON, decodificar, leer_respuesta
+from or_http import ERRORES_TIMEOUT
+from or_plazo import plazo_vencido, STATUS_PLAZO_VENCIDO
+from or_resiliencia import CircuitoAbierto, respuesta_circuito_abierto, STATUS_CIRCUITO_ABIERTO
+from or_admision import INTERACTIVA, Sobrecarga, respuesta_sobrecarga, STATUS_SOBRECARGA
+
+MIME_SSE = "text/event-stream"
+# Accept hacia el asistente: eventos si puede transmitir, si no un cuerpo JSON
+ACCEPT_SSE = f"{MIME_SSE}, {MIME_JSON}"
+# Que ni el cliente ni un proxy (nginx) acumulen los eventos antes de entregarlos
+SIN_BUFFER = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def acepta_sse(headers) -> bool:
+    return MIME_SSE in headers.get("Accept", "")
+
+
+def _es_sse(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() == MIME_SSE
+
+
+def evento(nombre: str, datos: dict) -> bytes:
+    return f"event: {nombre}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def evento_final(status: int, cuerpo: dict) -> bytes:
+    """Último evento del flujo: "fin" o "error" según el status, con el cuerpo de la respuesta."""
+    return evento("fin" if status < 400 else "error", {"status": status, **(cuerpo or {})})
+
+
+def relevo(response):
+    """
+    Eventos para el cliente a partir de la respuesta de un asistente abierta con
+    ClientesHTTP.stream (httpx.Response) o ClientesMonolito.stream (RespuestaLocal).
+    """
+    if isinstance(response, httpx.Response):
+        if _es_sse(response.headers.get("Content-Type", "")):
+            yield from response.iter_raw()
+            return
+        response.read()
+    elif response.flujo is not None:
+        yield from response.flujo
+        return
+    yield evento_final(response.status_code, leer_respuesta(response))
+
+
+async def arelevo(response):
+    """Variante asíncrona de relevo (aiohttp.ClientResponse o RespuestaLocal)."""
+    if isinstance(response, aiohttp.ClientResponse):
+        content_type = response.headers.get("Content-Type", "")
+        if _es_sse(content_type):
+            async for trozo in response.content.iter_any():
+                yield trozo
+            return
+        yield evento_final(response.status, decodificar(await response.read(), content_type))
+        return
+    if response.flujo is not None:
+        async for trozo in response.flujo:
+            yield trozo
+        return
+    yield evento_final(response.status_code, response.json())
+
+
+def respuesta_de_error(e: Exception) -> tuple:
+    """(status, cuerpo) de una llamada a un asistente que falló en el orquestador."""
+    if isinstance(e, Sobrecarga):
+        return STATUS_SOBRECARGA, respuesta_sobrecarga(e)[0]
+    if isinstance(e, ERRORES_TIMEOUT):
+        return STATUS_PLAZO_VENCIDO, plazo_vencido("asistente")
+    if isinstance(e, CircuitoAbierto):
+        return STATUS_CIRCUITO_ABIERTO, respuesta_circuito_abierto(e)[0]
+    return 500, {"error": str(e)}
+
+
+def _final_de_error(e: Exception) -> bytes:
+    return evento_final(*respuesta_de_error(e))
+
+
+def flujo_asistente(compuerta, clientes, servicio: str, path: str, plazo, headers: dict = None, **kwargs):
+    """
+    Eventos de la llamada a un asistente, desde la admisión hasta el evento final: el lugar en
+    la compuerta se ocupa hasta el final del flujo y los errores llegan como evento "error".
+    """
+    headers = {"Accept": ACCEPT_SSE, **(headers or {}), **plazo.headers()}
+    try:
+        with compuerta.admitir(INTERACTIVA, plazo), \
+                clientes.stream(servicio, path, headers=headers, timeout=plazo.timeout(), **kwargs) as response:
+            yield from relevo(response)
+    except Exception as e:
+        yield _final_de_error(e)
+
+
+async def aflujo_asistente(compuerta, clientes, servicio: str, path: str, plazo, headers: dict = None, **kwargs):
+    """Variante asíncrona de flujo_asistente (CompuertaAsync y ClientesHTTPAsync o ClientesMonolitoAsync)."""
+    headers = {"Accept": ACCEPT_SSE, **(headers or {}), **plazo.headers()}
+    try:
+        async with compuerta.admitir(INTERACTIVA, plazo), \
+                clientes.stream(servicio, path, headers=headers, timeout=plazo.timeout(), **kwargs) as response:
+            async for trozo in arelevo(response):
+                yield trozo
+    except Exception as e:
+        yield _final_de_error(e)
+
+
+def _parsear(bloque: bytes) -> tuple:
+    nombre, datos = "message", []
+    for linea in bloque.decode("utf-8").splitlines():
+        if linea.startswith("event:"):
+            nombre = linea[len("event:"):].strip()
+        elif linea.startswith("data:"):
+            datos.append(linea[len("data:"):].strip())
+    return nombre, json.loads("\n".join(datos)) if datos else {}
+
+
+class _UltimoEvento:
+    """
+    Último evento de un flujo SSE sin acumular el flujo: guarda solo el último bloque completo y
+    lo recibido después del último separador.
+    """
+
+    def __init__(self):
+        self.ultimo = b""
+        self.pendiente = b""
+
+    def agregar(self, trozo: bytes):
+        cabeza, separador, self.pendiente = (self.pendiente + trozo).rpartition(b"\n\n")
+        if separador:
+            bloques = [b for b in cabeza.split(b"\n\n") if b.strip()]
+            if bloques:
+                self.ultimo = bloques[-1]
+
+    def datos_fin(self):
+        """Datos del evento "fin", si es el último del flujo; None si no."""
+        bloque = self.pendiente if self.pendiente.strip() else self.ultimo
+        if not bloque.strip():
+            return None
+        nombre, datos = _parsear(bloque)
+        return datos if nombre == "fin" else None
+
+
+def al_terminar(trozos, funcion):
+    """Reenvía `trozos` y al final llama a funcion(datos) con los datos del evento "fin", si lo hubo."""
+    ultimo = _UltimoEvento()
+    for trozo in trozos:
+        ultimo.agregar(trozo)
+        yield trozo
+    datos = ultimo.datos_fin()
+    if datos is not None:
+        funcion(datos)
+
+
+async def aal_terminar(trozos, funcion):
+    """Variante asíncrona de al_terminar."""
+    ultimo = _UltimoEvento()
+    try:
+        async for trozo in trozos:
+            ultimo.agregar(trozo)
+            yield trozo
+    finally:
+        await trozos.aclose()
+    datos = ultimo.datos_fin()
+    if datos is not None:
+        funcion(datos)
+
+
+async def aeventos(trozos):
+    """(nombre, datos) de cada evento de un flujo SSE que llega en bloques de cualquier tamaño."""
+    pendiente = b""
+    try:
+        async for trozo in trozos:
+            pendiente += trozo
+            while b"\n\n" in pendiente:
+                bloque, pendiente = pendiente.split(b"\n\n", 1)
+                if bloque.strip():
+                    yield _parsear(bloque)
+    finally:
+        await trozos.aclose()
@@ -0,0 +1,219 @@
+"""
+Chat por WebSocket en /ws (orquestador asyncio; aiohttp lo soporta sin dependencias extra).
+
+Una conexión por sesión de usuario para todos sus turnos, en lugar de una solicitud (y a menudo
+una conexión) por mensaje a /orchestrate:
+  - Mensaje de texto {"message": "...", "id": ...}: se modera, se clasifica y se responde con los
+    mismos eventos que /orchestrate con Accept: text/event-stream (ver or_sse.py), cada uno como
+    un mensaje {"evento", "id", "datos"}: "intencion", "fragmento"... y al final "fin" o "error".
+    Los mensajes de una conexión se atienden en orden, uno a la vez.
+  - Con "seguimiento": true se reutiliza la última intención de la sesión, sin reclasificar.
+  - Mensaje binario: un estado de cuenta en PDF. Se guarda por sesión y sha256 y se responde con
+    el evento "archivo"; las preguntas siguientes con intención "pdf" se analizan sobre ese archivo
+    sin volver a subirlo. Un mensaje con "sha256" pide el análisis de un archivo ya enviado en la
+    misma sesión: un estado de cuenta nunca se comparte con otra sesión.
+  - Estado de la sesión en memoria del proceso: última intención, sha256 del último estado de
+    cuenta y el historial de la conversación (ver or_memoria.py).
+    El id llega en el evento "sesion" al conectar; reconectando con /ws?sesion=<id> se recupera
+    el estado, hasta ORQ_WS_SESION_TTL_S de inactividad (como máximo ORQ_WS_SESIONES_MAX sesiones).
+  - Los archivos ocupan como máximo ORQ_WS_ARCHIVOS_MAX_BYTES en total (se descartan los usados
+    hace más tiempo). Si ya no está, o no es de la sesión, el error trae el codigo
+    "archivo_desconocido" y el cliente lo vuelve a enviar.
+
+Métricas: orquestador_ws_conexiones y orquestador_ws_mensajes_total{intencion,origen}, con
+origen=clasificador|sesion|archivo (las dos últimas no pasan por el clasificador).
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+from collections import OrderedDict
+
+import httpx
+from aiohttp import web, WSMsgType
+
+from or_metrics import metricas
+from or_clasificador import aclasificador
+from or_moderacion import amoderar, rechazo, STATUS_RECHAZO
+from or_servicios import RUTAS, RUTA_PDF
+from or_plazo import Plazo, ORQ_PLAZO_MS
+from or_http import ORQ_UPLOAD_MAX_BYTES
+from or_sse import aflujo_asistente, aeventos
+from or_memoria import memoria, con_historial, texto_respuesta
+
+ORQ_WS_SESION_TTL_S = float(os.getenv("ORQ_WS_SESION_TTL_S", "1800"))
+ORQ_WS_SESIONES_MAX = int(os.getenv("ORQ_WS_SESIONES_MAX", "10000"))
+ORQ_WS_ARCHIVOS_MAX_BYTES = int(os.getenv("ORQ_WS_ARCHIVOS_MAX_BYTES", str(200 * 1024 * 1024)))
+# Ping periódico: detecta conexiones caídas y evita que un proxy cierre las inactivas
+ORQ_WS_HEARTBEAT_S = float(os.getenv("ORQ_WS_HEARTBEAT_S", "30"))
+
+
+class Sesion:
+
+    def __init__(self, id_sesion: str):
+        self.id = id_sesion
+        self.intencion = None
+        self.sha256 = None
+        self.ultimo_uso = time.monotonic()
+
+    def estado(self) -> dict:
+        return {"sesion": self.id, "intencion": self.intencion, "sha256": self.sha256}
+
+
+class Sesiones:
+    """Sesiones por id, las usadas más recientemente al final."""
+
+    def __init__(self, ttl_s: float = ORQ_WS_SESION_TTL_S, maximo: int = ORQ_WS_SESIONES_MAX):
+        self.ttl_s = ttl_s
+        self.maximo = maximo
+        self._sesiones = OrderedDict()
+
+    def obtener(self, id_sesion: str = None) -> Sesion:
+        """La sesión `id_sesion` si sigue vigente; si no, una nueva."""
+        ahora = time.monotonic()
+        while self._sesiones:
+            primera = next(iter(self._sesiones.values()))
+            if ahora - primera.ultimo_uso < self.ttl_s and len(self._sesiones) < self.maximo:
+                break
+            self._sesiones.popitem(last=False)
+        sesion = self._sesiones.get(id_sesion) if id_sesion else None
+        if sesion is None:
+            sesion = Sesion(uuid.uuid4().hex)
+            self._sesiones[sesion.id] = sesion
+        self.usar(sesion)
+        return sesion
+
+    def usar(self, sesion: Sesion):
+        sesion.ultimo_uso = time.monotonic()
+        self._sesiones.move_to_end(sesion.id)
+
+
+class Archivos:
+    """Estados de cuenta por (id de sesión, sha256), hasta `max_bytes` en total (LRU)."""
+
+    def __init__(self, max_bytes: int = ORQ_WS_ARCHIVOS_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._archivos = OrderedDict()
+
+    def guardar(self, id_sesion: str, datos: bytes) -> str:
+        sha256 = hashlib.sha256(datos).hexdigest()
+        clave = (id_sesion, sha256)
+        if clave not in self._archivos:
+            self._archivos[clave] = datos
+            self.bytes += len(datos)
+            while self.bytes > self.max_bytes and len(self._archivos) > 1:
+                self.bytes -= len(self._archivos.popitem(last=False)[1])
+        self._archivos.move_to_end(clave)
+        return sha256
+
+    def obtener(self, id_sesion: str, sha256: str):
+        """El archivo `sha256` si lo envió la sesión `id_sesion`; None si no."""
+        datos = self._archivos.get((id_sesion, sha256))
+        if datos is not None:
+            self._archivos.move_to_end((id_sesion, sha256))
+        return datos
+
+
+sesiones = Sesiones()
+archivos = Archivos()
+_conexiones = set()
+
+
+def _multipart(sha256: str, datos: bytes, question: str) -> tuple:
+    """(cuerpo, Content-Type) de la subida a /assistant/analyze-pdf, como la enviaría el cliente."""
+    solicitud = httpx.Request("POST", "http://localhost", files={"file": (f"{sha256[:16]}.pdf", datos, "application/pdf")},
+                              data={"question": question})
+    return solicitud.read(), solicitud.headers["Content-Type"]
+
+
+async def chat(request):
+    """
+    Endpoint: /ws
+    Función: Chat por WebSocket con estado de sesión (ver la descripción del módulo).
+    """
+    ws = web.WebSocketResponse(heartbeat=ORQ_WS_HEARTBEAT_S, max_msg_size=ORQ_UPLOAD_MAX_BYTES)
+    await ws.prepare(request)
+    sesion = sesiones.obtener(request.query.get("sesion"))
+    _conexiones.add(ws)
+    try:
+        await ws.send_json({"evento": "sesion", "id": None, "datos": sesion.estado()})
+        async for msg in ws:
+            sesiones.usar(sesion)
+            if msg.type == WSMsgType.BINARY:
+                sesion.sha256 = archivos.guardar(sesion.id, msg.data)
+                sesion.intencion = "pdf"
+                await ws.send_json({"evento": "archivo", "id": None,
+                                    "datos": {"sha256": sesion.sha256, "bytes": len(msg.data)}})
+            elif msg.type == WSMsgType.TEXT:
+                await _responder(request.app, ws, sesion, msg.data)
+    except ConnectionResetError:
+        pass  # El cliente se desconectó a mitad de una respuesta
+    finally:
+        _conexiones.discard(ws)
+    return ws
+
+
+async def _responder(app, ws, sesion: Sesion, texto: str):
+    try:
+        data = json.loads(texto)
+    except ValueError:
+        data = None
+    id_mensaje = data.get("id") if isinstance(data, dict) else None
+
+    async def enviar(nombre: str, datos: dict):
+        await ws.send_json({"evento": nombre, "id": id_mensaje, "datos": datos})
+
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str):
+        await enviar("error", {"status": 400, "error": "No se proporcionó 'message' en el mensaje"})
+        return
+    message = data["message"]
+    plazo = Plazo(ORQ_PLAZO_MS)
+    # El id de la sesión de /ws lo emitió el orquestador: es válido también para la memoria
+    conversacion = memoria.obtener(memoria.crear(sesion.id))
+
+    motivo = await amoderar(message)
+    if motivo:
+        await enviar("error", {"status": STATUS_RECHAZO, **rechazo(motivo)})
+        return
+
+    if data.get("sha256"):
+        intent, origen = "pdf", "archivo"
+    elif data.get("seguimiento") and sesion.intencion:
+        intent, origen = sesion.intencion, "sesion"
+    else:
+        intent, origen = await aclasificador(message), "clasificador"
+    metricas.incrementar("orquestador_ws_mensajes_total", intencion=intent, origen=origen)
+    if intent == "irrazonable":
+        await enviar("error", {"status": STATUS_RECHAZO, **rechazo("clasificador")})
+        return
+    sesion.intencion = intent
+    await enviar("intencion", {"intencion": intent, "origen": origen})
+
+    if intent == "pdf":
+        sha256 = data.get("sha256") or sesion.sha256
+        datos = archivos.obtener(sesion.id, sha256) if isinstance(sha256, str) else None
+        if datos is None:
+            await enviar("error", {"status": 400, "codigo": "archivo_desconocido",
+                                   "error": "Para análisis de PDF se requiere enviar el archivo (mensaje binario)"})
+            return
+        sesion.sha256 = sha256
+        servicio, path = RUTA_PDF
+        cuerpo, content_type = _multipart(sha256, datos, message)
+        kwargs = {"content": cuerpo, "headers": {"Content-Type": content_type}}
+    else:
+        servicio, path = RUTAS.get(intent, RUTAS["rag"])
+        kwargs = {"json": con_historial({"message": message}, conversacion)}
+
+    eventos = aeventos(aflujo_asistente(app["compuertas"][servicio], app["clientes"], servicio, path, plazo, **kwargs))
+    try:
+        async for nombre, datos in eventos:
+            if nombre == "fin":
+                conversacion.agregar(message, texto_respuesta(datos))
+            await enviar(nombre, datos)
+    finally:
+        await eventos.aclose()
+
+
+metricas.registrar_calculada("orquestador_ws_conexiones", lambda: len(_conexiones))
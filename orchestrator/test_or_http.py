@@ -0,0 +1,93 @@
+"""
+Lo que causa el cliente (plazo vencido, subida demasiado grande) no abre el circuito de la réplica.
+
+    python -m pytest orchestrator/test_or_http.py
+"""
+import io
+import os
+import asyncio
+
+os.environ["ORQ_HEALTH_INTERVALO_S"] = "0"
+
+import aiohttp
+import httpx
+import pytest
+
+from or_http import ClientesHTTP, UploadDemasiadoGrande, leer_en_bloques, _error_del_cliente, _sin_envoltura
+from or_plazo import plazo_vencido
+from or_resiliencia import BREAKER_MIN_SOLICITUDES, CERRADO, ABIERTO
+
+LLAMADAS = BREAKER_MIN_SOLICITUDES + 5
+
+
+def _clientes(handler) -> ClientesHTTP:
+    clientes = ClientesHTTP({"rag": "http://rag"})
+    replica = clientes.registro.replicas["rag"][0]
+    replica.cliente = httpx.Client(base_url="http://rag", transport=httpx.MockTransport(handler))
+    return clientes
+
+
+def _estado(clientes: ClientesHTTP) -> str:
+    return clientes.registro.replicas["rag"][0].breaker.estado
+
+
+def _llamar(clientes: ClientesHTTP, **kwargs):
+    for _ in range(LLAMADAS):
+        try:
+            clientes.post("rag", "/assistant/rag", **kwargs)
+        except Exception:
+            pass
+
+
+def test_504_plazo_vencido_no_abre_el_circuito():
+    clientes = _clientes(lambda request: httpx.Response(504, json=plazo_vencido("generacion")))
+    _llamar(clientes, json={"message": "hola"}, timeout=1.0)
+    assert _estado(clientes) == CERRADO
+
+
+def test_timeout_del_plazo_no_abre_el_circuito():
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    clientes = _clientes(handler)
+    _llamar(clientes, json={"message": "hola"}, timeout=0.01)
+    assert _estado(clientes) == CERRADO
+
+
+def test_upload_demasiado_grande_no_abre_el_circuito():
+    def handler(request):
+        request.read()
+        return httpx.Response(200, json={})
+
+    clientes = _clientes(handler)
+    for _ in range(LLAMADAS):
+        with pytest.raises(UploadDemasiadoGrande):
+            clientes.post("rag", "/assistant/analyze-pdf", content=leer_en_bloques(io.BytesIO(b"x" * 10), maximo=5),
+                          timeout=1.0)
+    assert _estado(clientes) == CERRADO
+
+
+@pytest.mark.parametrize("respuesta", [
+    httpx.Response(500, json={"error": "fallo"}),
+    httpx.Response(504, json={"error": "gateway"}),
+])
+def test_errores_de_la_replica_abren_el_circuito(respuesta):
+    clientes = _clientes(lambda request: respuesta)
+    _llamar(clientes, json={"message": "hola"}, timeout=1.0)
+    assert _estado(clientes) == ABIERTO
+
+
+def test_timeouts_que_si_son_de_la_replica():
+    request = httpx.Request("POST", "http://rag")
+    # Sin el plazo del cliente, o sin poder conectar, el timeout cuenta como fallo
+    assert not _error_del_cliente(httpx.ReadTimeout("timeout", request=request), con_plazo=False)
+    assert not _error_del_cliente(httpx.ConnectTimeout("timeout", request=request), con_plazo=True)
+    assert not _error_del_cliente(aiohttp.ConnectionTimeoutError("timeout"), con_plazo=True)
+    assert _error_del_cliente(asyncio.TimeoutError(), con_plazo=True)
+
+
+def test_upload_envuelto_por_aiohttp():
+    error = aiohttp.ClientConnectionError("Failed to send bytes")
+    error.__cause__ = UploadDemasiadoGrande("grande")
+    assert isinstance(_sin_envoltura(error), UploadDemasiadoGrande)
+    assert _error_del_cliente(_sin_envoltura(error), con_plazo=False)